@@ -8,6 +8,7 @@ Usage: python3 ~/.claude/config-ui.py
 """
 
 import http.server
+import importlib.util
 import json
 import os
 import signal
@@ -16,6 +17,7 @@ import subprocess
 import sys
 import threading
 import time
+import urllib.parse
 import webbrowser
 
 CONFIG_PATH = os.path.expanduser("~/.claude/notify-config.json")
@@ -51,6 +53,10 @@ EVENT_ORDER = ["permission_request", "elicitation_dialog", "stop"]
 DEFAULT_CONFIG = {
     "global_enabled": True,
     "warp_native": True,
+    "delivery": "native",
+    "max_message_length": 200,
+    "history": True,
+    "history_max_mb": 20,
     "default_timeout": 5,
     "events": {
         "permission_request": {"enabled": True, "sound": "Funk", "volume": 10, "style": "banner", "sound_enabled": True},
@@ -138,6 +144,12 @@ HTML_PAGE = r"""<!DOCTYPE html>
     color: var(--color-text-secondary);
     font-size: 0.8125rem;
   }
+  .load-status {
+    margin-top: 0.375rem;
+    font-size: 0.75rem;
+    font-weight: 500;
+    color: var(--color-accent);
+  }
   .theme-toggle {
     display: inline-flex;
     align-items: center;
@@ -473,6 +485,7 @@ HTML_PAGE = r"""<!DOCTYPE html>
     font-size: 0.75rem;
     color: var(--color-text-tertiary);
   }
+  select.short-turn-select { height: 28px; font-size: 0.75rem; width: auto; }
 
   /* Preview button */
   .btn-preview {
@@ -618,6 +631,83 @@ HTML_PAGE = r"""<!DOCTYPE html>
     font-size: 0.875rem;
   }
 
+  /* Project profiles */
+  .profiles-hint {
+    font-size: 0.75rem;
+    color: var(--color-text-secondary);
+    margin-bottom: 0.75rem;
+  }
+  .profile-card {
+    border: 1px solid var(--color-border);
+    border-radius: 0.5rem;
+    padding: 0.75rem;
+    margin-bottom: 0.625rem;
+  }
+  .profile-path-row {
+    display: flex;
+    align-items: center;
+    gap: 0.5rem;
+    margin-bottom: 0.5rem;
+  }
+  input.profile-path {
+    flex: 1;
+    height: 28px;
+    border: 1px solid var(--color-border);
+    border-radius: 0.375rem;
+    padding: 0 0.5rem;
+    font-family: ui-monospace, SFMono-Regular, Menlo, monospace;
+    font-size: 0.75rem;
+    background: var(--color-input-bg);
+    color: var(--color-text);
+  }
+  input.profile-path:focus { outline: 2px solid var(--color-accent); outline-offset: -1px; }
+  .profile-event-row {
+    display: flex;
+    align-items: center;
+    gap: 0.5rem;
+    padding: 0.25rem 0;
+  }
+  .profile-event-row .profile-event-name {
+    flex: 1;
+    font-size: 0.8125rem;
+    font-weight: 500;
+  }
+  .profile-event-row select { height: 28px; width: 110px; font-size: 0.75rem; }
+
+  /* Fan-out sinks */
+  input.sink-name { flex: 0 0 7rem; }
+  .profile-path-row select.sink-type { height: 28px; width: 90px; font-size: 0.75rem; }
+  .sink-event { font-size: 0.75rem; display: flex; align-items: center; gap: 0.25rem; }
+  .sink-status { font-size: 0.6875rem; color: var(--color-text-tertiary); padding-top: 0.25rem; }
+
+  /* Active sessions */
+  .sessions-section { border-top: none; margin: -0.75rem 0 0.75rem; }
+  .sessions-count { font-weight: 500; color: var(--color-text-tertiary); }
+  #sessions-list { max-height: 320px; overflow-y: auto; }
+  .session-row {
+    display: flex;
+    align-items: center;
+    gap: 0.625rem;
+    padding: 0.375rem 0;
+    font-size: 0.75rem;
+  }
+  .session-row + .session-row { border-top: 1px solid var(--color-border); }
+  .session-row .session-event { font-weight: 600; width: 8.5rem; flex-shrink: 0; }
+  .session-row .session-terminal {
+    flex: 1;
+    min-width: 0;
+    overflow: hidden;
+    text-overflow: ellipsis;
+    white-space: nowrap;
+    color: var(--color-text-secondary);
+  }
+  .session-row .session-age, .session-row .session-timer {
+    color: var(--color-text-tertiary);
+    white-space: nowrap;
+    font-variant-numeric: tabular-nums;
+  }
+  .session-row .btn-preview { height: 24px; padding: 0 0.5rem; }
+
   /* Responsive */
   @media (max-width: 600px) {
     body { padding: 1.5rem 1rem 2rem; }
@@ -641,10 +731,19 @@ HTML_PAGE = r"""<!DOCTYPE html>
   <div>
     <h1>Claude Code Notifications</h1>
     <p class="subtitle">Configure sounds, volume, and alert styles.</p>
+    <p class="load-status" id="load-status" hidden></p>
   </div>
   <button class="theme-toggle" onclick="toggleTheme()" id="theme-btn" title="Toggle dark/light theme"></button>
 </div>
 
+<details class="advanced-section sessions-section" id="sessions" open>
+  <summary>Active Sessions <span class="sessions-count" id="sessions-count"></span></summary>
+  <div class="advanced-content">
+    <div class="profiles-hint" id="sessions-empty">No notifications waiting.</div>
+    <div id="sessions-list"></div>
+  </div>
+</details>
+
 <div id="app">Loading...</div>
 <div class="toast" id="toast"></div>
 
@@ -698,6 +797,8 @@ function getEventVal(key, field) {
   if (field === 'style') return evt.style || 'persistent';
   if (field === 'sound_enabled') return evt.sound_enabled !== undefined ? evt.sound_enabled : true;
   if (field === 'timeout') return evt.timeout !== undefined ? evt.timeout : (config.default_timeout !== undefined ? config.default_timeout : 5);
+  if (field === 'min_turn_seconds') return evt.min_turn_seconds || 0;
+  if (field === 'short_turn') return evt.short_turn || 'suppress';
   return undefined;
 }
 
@@ -719,6 +820,211 @@ function toggleWarpNative(checked) {
   markDirty();
 }
 
+function toggleTerminalDelivery(checked) {
+  config.delivery = checked ? 'terminal' : 'native';
+  markDirty();
+}
+
+function setMaxMessageLength(value) {
+  config.max_message_length = Math.max(40, Math.min(2000, +value || 200));
+  markDirty();
+}
+
+// --- Project profiles: overrides on top of the settings above, matched by the
+// longest path prefix of the session's working directory ---
+function escapeAttr(text) {
+  return String(text).replace(/&/g,'&amp;').replace(/"/g,'&quot;').replace(/</g,'&lt;').replace(/>/g,'&gt;');
+}
+
+function getProfiles() {
+  if (!Array.isArray(config.profiles)) config.profiles = [];
+  return config.profiles;
+}
+
+function addProfile() {
+  getProfiles().push({path: '', events: {}});
+  markDirty();
+  render();
+  const inputs = document.querySelectorAll('input.profile-path');
+  if (inputs.length) inputs[inputs.length - 1].focus();
+}
+
+function removeProfile(i) {
+  getProfiles().splice(i, 1);
+  markDirty();
+  render();
+}
+
+function setProfilePath(i, value) {
+  getProfiles()[i].path = value.trim();
+  markDirty();
+}
+
+function setProfileOverride(i, key, field, value) {
+  const prof = getProfiles()[i];
+  if (!prof.events) prof.events = {};
+  const evt = prof.events[key] || {};
+  if (field === 'enabled') {
+    if (value === '') delete evt.enabled; else evt.enabled = value === 'on';
+  } else if (field === 'sound') {
+    // "Silent" turns the sound off; picking a sound turns it back on
+    if (value === '') { delete evt.sound; delete evt.sound_enabled; }
+    else if (value === 'silent') { delete evt.sound; evt.sound_enabled = false; }
+    else { evt.sound = value; evt.sound_enabled = true; }
+  } else if (field === 'volume') {
+    if (value === '') delete evt.volume; else evt.volume = Math.max(1, Math.min(20, +value || 10));
+  }
+  if (Object.keys(evt).length) prof.events[key] = evt; else delete prof.events[key];
+  markDirty();
+}
+
+function renderProfiles(globalOn) {
+  const profiles = getProfiles();
+  let html = `<details class="advanced-section profiles-section" ${profiles.length?'open':''}>
+    <summary>Project Profiles</summary>
+    <div class="advanced-content">
+      <div class="profiles-hint">Override the settings above for sessions started inside a directory. The most specific matching directory wins.</div>`;
+  profiles.forEach((prof, i) => {
+    const events = prof.events || {};
+    html += `<div class="profile-card">
+      <div class="profile-path-row">
+        <input type="text" class="profile-path" placeholder="~/code/my-repo" value="${escapeAttr(prof.path || '')}"
+          onchange="setProfilePath(${i},this.value)">
+        <button class="btn-preview" onclick="removeProfile(${i})">Remove</button>
+      </div>`;
+    for (const key of EVENT_ORDER) {
+      const meta = EVENT_META[key] || {label: key};
+      const evt = events[key] || {};
+      const enabledVal = evt.enabled === undefined ? '' : (evt.enabled ? 'on' : 'off');
+      const soundVal = evt.sound_enabled === false ? 'silent' : (evt.sound || '');
+      const baseSound = getEventVal(key, 'sound_enabled') ? getEventVal(key, 'sound') : 'Silent';
+      html += `<div class="profile-event-row">
+        <span class="profile-event-name">${meta.label}</span>
+        <select onchange="setProfileOverride(${i},'${key}','enabled',this.value)">
+          <option value="" ${enabledVal===''?'selected':''}>Inherit (${getEventVal(key,'enabled')?'On':'Off'})</option>
+          <option value="on" ${enabledVal==='on'?'selected':''}>On</option>
+          <option value="off" ${enabledVal==='off'?'selected':''}>Off</option>
+        </select>
+        <select onchange="setProfileOverride(${i},'${key}','sound',this.value)">
+          <option value="" ${soundVal===''?'selected':''}>Inherit (${baseSound})</option>
+          <option value="silent" ${soundVal==='silent'?'selected':''}>Silent</option>
+          ${SOUNDS.map(s => `<option value="${s}" ${s===soundVal?'selected':''}>${s}</option>`).join('')}
+        </select>
+        <input type="number" min="1" max="20" placeholder="${getEventVal(key,'volume')}" title="Volume (empty = inherit)"
+          value="${evt.volume !== undefined ? evt.volume : ''}" onchange="setProfileOverride(${i},'${key}','volume',this.value)">
+      </div>`;
+    }
+    html += `</div>`;
+  });
+  html += `<button class="btn-preview" onclick="addProfile()" ${globalOn?'':'disabled'}>+ Add profile</button>
+    </div>
+  </details>`;
+  return html;
+}
+
+// --- Fan-out sinks: extra destinations for every delivered notification,
+// delivered in the background by notify-sinks.py ---
+const SINK_TARGETS = {
+  webhook: {field: 'url', placeholder: 'http://127.0.0.1:8080/events'},
+  file: {field: 'path', placeholder: '~/claude-events.jsonl'},
+  socket: {field: 'address', placeholder: 'unix:/tmp/claude-events.sock'},
+};
+let sinkStatus = {};
+
+function getSinks() {
+  if (!Array.isArray(config.sinks)) config.sinks = [];
+  return config.sinks;
+}
+
+function addSink() {
+  const sinks = getSinks();
+  sinks.push({name: `sink-${sinks.length + 1}`, type: 'webhook', url: ''});
+  markDirty();
+  render();
+  const inputs = document.querySelectorAll('input.sink-target');
+  if (inputs.length) inputs[inputs.length - 1].focus();
+}
+
+function removeSink(i) {
+  getSinks().splice(i, 1);
+  markDirty();
+  render();
+}
+
+function setSinkField(i, field, value) {
+  const sink = getSinks()[i];
+  if (field === 'type') {
+    // Keep the target when switching type; each type stores it under its own key
+    const target = (SINK_TARGETS[sink.type] || {}).field;
+    const old = target ? sink[target] : '';
+    if (target) delete sink[target];
+    sink.type = value;
+    sink[SINK_TARGETS[value].field] = old || '';
+    render();
+  } else if (field === 'enabled') {
+    if (value) delete sink.enabled; else sink.enabled = false;
+  } else {
+    sink[field] = value.trim();
+  }
+  markDirty();
+}
+
+function toggleSinkEvent(i, key, checked) {
+  const sink = getSinks()[i];
+  const current = sink.events && sink.events.length ? sink.events : EVENT_ORDER;
+  const events = EVENT_ORDER.filter(k => k === key ? checked : current.includes(k));
+  // An empty list would mean "all events" — keep at least one selected
+  if (!events.length) { render(); return; }
+  if (events.length === EVENT_ORDER.length) delete sink.events; else sink.events = events;
+  markDirty();
+}
+
+function sinkStatusText(name) {
+  const s = sinkStatus[name];
+  if (!s) return 'Nothing sent yet';
+  let text = `${s.delivered || 0} delivered \u00b7 ${s.pending || 0} queued \u00b7 ${s.dropped || 0} dropped`;
+  if (s.batches) text += ` \u00b7 ${Math.round(s.latency_ms)} ms per batch`;
+  if (s.attempt) text += ` \u00b7 retrying after ${s.attempt} failure${s.attempt > 1 ? 's' : ''}: ${s.last_error}`;
+  return text;
+}
+
+function renderSinks(globalOn) {
+  const sinks = getSinks();
+  let html = `<details class="advanced-section profiles-section" ${sinks.length?'open':''}>
+    <summary>Delivery Sinks</summary>
+    <div class="advanced-content">
+      <div class="profiles-hint">Also send notifications to a webhook, a JSONL file or a socket. Delivery runs in the background with retries, so a slow or unreachable sink never delays Claude Code.</div>`;
+  sinks.forEach((sink, i) => {
+    const target = SINK_TARGETS[sink.type] || SINK_TARGETS.webhook;
+    const events = sink.events && sink.events.length ? sink.events : EVENT_ORDER;
+    html += `<div class="profile-card">
+      <div class="profile-path-row">
+        <input type="text" class="profile-path sink-name" placeholder="name" value="${escapeAttr(sink.name || '')}"
+          onchange="setSinkField(${i},'name',this.value)">
+        <select class="sink-type" onchange="setSinkField(${i},'type',this.value)">
+          ${Object.keys(SINK_TARGETS).map(t => `<option value="${t}" ${t===sink.type?'selected':''}>${t}</option>`).join('')}
+        </select>
+        <input type="text" class="profile-path sink-target" placeholder="${target.placeholder}" value="${escapeAttr(sink[target.field] || '')}"
+          onchange="setSinkField(${i},'${target.field}',this.value)">
+        <label class="toggle">
+          <input type="checkbox" ${sink.enabled===false?'':'checked'} onchange="setSinkField(${i},'enabled',this.checked)">
+          <span class="slider"></span>
+        </label>
+        <button class="btn-preview" onclick="removeSink(${i})">Remove</button>
+      </div>
+      <div class="profile-event-row">
+        ${EVENT_ORDER.map(key => `<label class="sink-event"><input type="checkbox" ${events.includes(key)?'checked':''}
+          onchange="toggleSinkEvent(${i},'${key}',this.checked)">${(EVENT_META[key] || {label: key}).label}</label>`).join('')}
+      </div>
+      <div class="sink-status" data-sink="${escapeAttr(sink.name || '')}">${escapeAttr(sinkStatusText(sink.name))}</div>
+    </div>`;
+  });
+  html += `<button class="btn-preview" onclick="addSink()" ${globalOn?'':'disabled'}>+ Add sink</button>
+    </div>
+  </details>`;
+  return html;
+}
+
 function render() {
   const app = document.getElementById('app');
   const globalOn = config.global_enabled !== undefined ? config.global_enabled : true;
@@ -744,6 +1050,8 @@ function render() {
     const style = getEventVal(key, 'style');
     const soundOn = getEventVal(key, 'sound_enabled');
     const timeout = getEventVal(key, 'timeout');
+    const minTurn = getEventVal(key, 'min_turn_seconds');
+    const shortTurn = getEventVal(key, 'short_turn');
     const soundCtrlOff = !enabled || !soundOn;
     const isBanner = style === 'banner';
 
@@ -799,6 +1107,17 @@ function render() {
               <span class="slider"></span>
             </label>
           </div>
+          <div class="timeout-group">
+            <span class="timeout-label">If reply took under</span>
+            <input type="number" min="0" max="600" value="${minTurn}" ${enabled?'':'disabled'}
+              onchange="setEventVal('${key}','min_turn_seconds',Math.max(0,Math.min(600,+this.value||0)));render()">
+            <span class="timeout-unit">s</span>
+            <select class="short-turn-select" onchange="setEventVal('${key}','short_turn',this.value)" ${enabled && minTurn?'':'disabled'}>
+              <option value="suppress" ${shortTurn==='suppress'?'selected':''}>skip it</option>
+              <option value="quiet" ${shortTurn==='quiet'?'selected':''}>no sound</option>
+            </select>
+            <span class="info-icon">i<span class="info-tooltip">Measured from when you sent the prompt. Skips the notification, or shows a silent temporary one, while you are likely still watching the terminal. 0 turns this off.</span></span>
+          </div>
           <button class="btn-preview" onclick="previewEvt(this,'${key}')" ${enabled?'':'disabled'}><span class="play-icon">&#9654;</span> Preview</button>
         </div>
       </div>
@@ -809,6 +1128,8 @@ function render() {
 
   // Advanced section (collapsed by default)
   const warpNative = config.warp_native !== undefined ? config.warp_native : true;
+  const terminalDelivery = config.delivery === 'terminal';
+  const maxMsgLen = config.max_message_length !== undefined ? config.max_message_length : 200;
   html += `<details class="advanced-section ${globalOn?'':'disabled'}" style="${globalOn?'':'opacity:0.35;pointer-events:none'}">
     <summary>Advanced</summary>
     <div class="advanced-content">
@@ -822,9 +1143,29 @@ function render() {
           <span class="slider"></span>
         </label>
       </div>
+      <div class="advanced-toggle-row">
+        <div class="adv-label-group">
+          <span class="adv-label">In-Terminal Notifications (All Terminals)</span>
+          <span class="info-icon">i<span class="info-tooltip"><strong>Enabled</strong> — the terminal shows the notification itself (OSC 9 in iTerm2, WezTerm, Ghostty and kitty; OSC 777 in Warp, foot and urxvt; a bell elsewhere). Nothing else is launched, so sound, icon and style settings do not apply.<br><br><strong>Disabled</strong> — macOS notifications with the settings above.</span></span>
+        </div>
+        <label class="toggle">
+          <input type="checkbox" ${terminalDelivery?'checked':''} onchange="toggleTerminalDelivery(this.checked)">
+          <span class="slider"></span>
+        </label>
+      </div>
+      <div class="advanced-toggle-row">
+        <div class="adv-label-group">
+          <span class="adv-label">Message Length Limit</span>
+          <span class="info-icon">i<span class="info-tooltip">Long question text is cut at this many characters (with an ellipsis). Banners only show a couple of lines anyway.</span></span>
+        </div>
+        <input type="number" min="40" max="2000" value="${maxMsgLen}" onchange="setMaxMessageLength(this.value)">
+      </div>
     </div>
   </details>`;
 
+  html += renderProfiles(globalOn);
+  html += renderSinks(globalOn);
+
   html += `<div class="save-area">
     <a class="github-link" href="https://github.com/shamrai-nikita/claude-code-notifications" target="_blank" rel="noopener noreferrer">
       <svg viewBox="0 0 24 24" fill="currentColor"><path d="M12 .297c-6.63 0-12 5.373-12 12 0 5.303 3.438 9.8 8.205 11.385.6.113.82-.258.82-.577 0-.285-.01-1.04-.015-2.04-3.338.724-4.042-1.61-4.042-1.61C4.422 18.07 3.633 17.7 3.633 17.7c-1.087-.744.084-.729.084-.729 1.205.084 1.838 1.236 1.838 1.236 1.07 1.835 2.809 1.305 3.495.998.108-.776.417-1.305.76-1.605-2.665-.3-5.466-1.332-5.466-5.93 0-1.31.465-2.38 1.235-3.22-.135-.303-.54-1.523.105-3.176 0 0 1.005-.322 3.3 1.23.96-.267 1.98-.399 3-.405 1.02.006 2.04.138 3 .405 2.28-1.552 3.285-1.23 3.285-1.23.645 1.653.24 2.873.12 3.176.765.84 1.23 1.91 1.23 3.22 0 4.61-2.805 5.625-5.475 5.92.42.36.81 1.096.81 2.22 0 1.606-.015 2.896-.015 3.286 0 .315.21.69.825.57C20.565 22.092 24 17.592 24 12.297c0-6.627-5.373-12-12-12"/></svg>
@@ -913,6 +1254,141 @@ document.addEventListener('keydown', (e) => {
   }
 });
 
+// Active sessions — one snapshot, then a long poll for numbered changes. Rows are
+// keyed by notification group and patched in place, so with hundreds of sessions
+// an update touches only the rows that changed.
+const sessionRows = new Map();
+let sessionSeq = 0;
+
+function formatAge(secs) {
+  secs = Math.max(0, Math.floor(secs));
+  if (secs < 60) return secs + 's';
+  if (secs < 3600) return Math.floor(secs / 60) + 'm ' + (secs % 60) + 's';
+  return Math.floor(secs / 3600) + 'h ' + Math.floor(secs % 3600 / 60) + 'm';
+}
+
+function sessionTimer(s) {
+  if (s.style !== 'banner') return 'persistent';
+  const left = Math.ceil(s.posted_at + s.timeout - Date.now() / 1000);
+  return left > 0 ? `dismisses in ${left}s` : 'dismissing';
+}
+
+function sessionTerminal(s) {
+  // TAB_ID is terminal-specific: iTerm session id, TTY path, uuid|port|pid, or a PID list
+  const tab = (s.tab_id || '').split('|')[0];
+  return (s.terminal || 'Unknown terminal') + (tab ? ' \u00b7 ' + tab : '');
+}
+
+function tickSession(row) {
+  const s = row._session;
+  row.querySelector('.session-age').textContent = formatAge(Date.now() / 1000 - s.posted_at);
+  row.querySelector('.session-timer').textContent = sessionTimer(s);
+}
+
+function upsertSession(s) {
+  let row = sessionRows.get(s.group);
+  if (!row) {
+    row = document.createElement('div');
+    row.className = 'session-row';
+    document.getElementById('sessions-list').prepend(row);
+    sessionRows.set(s.group, row);
+  }
+  row._session = s;
+  const label = (EVENT_META[s.event] || {label: s.event || 'Notification'}).label;
+  const group = escapeAttr(JSON.stringify(s.group));
+  row.innerHTML = `<span class="session-event">${escapeAttr(label)}</span>
+    <span class="session-terminal" title="${escapeAttr(s.session_id)}">${escapeAttr(sessionTerminal(s))}</span>
+    <span class="session-age"></span>
+    <span class="session-timer"></span>
+    <button class="btn-preview" onclick="sessionAction(this,${group},'focus')">Focus</button>
+    <button class="btn-preview" onclick="sessionAction(this,${group},'dismiss')">Dismiss</button>`;
+  tickSession(row);
+}
+
+function removeSession(group) {
+  const row = sessionRows.get(group);
+  if (row) row.remove();
+  sessionRows.delete(group);
+}
+
+function updateSessionCount() {
+  const n = sessionRows.size;
+  document.getElementById('sessions-count').textContent = n ? `(${n})` : '';
+  document.getElementById('sessions-empty').style.display = n ? 'none' : '';
+}
+
+function resetSessions(snapshot) {
+  for (const group of [...sessionRows.keys()]) removeSession(group);
+  // Oldest first, so prepending leaves the newest on top
+  snapshot.sessions.sort((a, b) => a.posted_at - b.posted_at).forEach(upsertSession);
+  sessionSeq = snapshot.seq;
+  updateSessionCount();
+}
+
+async function followSessions() {
+  for (;;) {
+    try {
+      if (!sessionSeq) resetSessions(await (await fetch('/api/sessions')).json());
+      const res = await fetch(`/api/sessions/changes?since=${sessionSeq}`);
+      if (!res.ok) throw new Error(await res.text());
+      const data = await res.json();
+      if (data.reset) {
+        resetSessions(data);
+        continue;
+      }
+      for (const c of data.changes) {
+        if (c.op === 'upsert') upsertSession(c.session); else removeSession(c.session.group);
+      }
+      sessionSeq = data.seq;
+      updateSessionCount();
+    } catch (e) {
+      await new Promise(r => setTimeout(r, 2000));
+    }
+  }
+}
+
+async function sessionAction(btn, group, action) {
+  btn.disabled = true;
+  try {
+    const res = await fetch('/api/sessions/' + action, {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({group}),
+    });
+    if (!res.ok) throw new Error(await res.text());
+    // The row goes away with the change event the hook scripts journal
+  } catch (e) {
+    btn.disabled = false;
+    showToast('Error: ' + e.message, 'err');
+  }
+}
+
+setInterval(() => sessionRows.forEach(tickSession), 1000);
+followSessions();
+
+// Load shedding level from the hooks' .stats.json
+async function refreshLoadStatus() {
+  try {
+    const load = (await (await fetch('/api/stats')).json()).load || {};
+    const el = document.getElementById('load-status');
+    el.hidden = !load.level;
+    el.textContent = `Machine under load \u2014 hooks degraded to level ${load.level}: ${load.level_name} ` +
+      `(delivery ${Math.round(load.latency_ms || 0)} ms, load ${load.load}/CPU)`;
+  } catch (e) {}
+}
+refreshLoadStatus();
+setInterval(refreshLoadStatus, 5000);
+
+// Per-sink counters from notify-sinks.py
+async function refreshSinkStatus() {
+  try {
+    sinkStatus = (await (await fetch('/api/sinks')).json()).sinks || {};
+    document.querySelectorAll('.sink-status').forEach(el => { el.textContent = sinkStatusText(el.dataset.sink); });
+  } catch (e) {}
+}
+refreshSinkStatus();
+setInterval(refreshSinkStatus, 5000);
+
 loadConfig();
 
 // Heartbeat — tells the server the browser tab is still open
@@ -925,11 +1401,38 @@ setInterval(() => fetch('/api/heartbeat', {method: 'POST'}).catch(() => {}), 300
 NOTIFIER = os.path.expanduser(
     "~/.claude/ClaudeNotifications.app/Contents/MacOS/terminal-notifier"
 )
-NOTIFIER_LEGACY = os.path.expanduser(
-    "~/.claude/ClaudeNotifier.app/Contents/MacOS/terminal-notifier"
-)
+CLAUDE_DIR = os.path.expanduser("~/.claude")
+# Capability cache kept by notify.sh (see _claude_notify_caps there)
+CAPS_PATH = os.path.join(CLAUDE_DIR, ".persistent-notifications", ".caps")
+LEGACY_BUNDLES = [
+    "ClaudeNotifications Alerts.app",
+    "ClaudeNotifierPersistent.app",
+    "ClaudeNotifier.app",
+]
 SENDER = "com.anthropic.claude-code-notifier"
 
+
+def _resolve_notifier():
+    """Return the notifier binary to use, or None if none is installed.
+
+    Trusts notify.sh's capability cache while it is newer than ~/.claude and
+    /Applications; otherwise probes the bundles directly.
+    """
+    try:
+        caps_mtime = os.stat(CAPS_PATH).st_mtime
+        if all(caps_mtime > os.stat(d).st_mtime for d in (CLAUDE_DIR, "/Applications")
+               if os.path.isdir(d)):
+            with open(CAPS_PATH) as f:
+                return f.readline().split("\x1f")[0] or None
+    except OSError:
+        pass
+    for path in [NOTIFIER] + [
+        os.path.join(CLAUDE_DIR, b, "Contents", "MacOS", "terminal-notifier") for b in LEGACY_BUNDLES
+    ]:
+        if os.access(path, os.X_OK):
+            return path
+    return None
+
 def _detect_terminal_bundle():
     term = os.environ.get("TERM_PROGRAM", "")
     mapping = {
@@ -962,20 +1465,10 @@ def _send_preview_notification(style, event_key=None, timeout=5):
     """Send a preview macOS notification using the single notifier app."""
     global _preview_dismiss_timer
 
-    notifier = NOTIFIER
+    notifier = _resolve_notifier()
     group = "claude-code-preview"
-
-    # Fallback to legacy apps
-    if not os.path.isfile(notifier):
-        for fallback in [
-            os.path.expanduser("~/.claude/ClaudeNotifications Alerts.app/Contents/MacOS/terminal-notifier"),
-            NOTIFIER_LEGACY,
-        ]:
-            if os.path.isfile(fallback):
-                notifier = fallback
-                break
-        else:
-            return  # No notifier available
+    if notifier is None:
+        return  # No notifier available
 
     title = PREVIEW_TITLES.get(event_key, "Claude Code")
     body = PREVIEW_BODIES.get(event_key, "Preview notification")
@@ -1013,6 +1506,279 @@ def _send_preview_notification(style, event_key=None, timeout=5):
             _preview_dismiss_timer = t
 
 
+def _clean_profiles(profiles):
+    """Drop profiles without a path and overrides for unknown events or fields.
+
+    The global settings (DEFAULT_CONFIG / EVENT_ORDER) stay the base layer; a
+    profile only carries the fields it overrides.
+    """
+    cleaned = []
+    for prof in profiles if isinstance(profiles, list) else []:
+        if not isinstance(prof, dict):
+            continue
+        path = str(prof.get("path", "")).strip()
+        if not path:
+            continue
+        if len(path) > 1:
+            path = path.rstrip("/")
+        out = {"path": path}
+        if isinstance(prof.get("global_enabled"), bool):
+            out["global_enabled"] = prof["global_enabled"]
+        events = {}
+        for key, evt in (prof.get("events") or {}).items():
+            if key not in EVENT_ORDER or not isinstance(evt, dict):
+                continue
+            evt = {f: v for f, v in evt.items()
+                   if f in ("enabled", "sound", "volume", "sound_enabled", "style", "timeout",
+                            "min_turn_seconds", "short_turn")}
+            if evt.get("sound") is not None and evt["sound"] not in VALID_SOUNDS:
+                del evt["sound"]
+            if evt:
+                events[key] = evt
+        out["events"] = events
+        cleaned.append(out)
+    return cleaned
+
+
+SINK_TARGET_FIELDS = {"webhook": "url", "file": "path", "socket": "address"}
+
+
+def _clean_sinks(sinks):
+    """Drop sinks without a name, a known type or a target, and unknown fields.
+    A name that shares its spool file with an earlier sink's is dropped too."""
+    cleaned, seen = [], set()
+    for sink in sinks if isinstance(sinks, list) else []:
+        if not isinstance(sink, dict):
+            continue
+        name = str(sink.get("name", "")).strip()
+        field = SINK_TARGET_FIELDS.get(sink.get("type"))
+        target = str(sink.get(field, "")).strip() if field else ""
+        key = _sinks.spool_name(name) if _sinks else name
+        if not name or key in seen or not target:
+            continue
+        seen.add(key)
+        out = {"name": name, "type": sink["type"], field: target}
+        if sink.get("enabled") is False:
+            out["enabled"] = False
+        events = [k for k in sink.get("events") or [] if k in EVENT_ORDER]
+        if events and len(events) < len(EVENT_ORDER):
+            out["events"] = events
+        for key, kind in (("batch_size", int), ("max_queue", int), ("timeout", float)):
+            try:
+                if sink.get(key) is not None:
+                    out[key] = max(1, kind(sink[key]))
+            except (TypeError, ValueError):
+                pass
+        cleaned.append(out)
+    return cleaned
+
+
+def _load_sibling(filename):
+    """Import a helper script from next to this file, or None if absent."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+    if not os.path.exists(path):
+        return None
+    spec = importlib.util.spec_from_file_location(filename[:-3].replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+_history = _load_sibling("notify-history.py")
+_sinks = _load_sibling("notify-sinks.py")
+
+
+def _query_history(params):
+    """GET /api/history?q=&session=&event=&cursor=&limit= — newest first, keyset-paginated."""
+    arg = lambda name: params.get(name, [""])[0]
+    _history.ingest()
+    db = _history.connect()
+    try:
+        return _history.query(db, text=arg("q").strip(), session_id=arg("session"),
+                              event_key=arg("event"), cursor=arg("cursor") or None,
+                              limit=int(arg("limit") or 50))
+    finally:
+        db.close()
+
+
+MARKER_DIR = os.path.join(CLAUDE_DIR, ".persistent-notifications")
+SESSIONS_LOG = os.path.join(MARKER_DIR, ".sessions.log")
+# Hook counters and load-shedding level written by notify.sh (notify.sh --stats)
+STATS_PATH = os.path.join(MARKER_DIR, ".stats.json")
+# Column order written by _claude_notify_session in notify.sh
+SESSION_COLUMNS = ["ts", "kind", "group", "event", "terminal", "tab_id", "style", "timeout"]
+
+
+class SessionTracker:
+    """Sessions with a pending notification, kept current from notify.sh's journal.
+
+    A background thread follows .sessions.log by byte offset — one stat per tick,
+    only appended bytes are read — and turns every line into a numbered change.
+    Clients take a snapshot once and then long-poll for the changes after the last
+    sequence number they saw, so nothing rescans the marker directory per request.
+    When GC compacts the journal (new inode or shorter file) the state is rebuilt
+    and clients that are behind get a fresh snapshot instead of changes.
+    """
+
+    MAX_CHANGES = 2000
+    TICK = 0.25
+
+    def __init__(self, path=SESSIONS_LOG):
+        self.path = path
+        self.sessions = {}
+        self.seq = 0
+        self._changes = []
+        self._floor = 0  # changes at or below this seq are no longer kept
+        self._cond = threading.Condition()
+        self._ino = None
+        self._offset = 0
+        self._partial = b""
+        self._loaded = False
+
+    def start(self):
+        self.poll()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.TICK)
+            try:
+                self.poll()
+            except Exception:
+                pass
+
+    def poll(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        with self._cond:
+            if st is None:
+                if self._ino is not None or self.sessions:
+                    self._reset(None)
+                return
+            if st.st_ino != self._ino or st.st_size < self._offset:
+                self._reset(st.st_ino)
+            if st.st_size == self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = self._partial + f.read()
+            self._offset = st.st_size
+            lines = data.split(b"\n")
+            self._partial = lines.pop()
+            for line in lines:
+                self._apply(line.decode("utf-8", "replace"))
+            if not self._loaded:
+                self._loaded = True
+                # Initial load: drop entries whose marker vanished without a
+                # journal line (uninstall cleanup, older notify-click.sh)
+                for group in [g for g, s in self.sessions.items() if not _marker_matches(s)]:
+                    self._change("remove", self.sessions.pop(group))
+                self._changes.clear()
+                self._floor = self.seq
+            if len(self._changes) > self.MAX_CHANGES:
+                del self._changes[:-self.MAX_CHANGES]
+                self._floor = self._changes[0]["seq"] - 1
+            self._cond.notify_all()
+
+    def _reset(self, ino):
+        self.sessions.clear()
+        self._changes.clear()
+        self.seq += 1
+        self._floor = self.seq
+        self._ino, self._offset, self._partial = ino, 0, b""
+        self._loaded = False
+        self._cond.notify_all()
+
+    def _apply(self, line):
+        fields = line.split("\t")
+        if len(fields) != len(SESSION_COLUMNS):
+            return
+        rec = dict(zip(SESSION_COLUMNS, fields))
+        group = rec["group"]
+        if rec["kind"] == "posted":
+            try:
+                posted_at = float(rec["ts"].replace(",", "."))
+            except ValueError:
+                posted_at = time.time()
+            try:
+                timeout = int(rec["timeout"])
+            except ValueError:
+                timeout = 0
+            session = {
+                "group": group,
+                "session_id": group[len("claude-code-"):],
+                "event": rec["event"],
+                "terminal": rec["terminal"],
+                "tab_id": rec["tab_id"],
+                "style": rec["style"],
+                "timeout": timeout,
+                "posted_at": posted_at,
+            }
+            self.sessions[group] = session
+            self._change("upsert", session)
+        elif rec["kind"] == "resolved" and group in self.sessions:
+            self._change("remove", self.sessions.pop(group))
+
+    def _change(self, op, session):
+        self.seq += 1
+        self._changes.append({"seq": self.seq, "op": op, "session": session})
+
+    def snapshot(self):
+        with self._cond:
+            return {"seq": self.seq, "sessions": list(self.sessions.values())}
+
+    def changes_since(self, since, wait):
+        """Changes after `since`, waiting up to `wait` seconds for the first one."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > since, timeout=wait)
+            if since < self._floor or since > self.seq:
+                return {"reset": True, "seq": self.seq, "sessions": list(self.sessions.values())}
+            return {"seq": self.seq, "changes": [c for c in self._changes if c["seq"] > since]}
+
+    def get(self, group):
+        with self._cond:
+            return self.sessions.get(group)
+
+
+def _marker_matches(session):
+    try:
+        with open(os.path.join(MARKER_DIR, session["session_id"])) as f:
+            return f.read().strip() == session["group"]
+    except OSError:
+        return False
+
+
+_sessions = SessionTracker()
+
+
+def _session_action(action, group):
+    """Focus or dismiss a pending session through the same scripts a notification uses."""
+    session = _sessions.get(group)
+    if session is None or not session["session_id"]:
+        return False
+    if action == "focus":
+        # Clicking the notification runs notify-click.sh — focus the tab the same
+        # way, then take the notification off screen (the click handler only
+        # clears the marker)
+        subprocess.Popen(
+            ["bash", os.path.join(CLAUDE_DIR, "notify-click.sh"),
+             session["terminal"], session["tab_id"], session["session_id"]],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        notifier = _resolve_notifier()
+        if notifier:
+            subprocess.Popen([notifier, "-remove", group],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        subprocess.Popen(
+            ["bash", os.path.join(CLAUDE_DIR, "notify.sh"), "--dismiss", session["session_id"]],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+    return True
+
+
 class Handler(http.server.BaseHTTPRequestHandler):
     """HTTP request handler for the config UI."""
 
@@ -1064,6 +1830,36 @@ class Handler(http.server.BaseHTTPRequestHandler):
             except json.JSONDecodeError:
                 data = DEFAULT_CONFIG.copy()
             self._send_json(data)
+        elif self.path.split("?", 1)[0] == "/api/history":
+            if _history is None:
+                self._send_error(404, "notify-history.py not installed")
+                return
+            params = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            try:
+                self._send_json(_query_history(params))
+            except ValueError:
+                self._send_error(400, "Invalid cursor or limit")
+            except Exception as e:
+                self._send_error(500, str(e))
+        elif self.path == "/api/stats":
+            try:
+                with open(STATS_PATH) as f:
+                    self._send_json(json.load(f))
+            except (OSError, ValueError):
+                self._send_json({})
+        elif self.path == "/api/sinks":
+            self._send_json(_sinks.status() if _sinks else {"sinks": {}})
+        elif self.path == "/api/sessions":
+            self._send_json(_sessions.snapshot())
+        elif self.path.split("?", 1)[0] == "/api/sessions/changes":
+            # Long poll: answers as soon as anything changes after ?since=SEQ
+            params = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            try:
+                since = int(params.get("since", ["0"])[0])
+            except ValueError:
+                self._send_error(400, "Invalid since")
+                return
+            self._send_json(_sessions.changes_since(since, wait=20))
         else:
             self._send_error(404, "Not found")
 
@@ -1075,9 +1871,18 @@ class Handler(http.server.BaseHTTPRequestHandler):
                 for k in list(data.keys()):
                     if k.startswith("default_"):
                         del data[k]
-                with open(CONFIG_PATH, "w") as f:
+                data["profiles"] = _clean_profiles(data.get("profiles"))
+                if not data["profiles"]:
+                    del data["profiles"]
+                data["sinks"] = _clean_sinks(data.get("sinks"))
+                if not data["sinks"]:
+                    del data["sinks"]
+                # Write-then-rename: hooks and the sink drainer read the config at any moment
+                tmp = f"{CONFIG_PATH}.{os.getpid()}"
+                with open(tmp, "w") as f:
                     json.dump(data, f, indent=2)
                     f.write("\n")
+                os.replace(tmp, CONFIG_PATH)
                 self._send_json({"ok": True})
             except json.JSONDecodeError:
                 self._send_error(400, "Invalid JSON")
@@ -1090,6 +1895,19 @@ class Handler(http.server.BaseHTTPRequestHandler):
                 _last_heartbeat = time.time()
             self._send_json({"ok": True})
 
+        elif self.path in ("/api/sessions/focus", "/api/sessions/dismiss"):
+            try:
+                data = json.loads(self._read_body())
+                action = self.path.rsplit("/", 1)[1]
+                if not _session_action(action, str(data.get("group", ""))):
+                    self._send_error(404, "No such pending session")
+                    return
+                self._send_json({"ok": True})
+            except json.JSONDecodeError:
+                self._send_error(400, "Invalid JSON")
+            except Exception as e:
+                self._send_error(500, str(e))
+
         elif self.path in ("/api/preview", "/api/preview-sound"):
             try:
                 body = self._read_body()
@@ -1194,6 +2012,8 @@ def main():
     wd = threading.Thread(target=watchdog, daemon=True)
     wd.start()
 
+    _sessions.start()
+
     server.serve_forever()
 
 
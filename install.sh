@@ -1,11 +1,38 @@
 #!/bin/bash
 # Claude Code Notifications — macOS installer
 # Installs notification system to ~/.claude/
+#
+# Re-runs are incremental: every installed artifact is recorded with a content
+# hash of its sources in ~/.claude/.notify-install-manifest.json, and steps whose
+# sources and installed copy are unchanged are skipped.
+# Usage: ./install.sh [--dry-run]   (--dry-run reports what would change)
 set -e
 
 CLAUDE_DIR="$HOME/.claude"
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
-LSREGISTER="/System/Library/Frameworks/CoreServices.framework/Versions/A/Frameworks/LaunchServices.framework/Versions/A/Support/lsregister"
+# CLAUDE_NOTIFY_LSREGISTER / CLAUDE_NOTIFY_LAUNCHER replace lsregister and the
+# launcher path, as in notify.sh (notify-replay.py --install runs in a sandbox)
+LSREGISTER="${CLAUDE_NOTIFY_LSREGISTER:-/System/Library/Frameworks/CoreServices.framework/Versions/A/Frameworks/LaunchServices.framework/Versions/A/Support/lsregister}"
+LAUNCHER_APP="${CLAUDE_NOTIFY_LAUNCHER:-/Applications/ClaudeNotifications.app}"
+MANIFEST="$CLAUDE_DIR/.notify-install-manifest.json"
+
+DRY_RUN=0
+[ "${1:-}" = "--dry-run" ] && DRY_RUN=1
+
+PLAN_DIR=$(mktemp -d)
+trap 'rm -rf "$PLAN_DIR"' EXIT
+
+# Install plan: _plan MODE KEY INSTALLED_PATH SOURCES
+#   MODE copy  — installed file must be byte-identical to the single source
+#   MODE build — installed path must exist (it is derived from the sources)
+#   SOURCES    — files or directories separated by '|'; @VERSION@ in the
+#                installed path is replaced with the VSIX extension version
+PLAN=()
+_plan() { PLAN+=("$1" "$2" "$3" "$4"); }
+# True if KEY must be (re)installed on this run
+_changed() { [[ "$CHANGED" == *" $1 "* ]]; }
+# Record KEY as installed; safe to call from parallel background jobs
+_done() { : > "$PLAN_DIR/done.$1"; }
 
 echo "=== Claude Code Notifications Installer ==="
 
@@ -19,7 +46,7 @@ if [ -z "$TN_APP" ]; then
 fi
 
 # If not in cellar, try brew install (only if brew exists)
-if [ -z "$TN_APP" ] && command -v brew &>/dev/null; then
+if [ -z "$TN_APP" ] && [ "$DRY_RUN" = "0" ] && command -v brew &>/dev/null; then
   echo "Installing terminal-notifier via Homebrew..."
   if brew install terminal-notifier 2>/dev/null; then
     TN_APP=$(find /usr/local/Cellar/terminal-notifier -name "terminal-notifier.app" -maxdepth 2 2>/dev/null | head -1)
@@ -44,7 +71,188 @@ else
   echo "Found terminal-notifier at: $TN_APP"
 fi
 
+# 1b. Build the install plan and compare it with the manifest
+VSIX="$SCRIPT_DIR/vendor/claude-code-notifications.vsix"
+JB_ZIP="$SCRIPT_DIR/vendor/claude-code-notifications-jetbrains.zip"
+JB_SUPPORT="$HOME/Library/Application Support/JetBrains"
+EXT_DIRS=("$HOME/.cursor/extensions:cursor:Cursor" "$HOME/.vscode/extensions:vscode:VS Code" "$HOME/.vscode-oss/extensions:vscodium:VSCodium")
+
+_plan build icon "$CLAUDE_DIR/Claude.icns" "$SCRIPT_DIR/icon.png"
+_plan build app "$CLAUDE_DIR/ClaudeNotifications.app" "$TN_APP|$SCRIPT_DIR/ClaudeNotifications.plist|$SCRIPT_DIR/icon.png"
+_plan copy notify.sh "$CLAUDE_DIR/notify.sh" "$SCRIPT_DIR/notify.sh"
+_plan copy notify-click.sh "$CLAUDE_DIR/notify-click.sh" "$SCRIPT_DIR/notify-click.sh"
+_plan copy config-ui.py "$CLAUDE_DIR/config-ui.py" "$SCRIPT_DIR/config-ui.py"
+_plan copy notify-relay.py "$CLAUDE_DIR/notify-relay.py" "$SCRIPT_DIR/notify-relay.py"
+_plan copy notify-history.py "$CLAUDE_DIR/notify-history.py" "$SCRIPT_DIR/notify-history.py"
+_plan copy notify-sinks.py "$CLAUDE_DIR/notify-sinks.py" "$SCRIPT_DIR/notify-sinks.py"
+if [ -f "$VSIX" ]; then
+  for _ext_entry in "${EXT_DIRS[@]}"; do
+    IFS=: read -r _ext_dir _ext_key _editor <<< "$_ext_entry"
+    [ -d "$_ext_dir" ] && _plan build "vscode-$_ext_key" "$_ext_dir/anthropic.claude-code-notifications-@VERSION@" "$VSIX"
+  done
+fi
+if [ -f "$JB_ZIP" ] && [ -d "$JB_SUPPORT" ]; then
+  for jb_dir in "$JB_SUPPORT"/*/; do
+    jb_name=$(basename "$jb_dir")
+    case "$jb_name" in
+      IntelliJIdea*|IdeaIC*|PyCharm*|PyCharmCE*|WebStorm*|CLion*|GoLand*|PhpStorm*|Rider*|RubyMine*|DataGrip*|RustRover*|DataSpell*|Aqua*)
+        _plan build "jetbrains-$jb_name" "${jb_dir}plugins/claude-code-notifications" "$JB_ZIP" ;;
+    esac
+  done
+fi
+_plan build launcher "$LAUNCHER_APP" "$SCRIPT_DIR/icon.png"
+
+# Prints the keys that need work on one line and the VSIX version on the next;
+# the new hashes are kept in $PLAN_DIR/plan.json until the run succeeds.
+_plan_output=$(python3 -c "
+import hashlib, json, os, sys, zipfile
+
+manifest_path, plan_path, vsix, dry_run = sys.argv[1:5]
+entries = sys.argv[5:]
+
+def digest(path, h):
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).encode() + b'\0')
+                digest(full, h)
+    elif os.path.isfile(path):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    else:
+        h.update(b'<missing>')
+
+def file_hash(path):
+    h = hashlib.sha256()
+    digest(path, h)
+    return h.hexdigest()
+
+version = ''
+if os.path.isfile(vsix):
+    try:
+        with zipfile.ZipFile(vsix) as z:
+            with z.open('extension/package.json') as f:
+                version = json.load(f)['version']
+    except Exception:
+        pass
+
+try:
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+except (OSError, ValueError):
+    manifest = {}
+
+plan, changed = {}, []
+for i in range(0, len(entries), 4):
+    mode, key, dest, sources = entries[i:i + 4]
+    dest = dest.replace('@VERSION@', version)
+    h = hashlib.sha256()
+    for src in sources.split('|'):
+        h.update(src.encode() + b'\0')
+        digest(src, h)
+    plan[key] = h.hexdigest()
+    if manifest.get(key) != plan[key]:
+        reason = 'new' if key not in manifest else 'source changed'
+    elif not os.path.exists(dest):
+        reason = 'missing'
+    elif mode == 'copy' and file_hash(dest) != file_hash(sources):
+        reason = 'modified'
+    else:
+        continue
+    changed.append(key)
+    if dry_run == '1':
+        print(f'  would update {key}: {reason}', file=sys.stderr)
+
+with open(plan_path, 'w') as f:
+    json.dump(plan, f)
+print(' '.join(changed))
+print(version)
+" "$MANIFEST" "$PLAN_DIR/plan.json" "$VSIX" "$DRY_RUN" "${PLAN[@]}")
+CHANGED=" $(echo "$_plan_output" | sed -n 1p) "
+_ext_version=$(echo "$_plan_output" | sed -n 2p)
+
+# Merge our hooks into settings.json: add missing events and upgrade dismiss
+# hooks written by earlier versions. With --dry-run only report what would change.
+_merge_hooks() {
+  python3 -c "
+import json, os
+
+settings_path = os.path.expanduser('$CLAUDE_DIR/settings.json')
+dry_run = '$DRY_RUN' == '1'
+
+# Load existing settings or start fresh
+if os.path.exists(settings_path):
+    with open(settings_path) as f:
+        settings = json.load(f)
+else:
+    settings = {}
+
+# Define the notification hooks. PostToolUse and UserPromptSubmit only dismiss
+# pending notifications, so they are gated on the pending flag kept by notify.sh —
+# the shell test is a builtin and bash is only started while something is pending.
+# UserPromptSubmit also marks the start of the turn for the quick-reply threshold:
+# a builtin redirect keyed on the Claude process (the same PID notify.sh keeps its
+# pid-<N> markers under), so the common path still starts no process at all. The
+# file is a dot file so the pending refresh, which re-arms on any other entry,
+# ignores it.
+PLAIN = 'bash ~/.claude/notify.sh'
+GATED = '[ -e ~/.claude/.persistent-notifications/.pending ] && bash ~/.claude/notify.sh || true'
+TURN = 'true 2>/dev/null >~/.claude/.persistent-notifications/.turn-\$PPID; ' + GATED
+LEGACY_TURN = 'true 2>/dev/null >~/.claude/.persistent-notifications/turn-\$PPID; ' + GATED
+DISMISS_EVENTS = ('PostToolUse', 'UserPromptSubmit')
+COMMANDS = {'PostToolUse': GATED, 'UserPromptSubmit': TURN}
+hook_entry = lambda cmd: [{'matcher': '', 'hooks': [{'type': 'command', 'command': cmd}]}]
+
+# Merge hooks — add missing ones, preserve existing
+hooks = settings.get('hooks', {})
+added, upgraded = [], []
+for event in ['Notification', 'PermissionRequest', 'Stop', 'PostToolUse', 'UserPromptSubmit']:
+    cmd = COMMANDS.get(event, PLAIN)
+    if event not in hooks:
+        hooks[event] = hook_entry(cmd)
+        added.append(event)
+    elif event in DISMISS_EVENTS:
+        # Upgrade entries written by earlier versions
+        for entry in hooks[event]:
+            for h in entry.get('hooks', []):
+                if h.get('command') in (PLAIN, GATED, LEGACY_TURN) and h['command'] != cmd:
+                    h['command'] = cmd
+                    upgraded.append(event + (' (turn start)' if cmd == TURN else ' (gated)'))
+
+if dry_run:
+    if added:
+        print(f'  would add hooks: {\", \".join(added)}')
+    if upgraded:
+        print(f'  would upgrade hooks: {\", \".join(upgraded)}')
+    raise SystemExit
+
+settings['hooks'] = hooks
+
+# Write back with formatting preserved (only when something changed)
+if added or upgraded or not os.path.exists(settings_path):
+    with open(settings_path, 'w') as f:
+        json.dump(settings, f, indent=2)
+        f.write('\n')
+
+if added or upgraded:
+    print(f'Added hooks: {\", \".join(added + upgraded)}')
+else:
+    print('All hooks already configured.')
+"
+}
+
+if [ "$DRY_RUN" = "1" ]; then
+  [ "$CHANGED" = "  " ] && echo "  All artifacts up to date."
+  _merge_hooks
+  echo "Dry run — nothing was changed."
+  exit 0
+fi
+
 # 2. Copy icon from repo and convert to PNG (source may be JPEG despite .png extension)
+if _changed icon; then
 echo "Installing icon..."
 sips -s format png "$SCRIPT_DIR/icon.png" --out "$CLAUDE_DIR/claude-icon-large.png" > /dev/null
 
@@ -66,6 +274,10 @@ sips -s format png -z 1024 1024 "$SRC" --out "$ICONSET/icon_512x512@2x.png" > /d
 iconutil -c icns "$ICONSET" -o "$CLAUDE_DIR/Claude.icns"
 rm -rf "$ICONSET"
 echo "Icon created."
+_done icon
+else
+  echo "Icon up to date."
+fi
 
 # 4. Build single ClaudeNotifications.app bundle (alert style)
 echo "Building ClaudeNotifications.app..."
@@ -80,6 +292,8 @@ for legacy in "ClaudeNotifier.app" "ClaudeNotifierPersistent.app" "ClaudeNotifie
 done
 
 APP_NAME="ClaudeNotifications.app"
+NOTIFIER="$CLAUDE_DIR/$APP_NAME/Contents/MacOS/terminal-notifier"
+if _changed app; then
 rm -rf "$CLAUDE_DIR/$APP_NAME"
 cp -R "$TN_APP" "$CLAUDE_DIR/$APP_NAME"
 cp "$SCRIPT_DIR/ClaudeNotifications.plist" "$CLAUDE_DIR/$APP_NAME/Contents/Info.plist"
@@ -93,7 +307,6 @@ echo "  $APP_NAME installed and registered."
 
 # 5. Send test notification to trigger macOS permission prompt
 echo "Triggering notification permission (you may see a test notification)..."
-NOTIFIER="$CLAUDE_DIR/$APP_NAME/Contents/MacOS/terminal-notifier"
 "$NOTIFIER" -title "Claude Code Setup" -message "Notifications enabled" -group "claude-setup" 2>/dev/null || true
 
 # 5b. Set notification grouping to Off for the app bundle
@@ -109,8 +322,26 @@ old_ids = [
     'com.anthropic.claude-code-notifier-banner',
 ]
 
+def usernoted_pids():
+    out = subprocess.run(['pgrep', '-x', 'usernoted'], capture_output=True, text=True).stdout
+    return set(out.split())
+
 def kill_usernoted():
+    old = usernoted_pids()
     subprocess.run(['killall', 'usernoted'], capture_output=True)
+    return old
+
+def wait_gone(old, timeout):
+    # Poll instead of a fixed sleep: done as soon as the killed process exits
+    deadline = time.time() + timeout
+    while usernoted_pids() & old and time.time() < deadline:
+        time.sleep(0.05)
+
+def wait_restarted(old, timeout):
+    # launchd restarts usernoted on demand; a new PID means it reloaded from disk
+    deadline = time.time() + timeout
+    while not (usernoted_pids() - old) and time.time() < deadline:
+        time.sleep(0.05)
 
 def read_plist():
     result = subprocess.run(['defaults', 'export', 'com.apple.ncprefs', '-'], capture_output=True)
@@ -119,8 +350,7 @@ def read_plist():
     return plistlib.loads(result.stdout)
 
 # Step 1: Kill usernoted to flush in-memory app registration to disk
-kill_usernoted()
-time.sleep(1)
+wait_restarted(kill_usernoted(), 1.0)
 
 # Step 2: Read ncprefs (app should now be on disk after flush)
 pl = None
@@ -167,8 +397,7 @@ if changed:
     pl['apps'] = apps_to_keep
     data = plistlib.dumps(pl, fmt=plistlib.FMT_BINARY)
     # Step 5: Kill usernoted BEFORE writing so it can't overwrite our changes
-    kill_usernoted()
-    time.sleep(0.5)
+    wait_gone(kill_usernoted(), 0.5)
     # Step 6: Write the modified plist — restarted usernoted reads our file
     wr = subprocess.run(['defaults', 'import', 'com.apple.ncprefs', '-'], input=data)
     if wr.returncode == 0:
@@ -181,13 +410,22 @@ else:
 
 # Remove the test notification (after grouping is set so it doesn't interfere with registration)
 "$NOTIFIER" -remove "claude-setup" 2>/dev/null || true
+_done app
+else
+  echo "  $APP_NAME up to date."
+fi
 
 # 6. Copy notify.sh and config
 echo "Installing notify.sh and config..."
-cp "$SCRIPT_DIR/notify.sh" "$CLAUDE_DIR/notify.sh"
-chmod +x "$CLAUDE_DIR/notify.sh"
-cp "$SCRIPT_DIR/notify-click.sh" "$CLAUDE_DIR/notify-click.sh"
-chmod +x "$CLAUDE_DIR/notify-click.sh"
+for _script in notify.sh notify-click.sh; do
+  if _changed "$_script"; then
+    cp "$SCRIPT_DIR/$_script" "$CLAUDE_DIR/$_script"
+    chmod +x "$CLAUDE_DIR/$_script"
+    _done "$_script"
+  else
+    echo "  $_script up to date."
+  fi
+done
 
 if [ ! -f "$CLAUDE_DIR/notify-config.json" ]; then
   cp "$SCRIPT_DIR/notify-config.json" "$CLAUDE_DIR/notify-config.json"
@@ -196,33 +434,46 @@ else
   echo "Config already exists — skipping (edit ~/.claude/notify-config.json manually)."
 fi
 
-# 7. Install config UI
-echo "Installing config-ui.py..."
-cp "$SCRIPT_DIR/config-ui.py" "$CLAUDE_DIR/config-ui.py"
+# Arm the pending flag if an earlier version left markers behind — the gated
+# dismiss hooks would otherwise never run for them. Turn-start files were once
+# written as turn-<N>, which kept the flag armed; they are rewritten on the next
+# prompt under the new name.
+if [ -d "$CLAUDE_DIR/.persistent-notifications" ]; then
+  rm -f "$CLAUDE_DIR/.persistent-notifications"/turn-*
+  : > "$CLAUDE_DIR/.persistent-notifications/.pending"
+fi
+# The UserPromptSubmit hook records turn starts here without creating it
+mkdir -p "$CLAUDE_DIR/.persistent-notifications"
+
+# 7. Install config UI, notification history store, fan-out sinks and remote relay receiver
+for _script in config-ui.py notify-history.py notify-sinks.py notify-relay.py; do
+  if _changed "$_script"; then
+    echo "Installing $_script..."
+    cp "$SCRIPT_DIR/$_script" "$CLAUDE_DIR/$_script"
+    _done "$_script"
+  else
+    echo "$_script up to date."
+  fi
+done
 
 # 7b. Install VS Code extension for terminal tab switching
+# Per-editor installs (and the JetBrains plugins below) are independent, so each
+# runs as a background job; the jobs are collected with a single wait.
 echo "Installing VS Code extension..."
-VSIX="$SCRIPT_DIR/vendor/claude-code-notifications.vsix"
 _ext_installed=0
 if [ -f "$VSIX" ]; then
-  # Extract version from the VSIX's package.json (VSIX is a zip; extension/package.json has the version)
-  _ext_version=$(python3 -c "
-import zipfile, json, sys
-try:
-    with zipfile.ZipFile('$VSIX') as z:
-        with z.open('extension/package.json') as f:
-            print(json.load(f)['version'])
-except Exception as e:
-    print(f'ERROR: {e}', file=sys.stderr)
-    sys.exit(1)
-")
   if [ -z "$_ext_version" ]; then
     echo "  Could not read version from VSIX — skipping."
   else
-    for _ext_entry in "$HOME/.cursor/extensions:Cursor" "$HOME/.vscode/extensions:VS Code" "$HOME/.vscode-oss/extensions:VSCodium"; do
-      _ext_dir="${_ext_entry%%:*}"
-      _editor="${_ext_entry##*:}"
-      if [ -d "$_ext_dir" ]; then
+    for _ext_entry in "${EXT_DIRS[@]}"; do
+      IFS=: read -r _ext_dir _ext_key _editor <<< "$_ext_entry"
+      [ -d "$_ext_dir" ] || continue
+      _ext_installed=$((_ext_installed + 1))
+      if ! _changed "vscode-$_ext_key"; then
+        echo "  Up to date for $_editor."
+        continue
+      fi
+      (
         # Remove any old version(s)
         rm -rf "$_ext_dir"/anthropic.claude-code-notifications-*
         # Extract VSIX to temp dir, then move extension/ contents into place
@@ -267,8 +518,8 @@ with open(reg_path, 'w') as f:
     f.write('\n')
 " "$_ext_dir/extensions.json" "$_ext_dir/anthropic.claude-code-notifications-$_ext_version" "$_ext_version" 2>/dev/null || true
         echo "  Installed for $_editor."
-        _ext_installed=$((_ext_installed + 1))
-      fi
+        _done "vscode-$_ext_key"
+      ) &
     done
     if [ "$_ext_installed" -eq 0 ]; then
       echo "  No VS Code/Cursor/VSCodium extensions directory found — skipping."
@@ -281,25 +532,30 @@ fi
 
 # 7c. Install JetBrains plugin for terminal tab switching
 echo "Installing JetBrains plugin..."
-JB_ZIP="$SCRIPT_DIR/vendor/claude-code-notifications-jetbrains.zip"
 _jb_installed=0
 if [ -f "$JB_ZIP" ]; then
   # Find all JetBrains IDE config directories
-  JB_SUPPORT="$HOME/Library/Application Support/JetBrains"
   if [ -d "$JB_SUPPORT" ]; then
     for jb_dir in "$JB_SUPPORT"/*/; do
       # Only install to IDE config dirs (IntelliJIdea*, IdeaIC*, PyCharm*, WebStorm*, etc.)
       jb_name=$(basename "$jb_dir")
       case "$jb_name" in
         IntelliJIdea*|IdeaIC*|PyCharm*|PyCharmCE*|WebStorm*|CLion*|GoLand*|PhpStorm*|Rider*|RubyMine*|DataGrip*|RustRover*|DataSpell*|Aqua*)
-          plugins_dir="$jb_dir/plugins"
-          mkdir -p "$plugins_dir"
-          # Remove old version
-          rm -rf "$plugins_dir/claude-code-notifications"
-          # Install new version
-          unzip -qo "$JB_ZIP" -d "$plugins_dir"
-          echo "  Installed for $jb_name."
           _jb_installed=$((_jb_installed + 1))
+          if ! _changed "jetbrains-$jb_name"; then
+            echo "  Up to date for $jb_name."
+            continue
+          fi
+          (
+            plugins_dir="$jb_dir/plugins"
+            mkdir -p "$plugins_dir"
+            # Remove old version
+            rm -rf "$plugins_dir/claude-code-notifications"
+            # Install new version
+            unzip -qo "$JB_ZIP" -d "$plugins_dir"
+            echo "  Installed for $jb_name."
+            _done "jetbrains-$jb_name"
+          ) &
           ;;
       esac
     done
@@ -311,11 +567,12 @@ if [ -f "$JB_ZIP" ]; then
 else
   echo "  JetBrains plugin ZIP not found — skipping."
 fi
+wait
 
 # 8. Build clickable launcher app (in /Applications/ for Spotlight/Launchpad)
-echo "Building ClaudeNotifications.app launcher..."
-LAUNCHER_APP="/Applications/ClaudeNotifications.app"
 rm -f "$CLAUDE_DIR/Configure Notifications.command"  # remove legacy
+if _changed launcher; then
+echo "Building ClaudeNotifications.app launcher..."
 rm -rf "$LAUNCHER_APP"
 osacompile -o "$LAUNCHER_APP" \
   -e 'do shell script "python3 ~/.claude/config-ui.py &> /dev/null &"'
@@ -324,63 +581,63 @@ cp "$CLAUDE_DIR/Claude.icns" "$LAUNCHER_APP/Contents/Resources/applet.icns"
 rm -f "$LAUNCHER_APP/Contents/Resources/Assets.car"
 $LSREGISTER -f "$LAUNCHER_APP"
 touch "$LAUNCHER_APP"
+_done launcher
+else
+  echo "Launcher up to date."
+fi
 touch "$CLAUDE_DIR/.notify-installed"
 
-# 8b. Flush icon caches so macOS picks up new icons
-echo "Flushing icon cache..."
-rm -rf ~/Library/Caches/com.apple.iconservices.store 2>/dev/null || true
-find /var/folders -name "com.apple.iconservicesagent" -type d -exec rm -rf {} + 2>/dev/null || true
-killall Dock 2>/dev/null || true
+# 8b. Flush icon caches so macOS picks up new icons (only when an icon changed)
+if _changed icon || _changed app || _changed launcher; then
+  echo "Flushing icon cache..."
+  rm -rf ~/Library/Caches/com.apple.iconservices.store 2>/dev/null || true
+  find /var/folders -name "com.apple.iconservicesagent" -type d -exec rm -rf {} + 2>/dev/null || true
+  killall Dock 2>/dev/null || true
+fi
 
 # 9. Add hooks to settings.json
 echo "Configuring hooks in settings.json..."
-python3 -c "
-import json, os
-
-settings_path = os.path.expanduser('$CLAUDE_DIR/settings.json')
-
-# Load existing settings or start fresh
-if os.path.exists(settings_path):
-    with open(settings_path) as f:
-        settings = json.load(f)
-else:
-    settings = {}
-
-# Define the notification hooks
-hook_entry = lambda: [{'matcher': '', 'hooks': [{'type': 'command', 'command': 'bash ~/.claude/notify.sh'}]}]
-
-# Merge hooks — add missing ones, preserve existing
-hooks = settings.get('hooks', {})
-added = []
-for event in ['Notification', 'PermissionRequest', 'Stop', 'PostToolUse', 'UserPromptSubmit']:
-    if event not in hooks:
-        hooks[event] = hook_entry()
-        added.append(event)
+_merge_hooks
 
-settings['hooks'] = hooks
-
-# Write back with formatting preserved
-with open(settings_path, 'w') as f:
-    json.dump(settings, f, indent=2)
+# 9b. Record what was installed — only steps that completed are written, so a
+# failed or interrupted step is retried on the next run
+python3 -c "
+import json, os, sys
+manifest_path, plan_path, plan_dir = sys.argv[1:4]
+try:
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+except (OSError, ValueError):
+    manifest = {}
+with open(plan_path) as f:
+    plan = json.load(f)
+for name in os.listdir(plan_dir):
+    if name.startswith('done.') and name[5:] in plan:
+        manifest[name[5:]] = plan[name[5:]]
+tmp = manifest_path + '.tmp'
+with open(tmp, 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
     f.write('\n')
-
-if added:
-    print(f'Added hooks: {\", \".join(added)}')
-else:
-    print('All hooks already configured.')
-"
-
-# 10. Prompt user to enable notifications in System Settings
-echo ""
-echo "=== Enable Notifications ==="
-echo "System Settings will open to the Notifications page."
-echo "Please enable notifications for:"
-echo "  - ClaudeNotifications"
-echo ""
-osascript -e 'tell application id "com.apple.systempreferences" to quit' 2>/dev/null || true
-sleep 0.5
-open "x-apple.systempreferences:com.apple.Notifications-Settings"
-read -p "Press Enter once you've enabled notifications..."
+os.replace(tmp, manifest_path)
+" "$MANIFEST" "$PLAN_DIR/plan.json" "$PLAN_DIR"
+
+# 9c. Seed the capability cache (notifier binary, leftover legacy bundles) so
+# hooks start from a probed environment instead of re-checking every bundle
+bash "$CLAUDE_DIR/notify.sh" --caps >/dev/null 2>&1 || true
+
+# 10. Prompt user to enable notifications in System Settings (new app bundle only)
+if _changed app; then
+  echo ""
+  echo "=== Enable Notifications ==="
+  echo "System Settings will open to the Notifications page."
+  echo "Please enable notifications for:"
+  echo "  - ClaudeNotifications"
+  echo ""
+  osascript -e 'tell application id "com.apple.systempreferences" to quit' 2>/dev/null || true
+  sleep 0.5
+  open "x-apple.systempreferences:com.apple.Notifications-Settings"
+  read -p "Press Enter once you've enabled notifications..."
+fi
 
 echo ""
 echo "=== Installation complete ==="
@@ -11,6 +11,100 @@ TERM_APP="${1:-}"
 TAB_ID="${2:-}"
 SESSION_ID="${3:-}"
 
+# --- Timing instrumentation ---
+# While hook recording is on (notify.sh --record start) every external call on
+# the click path is timed and appended to a TSV next to the hook capture:
+# timestamp, TERM_APP, step, milliseconds. A final "total" row covers the whole
+# handler. CLAUDE_NOTIFY_CLICK_TIMINGS overrides the file (benchmark harness).
+CLICK_TIMINGS="${CLAUDE_NOTIFY_CLICK_TIMINGS:-}"
+[ -z "$CLICK_TIMINGS" ] && [ -f "$HOME/.claude/.notify-record" ] && CLICK_TIMINGS="$HOME/.claude/.notify-click-timings.tsv"
+
+# Current time in seconds with microseconds; /bin/bash 3.2 has no EPOCHREALTIME
+_now() {
+  if [ -n "${EPOCHREALTIME:-}" ]; then
+    echo "${EPOCHREALTIME/,/.}"
+  else
+    perl -MTime::HiRes=time -e 'printf "%.6f\n", time'
+  fi
+}
+
+# Usage: _timed STEP COMMAND [ARGS...] — runs COMMAND, logs its duration when enabled
+_timed() {
+  local step="$1" t0 rc
+  shift
+  if [ -z "$CLICK_TIMINGS" ]; then
+    "$@"
+    return
+  fi
+  t0=$(_now)
+  "$@"
+  rc=$?
+  _click_timing "$step" "$t0"
+  return $rc
+}
+
+_click_timing() {
+  printf '%s\t%s\t%s\t%s\n' "$2" "$TERM_APP" "$1" \
+    "$(awk -v a="$2" -v b="$(_now)" 'BEGIN { printf "%.2f", (b - a) * 1000 }')" >> "$CLICK_TIMINGS" 2>/dev/null
+}
+
+[ -n "$CLICK_TIMINGS" ] && CLICK_T0=$(_now)
+
+# --- JetBrains plugin endpoints ---
+# notify.sh registers each plugin endpoint as port, IDE PID, IDE start time in
+# JB_REGISTRY. An endpoint is live while that PID exists and, when registered,
+# still has the recorded start time; a notification from a restarted IDE then
+# skips its dead port instead of waiting out a connect timeout.
+JB_REGISTRY="$HOME/.claude/.persistent-notifications/.jetbrains"
+
+# Usage: _jb_alive PORT [IDE_PID] — without a PID (the hook had no
+# CLAUDE_JB_IDE_PID) the port's registry entry decides, and an unregistered port
+# is left to the connect attempt
+_jb_alive() {
+  local p q started
+  if [ -z "$2" ]; then
+    [ -f "$JB_REGISTRY" ] || return 0
+    while IFS=$'\t' read -r p q started; do
+      if [ "$p" = "$1" ]; then
+        kill -0 "$q" 2>/dev/null && [ "$(ps -o lstart= -p "$q" 2>/dev/null)" = "$started" ]
+        return
+      fi
+    done < "$JB_REGISTRY"
+    return 0
+  fi
+  kill -0 "$2" 2>/dev/null || return 1
+  [ -f "$JB_REGISTRY" ] || return 0
+  while IFS=$'\t' read -r p q started; do
+    if [ "$p" = "$1" ] && [ "$q" = "$2" ]; then
+      [ "$(ps -o lstart= -p "$2" 2>/dev/null)" = "$started" ]
+      return
+    fi
+  done < "$JB_REGISTRY"
+  return 0  # registered before the registry existed — trust the PID check
+}
+
+# Usage: _jb_focus PORT TAB_UUID — one request over bash's /dev/tcp, no curl. A
+# closed port is refused immediately (1); a live plugin gets 1s to answer, and
+# one that is slower than that (2) still counts as live.
+_jb_focus() {
+  local status
+  { exec 3<>"/dev/tcp/127.0.0.1/$1"; } 2>/dev/null || return 1
+  printf 'GET /focus?tab_id=%s HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n' "$2" >&3
+  read -r -t 1 status <&3
+  exec 3<&-
+  [[ "$status" == "HTTP/"* ]] || return 2
+}
+
+# Usage: _jb_forget PORT
+_jb_forget() {
+  local p q started keep=""
+  [ -f "$JB_REGISTRY" ] || return 0
+  while IFS=$'\t' read -r p q started; do
+    [ "$p" != "$1" ] && keep="$keep$p"$'\t'"$q"$'\t'"$started"$'\n'
+  done < "$JB_REGISTRY"
+  printf '%s' "$keep" > "$JB_REGISTRY"
+}
+
 # Clear notification marker (user clicked the notification directly)
 if [ -n "$SESSION_ID" ]; then
   rm -f "$HOME/.claude/.persistent-notifications/$SESSION_ID" 2>/dev/null
@@ -20,12 +114,27 @@ if [ -n "$SESSION_ID" ]; then
     kill "$(cat "$DPID_FILE")" 2>/dev/null || true
     rm -f "$DPID_FILE"
   fi
+  # Disarm the PostToolUse/UserPromptSubmit hooks if nothing else is pending
+  # (same logic as _claude_notify_pending_refresh in notify.sh)
+  rm -f "$HOME/.claude/.persistent-notifications/.pending" 2>/dev/null
+  for f in "$HOME/.claude/.persistent-notifications"/*; do
+    [ -e "$f" ] && : > "$HOME/.claude/.persistent-notifications/.pending"
+    break
+  done
+  # Resolve it in the active-sessions journal (see _claude_notify_session in notify.sh)
+  printf '%s\tresolved\tclaude-code-%s\t\t\t\t\t\n' "${EPOCHREALTIME:-}" "$SESSION_ID" \
+    >> "$HOME/.claude/.persistent-notifications/.sessions.log" 2>/dev/null
+  # Record the click in the notification history journal (see notify-history.py)
+  if [ -e "$HOME/.claude/.notify-history.log" ] || [ -e "$HOME/.claude/.notify-history.db" ]; then
+    printf '%s\tclicked\tclaude-code-%s\t%s\t\t\t%s\t\t\n' "${EPOCHREALTIME:-$(date +%s)}" \
+      "$SESSION_ID" "$SESSION_ID" "$TERM_APP" >> "$HOME/.claude/.notify-history.log" 2>/dev/null
+  fi
 fi
 
 case "$TERM_APP" in
   iTerm.app)
     if [ -n "$TAB_ID" ]; then
-      osascript -e "
+      _timed osascript-iterm-scan osascript -e "
         tell application \"iTerm2\"
           activate
           repeat with w in windows
@@ -42,13 +151,13 @@ case "$TERM_APP" in
         end tell
       " 2>/dev/null
     else
-      open -a "iTerm2"
+      _timed open-app open -a "iTerm2"
     fi
     ;;
 
   Apple_Terminal)
     if [ -n "$TAB_ID" ]; then
-      osascript -e "
+      _timed osascript-terminal-scan osascript -e "
         tell application \"Terminal\"
           activate
           repeat with w in windows
@@ -60,12 +169,12 @@ case "$TERM_APP" in
         end tell
       " 2>/dev/null
     else
-      open -a "Terminal"
+      _timed open-app open -a "Terminal"
     fi
     ;;
 
   WarpTerminal)
-    open -a "Warp"
+    _timed open-app open -a "Warp"
     ;;
 
   Cursor|"Visual Studio Code"|VSCodium)
@@ -79,10 +188,10 @@ case "$TERM_APP" in
       # open with URI scheme both activates the app AND delivers the URI to the extension.
       # If the extension isn't installed, the app still activates (graceful degradation).
       # If even the URI open fails, fall back to simple app activation.
-      open "${_scheme}://anthropic.claude-code-notifications/focus?pids=${TAB_ID}" 2>/dev/null || \
-        open -a "$TERM_APP" 2>/dev/null || true
+      _timed open-uri open "${_scheme}://anthropic.claude-code-notifications/focus?pids=${TAB_ID}" 2>/dev/null || \
+        _timed open-app open -a "$TERM_APP" 2>/dev/null || true
     else
-      open -a "$TERM_APP" 2>/dev/null || true
+      _timed open-app open -a "$TERM_APP" 2>/dev/null || true
     fi
     ;;
 
@@ -90,11 +199,24 @@ case "$TERM_APP" in
     if [ -n "$TAB_ID" ]; then
       # Parse tab_id, port, and IDE PID from pipe-delimited TAB_ID
       IFS='|' read -r _tab_uuid _port _ide_pid <<< "$TAB_ID"
-      # Focus the correct terminal tab via plugin's HTTP server
-      curl -s --max-time 2 "http://127.0.0.1:${_port}/focus?tab_id=${_tab_uuid}" 2>/dev/null || true
+      _jb_generic=""
+      if _jb_alive "$_port" "$_ide_pid"; then
+        # Focus the correct terminal tab via plugin's HTTP server; only a refused
+        # connect (plugin gone) drops the endpoint from the registry
+        _timed tcp-focus _jb_focus "$_port" "$_tab_uuid"
+        if [ $? -eq 1 ]; then
+          _jb_forget "$_port"
+          [ -z "$_ide_pid" ] && _jb_generic=1
+        fi
+      else
+        # The IDE this notification came from has exited — nothing to focus
+        _ide_pid=""
+        _jb_generic=1
+        _jb_forget "$_port"
+      fi
       # Bring the IDE window to front (targets specific process by PID)
       if [ -n "$_ide_pid" ]; then
-        osascript -e "
+        _timed osascript-raise-ide osascript -e "
           tell application \"System Events\"
             try
               set frontmost of first process whose unix id is ${_ide_pid} to true
@@ -102,10 +224,11 @@ case "$TERM_APP" in
           end tell
         " 2>/dev/null || true
       fi
-    else
-      # No plugin installed: activate IntelliJ generically
-      osascript -e 'tell application "IntelliJ IDEA" to activate' 2>/dev/null || \
-        osascript -e 'tell application "IntelliJ IDEA CE" to activate' 2>/dev/null || true
+    fi
+    if [ -z "$TAB_ID" ] || [ -n "$_jb_generic" ]; then
+      # No plugin installed, or IDE/plugin gone: activate IntelliJ generically
+      _timed osascript-activate osascript -e 'tell application "IntelliJ IDEA" to activate' 2>/dev/null || \
+        _timed osascript-activate osascript -e 'tell application "IntelliJ IDEA CE" to activate' 2>/dev/null || true
     fi
     ;;
 
@@ -115,6 +238,10 @@ case "$TERM_APP" in
 
   *)
     # Unknown terminal — try to open it as an app name
-    open -a "$TERM_APP" 2>/dev/null || true
+    _timed open-app open -a "$TERM_APP" 2>/dev/null || true
     ;;
 esac
+
+if [ -n "$CLICK_TIMINGS" ]; then
+  _click_timing total "$CLICK_T0"
+fi
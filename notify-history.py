@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Claude Code Notifications — notification history
+
+Keeps every delivered notification (event, session, tool, message, terminal and
+when it was posted, dismissed and clicked) in a local SQLite store with
+full-text search over the message. No external dependencies — uses only
+Python 3 stdlib.
+
+notify.sh and notify-click.sh never touch the database: they append one line
+per posted/dismissed/clicked event to a journal, and `ingest` moves the journal
+into SQLite in a single transaction. Hooks start an ingest in the background
+every few dozen notifications, and the settings UI ingests before each query.
+The store is kept under history_max_mb (notify-config.json, default 20) by
+deleting the oldest rows.
+
+Usage: python3 ~/.claude/notify-history.py ingest
+       python3 ~/.claude/notify-history.py search [QUERY] [--session ID] [--limit N]
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sqlite3
+import sys
+import time
+
+CLAUDE_DIR = os.path.expanduser("~/.claude")
+JOURNAL_PATH = os.path.join(CLAUDE_DIR, ".notify-history.log")
+DB_PATH = os.path.join(CLAUDE_DIR, ".notify-history.db")
+CONFIG_PATH = os.path.join(CLAUDE_DIR, "notify-config.json")
+
+DEFAULT_MAX_MB = 20
+PAGE_MAX = 200
+
+# Column order written by _claude_notify_history in notify.sh
+JOURNAL_COLUMNS = ["ts", "kind", "grp", "session_id", "event_key", "tool_name", "terminal", "title", "message"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY,
+    posted_at REAL NOT NULL,
+    dismissed_at REAL,
+    clicked_at REAL,
+    session_id TEXT NOT NULL DEFAULT '',
+    grp TEXT NOT NULL DEFAULT '',
+    event_key TEXT NOT NULL DEFAULT '',
+    tool_name TEXT NOT NULL DEFAULT '',
+    terminal TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL DEFAULT '',
+    message TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS notifications_posted ON notifications (posted_at, id);
+CREATE INDEX IF NOT EXISTS notifications_session ON notifications (session_id, posted_at);
+CREATE INDEX IF NOT EXISTS notifications_open ON notifications (grp, posted_at) WHERE dismissed_at IS NULL;
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notifications_fts USING fts5(
+    title, message, content='notifications', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS notifications_ai AFTER INSERT ON notifications BEGIN
+    INSERT INTO notifications_fts (rowid, title, message) VALUES (new.id, new.title, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS notifications_ad AFTER DELETE ON notifications BEGIN
+    INSERT INTO notifications_fts (notifications_fts, rowid, title, message)
+    VALUES ('delete', old.id, old.title, old.message);
+END;
+"""
+
+
+def connect(db_path=DB_PATH):
+    """Open the store, creating the schema on first use."""
+    fresh = not os.path.exists(db_path)
+    db = sqlite3.connect(db_path, timeout=5)
+    db.row_factory = sqlite3.Row
+    if fresh:
+        # Must be set before the first table exists for size-bounded retention
+        db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        os.chmod(db_path, 0o600)
+    db.execute("PRAGMA journal_mode = WAL")
+    db.executescript(SCHEMA)
+    try:
+        db.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError:
+        pass  # SQLite built without FTS5 — search falls back to LIKE
+    return db
+
+
+def has_fts(db):
+    return db.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'notifications_fts'"
+    ).fetchone() is not None
+
+
+def _max_bytes():
+    try:
+        with open(CONFIG_PATH) as f:
+            mb = float(json.load(f).get("history_max_mb", DEFAULT_MAX_MB))
+    except (OSError, ValueError, TypeError, AttributeError):
+        mb = DEFAULT_MAX_MB
+    return int(max(1, mb) * 1024 * 1024)
+
+
+def _parse_journal(path):
+    records = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) != len(JOURNAL_COLUMNS):
+                continue
+            rec = dict(zip(JOURNAL_COLUMNS, fields))
+            try:
+                rec["ts"] = float(rec["ts"].replace(",", "."))
+            except ValueError:
+                continue
+            records.append(rec)
+    return records
+
+
+def ingest(db_path=DB_PATH, journal_path=JOURNAL_PATH):
+    """Move journal lines into the store in one transaction. Returns rows applied."""
+    lock_path = db_path + ".lock"
+    with open(lock_path, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return 0  # another ingest is running and will pick these lines up
+        pending = journal_path + ".ingest"
+        # A leftover .ingest is from an interrupted run — apply it before taking more
+        if not os.path.exists(pending):
+            try:
+                os.rename(journal_path, pending)
+            except FileNotFoundError:
+                return 0
+        records = _parse_journal(pending)
+        db = connect(db_path)
+        try:
+            with db:
+                for rec in records:
+                    _apply(db, rec)
+            _enforce_retention(db, _max_bytes())
+        finally:
+            db.close()
+        os.unlink(pending)
+        return len(records)
+
+
+def _apply(db, rec):
+    if rec["kind"] == "posted":
+        db.execute(
+            "INSERT INTO notifications (posted_at, session_id, grp, event_key, tool_name, terminal, title, message)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (rec["ts"], rec["session_id"], rec["grp"], rec["event_key"], rec["tool_name"],
+             rec["terminal"], rec["title"], rec["message"]),
+        )
+        return
+    column = {"dismissed": "dismissed_at", "clicked": "clicked_at"}.get(rec["kind"])
+    if column is None:
+        return
+    # The newest still-open notification of the group is the one being resolved
+    row = db.execute(
+        "SELECT id FROM notifications WHERE grp = ? AND posted_at <= ? AND dismissed_at IS NULL"
+        " ORDER BY posted_at DESC LIMIT 1",
+        (rec["grp"], rec["ts"]),
+    ).fetchone()
+    if row is None:
+        return
+    if column == "clicked_at":
+        db.execute("UPDATE notifications SET clicked_at = ?, dismissed_at = ? WHERE id = ?",
+                   (rec["ts"], rec["ts"], row["id"]))
+    else:
+        db.execute("UPDATE notifications SET dismissed_at = ? WHERE id = ?", (rec["ts"], row["id"]))
+
+
+def _enforce_retention(db, max_bytes):
+    """Delete the oldest rows so the store fits in max_bytes with 10% headroom."""
+    page_size = db.execute("PRAGMA page_size").fetchone()[0]
+    used = (db.execute("PRAGMA page_count").fetchone()[0]
+            - db.execute("PRAGMA freelist_count").fetchone()[0]) * page_size
+    if used <= max_bytes:
+        return
+    count = db.execute("SELECT COUNT(*) FROM notifications").fetchone()[0]
+    keep = int(count * max_bytes / used * 0.9)
+    with db:
+        db.execute(
+            "DELETE FROM notifications WHERE id IN"
+            " (SELECT id FROM notifications ORDER BY posted_at, id LIMIT ?)",
+            (count - keep,),
+        )
+        # FTS5 records deletes as tombstones; merging reclaims their space
+        if has_fts(db):
+            db.execute("INSERT INTO notifications_fts (notifications_fts) VALUES ('optimize')")
+    # executescript steps the pragma to completion; execute() would free one page
+    db.executescript("PRAGMA incremental_vacuum; PRAGMA wal_checkpoint(TRUNCATE);")
+
+
+def encode_cursor(row):
+    return f"{row['posted_at']!r}:{row['id']}"
+
+
+def decode_cursor(cursor):
+    posted, _, rowid = cursor.rpartition(":")
+    return float(posted), int(rowid)
+
+
+def query(db, text="", session_id="", event_key="", cursor=None, limit=50):
+    """Newest-first page of notifications and the cursor for the next page.
+
+    Keyset pagination on (posted_at, id): each page continues strictly below the
+    last row of the previous one, so pages stay stable while new rows arrive.
+    """
+    limit = max(1, min(PAGE_MAX, int(limit)))
+    where, args = [], []
+    if text:
+        if has_fts(db):
+            # Quote each term so user input is matched literally, not as FTS syntax
+            terms = " ".join('"' + t.replace('"', '""') + '"' for t in text.split())
+            where.append("n.id IN (SELECT rowid FROM notifications_fts WHERE notifications_fts MATCH ?)")
+            args.append(terms)
+        else:
+            where.append("(n.message LIKE ? OR n.title LIKE ?)")
+            args += [f"%{text}%"] * 2
+    if session_id:
+        where.append("n.session_id = ?")
+        args.append(session_id)
+    if event_key:
+        where.append("n.event_key = ?")
+        args.append(event_key)
+    if cursor:
+        posted, rowid = decode_cursor(cursor)
+        where.append("(n.posted_at, n.id) < (?, ?)")
+        args += [posted, rowid]
+    sql = "SELECT n.* FROM notifications n"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY n.posted_at DESC, n.id DESC LIMIT ?"
+    rows = db.execute(sql, args + [limit + 1]).fetchall()
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Claude Code notification history.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    sub.add_parser("ingest", help="move the hook journal into the store")
+    p_search = sub.add_parser("search", help="print matching notifications, newest first")
+    p_search.add_argument("text", nargs="?", default="", help="full-text query over title and message")
+    p_search.add_argument("--session", default="", help="only this session_id")
+    p_search.add_argument("--event", default="", help="only this event key, e.g. permission_request")
+    p_search.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.mode == "ingest":
+        print(json.dumps({"ingested": ingest()}))
+        return
+    ingest()
+    db = connect()
+    try:
+        page = query(db, args.text, args.session, args.event, limit=args.limit)
+    finally:
+        db.close()
+    for item in page["items"]:
+        posted = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(item["posted_at"]))
+        state = "clicked" if item["clicked_at"] else "dismissed" if item["dismissed_at"] else "open"
+        print(f"{posted}  {item['event_key']:<20} {state:<9} {item['session_id'][:8]:<8}  {item['message']}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
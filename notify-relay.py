@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Claude Code Notifications — remote session relay
+
+Delivers notifications from Claude Code running on a remote host (over SSH or
+in a container) through the local notify.sh. No external dependencies — uses
+only Python 3 stdlib.
+
+Wire format: newline-delimited records in the same tab-separated layout as
+`notify.sh --record` captures (timestamp, terminal env columns, raw payload).
+
+  Mac (local):   python3 ~/.claude/notify-relay.py serve [--listen ADDR]
+  Remote host:   python3 notify-relay.py agent --upstream ADDR [--listen PORT]
+                 and CLAUDE_NOTIFY_RELAY=PORT in the environment of Claude Code,
+                 with plain `bash ~/.claude/notify.sh` hooks for every event
+
+On the remote host notify.sh forwards each event with one connect + write to
+the agent on loopback (bash /dev/tcp, no forks). The agent batches records onto
+a single persistent connection to the receiver and reconnects with backoff;
+the receiver feeds each record to the local notify.sh, so delivery and
+click-to-focus work as for a local session. Terminal columns that fail
+ENV_PATTERNS are dropped on receipt. The pending-gated dismiss hooks install.sh
+writes never fire on the remote (nothing is pending there).
+
+ADDR is unix:/path/to.sock, HOST:PORT or PORT. Typical setup forwards the
+receiver socket with: ssh -R /tmp/claude-notify.sock:$HOME/.claude/.notify-relay.sock host
+"""
+
+import argparse
+import collections
+import os
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_SOCKET = os.path.expanduser("~/.claude/.notify-relay.sock")
+DEFAULT_HOOK = os.path.expanduser("~/.claude/notify.sh")
+DEFAULT_AGENT_PORT = 47821
+
+# Column order written by _claude_notify_record_line in notify.sh
+ENV_COLUMNS = [
+    "TERM_PROGRAM", "ITERM_SESSION_ID", "TERMINAL_EMULATOR",
+    "CLAUDE_JB_NOTIFY_PORT", "CLAUDE_JB_TAB_ID", "CLAUDE_JB_IDE_PID",
+]
+
+# What each column may hold. Relayed values end up in the notification's click
+# command, so anything outside these is dropped rather than escaped.
+ENV_PATTERNS = {
+    "TERM_PROGRAM": re.compile(r"[A-Za-z0-9._ -]{1,64}"),
+    "ITERM_SESSION_ID": re.compile(r"[A-Za-z0-9:-]{1,128}"),
+    "TERMINAL_EMULATOR": re.compile(r"[A-Za-z0-9._ -]{1,64}"),
+    "CLAUDE_JB_NOTIFY_PORT": re.compile(r"[0-9]{1,5}"),
+    "CLAUDE_JB_TAB_ID": re.compile(r"[A-Za-z0-9-]{1,128}"),
+    "CLAUDE_JB_IDE_PID": re.compile(r"[0-9]{1,10}"),
+}
+
+BATCH_MAX = 64          # records per send
+BATCH_WAIT = 0.02       # seconds to wait for more records before sending
+QUEUE_MAX = 10000       # records buffered while the upstream is unreachable
+BACKOFF_MAX = 10.0
+
+
+def parse_address(addr):
+    """Return (family, sockaddr) for unix:/path, HOST:PORT or PORT."""
+    if addr.startswith("unix:"):
+        return socket.AF_UNIX, os.path.expanduser(addr[5:])
+    host, _, port = addr.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def parse_record(line):
+    """Split a record line into (env, payload); None if malformed."""
+    fields = line.rstrip("\n").split("\t", len(ENV_COLUMNS) + 1)
+    if len(fields) != len(ENV_COLUMNS) + 2:
+        return None
+    return dict(zip(ENV_COLUMNS, fields[1:-1])), fields[-1]
+
+
+def clean_env(env_cols):
+    """Keep the captured columns that match ENV_PATTERNS; return (env, dropped names)."""
+    env, dropped = {}, []
+    for key, value in env_cols.items():
+        if not value:
+            continue
+        if ENV_PATTERNS[key].fullmatch(value):
+            env[key] = value
+        else:
+            dropped.append(key)
+    return env, dropped
+
+
+def log(msg):
+    print(f"[{time.strftime('%H:%M:%S')}] {msg}", file=sys.stderr, flush=True)
+
+
+# --- Local receiver -----------------------------------------------------------
+
+class Receiver:
+    """Accepts relay connections and runs notify.sh for each record, in order."""
+
+    def __init__(self, hook):
+        self.hook = hook
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.delivered = 0
+
+    def submit(self, line):
+        with self.cond:
+            self.queue.append(line)
+            self.cond.notify()
+
+    def worker(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                line = self.queue.popleft()
+            rec = parse_record(line)
+            if rec is None:
+                continue
+            env_cols, payload = rec
+            env_cols, dropped = clean_env(env_cols)
+            if dropped:
+                log(f"dropped malformed {', '.join(dropped)}")
+            env = dict(os.environ)
+            # Remote terminal context only overrides ours when it was captured
+            env.update(env_cols)
+            env.pop("CLAUDE_NOTIFY_RELAY", None)
+            try:
+                subprocess.run(["bash", self.hook], input=payload.encode(), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+                self.delivered += 1
+            except (OSError, subprocess.TimeoutExpired) as e:
+                log(f"hook failed: {e}")
+
+    def handle(self, conn):
+        with conn, conn.makefile("r", encoding="utf-8", errors="replace") as rfile:
+            for line in rfile:
+                if line.strip():
+                    self.submit(line)
+
+
+def serve(args):
+    family, addr = parse_address(args.listen)
+    receiver = Receiver(args.hook)
+    threading.Thread(target=receiver.worker, daemon=True).start()
+
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if family == socket.AF_UNIX:
+        try:
+            os.unlink(addr)
+        except FileNotFoundError:
+            pass
+    else:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(addr)
+    if family == socket.AF_UNIX:
+        os.chmod(addr, 0o600)
+    sock.listen(16)
+    log(f"receiver listening on {args.listen}")
+    while True:
+        conn, _ = sock.accept()
+        threading.Thread(target=receiver.handle, args=(conn,), daemon=True).start()
+
+
+# --- Remote agent -------------------------------------------------------------
+
+class Uplink:
+    """Batches records onto one persistent upstream connection."""
+
+    def __init__(self, upstream):
+        self.family, self.addr = parse_address(upstream)
+        self.queue = collections.deque(maxlen=QUEUE_MAX)
+        self.cond = threading.Condition()
+        self.sock = None
+        self.sent = 0
+        self.dropped = 0
+
+    def submit(self, line):
+        with self.cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(line if line.endswith("\n") else line + "\n")
+            self.cond.notify()
+
+    def _connect(self):
+        delay = 0.5
+        while True:
+            try:
+                sock = socket.socket(self.family, socket.SOCK_STREAM)
+                sock.connect(self.addr)
+                log("connected upstream")
+                return sock
+            except OSError as e:
+                sock.close()
+                log(f"upstream unavailable ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+
+    def sender(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                # Give concurrent hooks a moment to coalesce into one write
+                deadline = time.monotonic() + BATCH_WAIT
+                while len(self.queue) < BATCH_MAX:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self.cond.wait(remaining):
+                        break
+                batch = [self.queue.popleft() for _ in range(min(BATCH_MAX, len(self.queue)))]
+            if self.sock is None:
+                self.sock = self._connect()
+            try:
+                self.sock.sendall("".join(batch).encode())
+                self.sent += len(batch)
+            except OSError as e:
+                log(f"upstream send failed ({e}); reconnecting")
+                self.sock.close()
+                self.sock = None
+                with self.cond:
+                    self.queue.extendleft(reversed(batch))
+
+
+def agent(args):
+    uplink = Uplink(args.upstream)
+    threading.Thread(target=uplink.sender, daemon=True).start()
+
+    class HookHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode("utf-8", errors="replace")
+                if line.strip():
+                    uplink.submit(line)
+
+    class Server(socketserver.ThreadingTCPServer):
+        allow_reuse_address = True
+        daemon_threads = True
+
+    with Server(("127.0.0.1", args.listen), HookHandler) as server:
+        log(f"agent listening on 127.0.0.1:{args.listen}, upstream {args.upstream}")
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay Claude Code hook events from remote hosts.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_serve = sub.add_parser("serve", help="local receiver: deliver relayed events via notify.sh")
+    p_serve.add_argument("--listen", default=f"unix:{DEFAULT_SOCKET}",
+                         help=f"unix:/path, HOST:PORT or PORT (default: unix:{DEFAULT_SOCKET})")
+    p_serve.add_argument("--hook", default=DEFAULT_HOOK, help="notify.sh to run for each event")
+
+    p_agent = sub.add_parser("agent", help="remote agent: forward hook events upstream")
+    p_agent.add_argument("--upstream", required=True, help="receiver address: unix:/path, HOST:PORT or PORT")
+    p_agent.add_argument("--listen", type=int, default=DEFAULT_AGENT_PORT,
+                         help=f"loopback port hooks write to (default: {DEFAULT_AGENT_PORT})")
+
+    args = parser.parse_args()
+    try:
+        serve(args) if args.mode == "serve" else agent(args)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
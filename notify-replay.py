@@ -0,0 +1,1112 @@
+#!/usr/bin/env python3
+"""Claude Code Notifications — hook traffic replay
+
+Feeds a capture recorded with `notify.sh --record start` back through notify.sh
+inside a throwaway $HOME, with stub terminal-notifier/afplay/osascript/open/curl
+binaries, and reports throughput, hook latency, hook CPU time, timer counts and
+state-store growth. No external dependencies — uses only Python 3 stdlib.
+
+Usage: python3 notify-replay.py CAPTURE [CAPTURE ...] [--speed 1|N|max]
+                                [--jobs N] [--hook PATH] [--stub-latency SEC]
+       python3 notify-replay.py --synthetic 500 --speed max --dismiss-command CMD
+                                [--shell "bash --posix"]
+       python3 notify-replay.py --click [--runs N] [--budget-ms MS]
+                                [--stub-latency osascript=0.3,open=0.1]
+       python3 notify-replay.py --async
+       python3 notify-replay.py --gc [N]
+       python3 notify-replay.py --install [--budget-ms MS]
+       python3 notify-replay.py --shed
+       python3 notify-replay.py --rules
+       python3 notify-replay.py --dedupe
+       python3 notify-replay.py --sinks
+       python3 notify-replay.py --cleanup [--stub-latency terminal-notifier=0.1,lsregister=0.2]
+
+--command / --dismiss-command run each event through a shell command exactly as
+written in settings.json (--dismiss-command for PostToolUse and UserPromptSubmit,
+e.g. the gated entry install.sh writes), so hook registrations can be compared.
+Commands run under --shell (default /bin/sh). On macOS /bin/sh is bash, which
+execs a plain command but forks for a compound one; "bash --posix" reproduces
+that process tree elsewhere.
+notify.sh is installed at ~/.claude/notify.sh inside the sandbox.
+
+--click benchmarks notify-click.sh instead: every TERM_APP branch is clicked
+--runs times against the stubs, and the end-to-end click-to-focus time and
+the per-step timings the handler logs are reported per terminal. Simulate
+real latencies with --stub-latency NAME=SEC,... (a bare number applies to every
+stub). The JetBrains plugin is played by a local stand-in HTTP server; its
+scenarios cover a live plugin (with and without a captured IDE PID), a plugin
+whose port has closed and an IDE that has exited, and report how many /focus
+requests reached the stand-in.
+
+--async turns on non-blocking hook mode (notify.sh --async on) with a
+terminal-notifier stub that hangs for ASYNC_HANG seconds and
+CLAUDE_NOTIFY_DEADLINE=ASYNC_DEADLINE. It sends one PermissionRequest, then
+checks that the hook returned within ASYNC_RETURN_MS, and that the worker
+killed the hanging notifier call at the deadline instead of waiting it out.
+It then sends a PostToolUse from another session through the gated command
+under "bash --posix" and checks the worker dismissed by instance PID although
+the sh that ran the hook had exited. Exits 1 on any mismatch.
+
+--gc seeds the marker directory with N (default 100000) stale entries — an
+equal mix of unresolved session markers, dismiss-timer PID files and instance
+markers whose processes are gone — then runs `notify.sh --gc --budget 500` (the
+hook path's pass) and a full `notify.sh --gc`. Checks that the budgeted pass
+examines no more than its budget, that the two reports account for every entry
+and that no marker is left. Exits 1 on any mismatch.
+
+--install runs install.sh from a copy of the repo in a sandbox, with the macOS
+tools it calls (sips, iconutil, osacompile, codesign, lsregister, defaults,
+killall, pgrep, open, osascript) stubbed. It first checks the --dry-run report
+for a fresh install over hooks from an earlier version, then installs, then
+re-runs. The re-run must finish within --budget-ms (default 1000) without
+rebuilding anything. A dry run then must report nothing, and one after a source
+edit must report only that file. Exits 1 on any mismatch.
+
+--shed drives notify.sh's adaptive load shedding with synthetic load and
+delivery-latency signals (CLAUDE_NOTIFY_LOAD / CLAUDE_NOTIFY_LATENCY_MS) and
+checks the level, and what gets delivered, after every step. Exits 1 on any
+mismatch.
+
+--rules configures routing rules with malformed entries ahead of valid ones
+(a tool list, a numeric event, a string action, a non-string message or cwd, a
+bad regex) and checks what each event in RULES_STEPS delivers: posted or not,
+through Do Not Disturb or not, with or without sound. It then sends
+RULES_MCP_TOOLS distinct MCP tool names and checks the rules memo stays within
+its cap. Exits 1 on any mismatch.
+
+--dedupe sends DEDUPE_STEPS through one session without dismissing anything:
+a permission request, the same dialog as a permission_prompt Notification and
+as a repeat, a second request for the same tool with a different input (as
+after a denial), and a repeated completion. Checks that each duplicate is
+dropped and each new request is posted. Exits 1 on any mismatch.
+
+--sinks checks fan-out delivery (notify-sinks.py) against a local stand-in
+webhook receiver and a file sink: events posted while the receiver is down are
+retried and arrive once it starts, and a burst of concurrent hooks arrives
+complete and without duplicates. It also checks the spool of waiting events
+survives a config that is briefly empty mid-save, and that a sink whose name
+shares the file sink's spool file is rejected. Reports hook latency with sinks configured and
+the per-sink counters. Exits 1 if any event is lost or duplicated.
+
+--cleanup trashes the launcher in a sandbox that has every legacy bundle, open
+sessions with live dismiss timers, hooks in settings.json and an editor
+extension, then sends one event. It reports how long that hook took, how long
+the detached cleanup took, and what the same external calls would cost run
+one after another (stub latencies default to terminal-notifier=0.1,
+lsregister=0.2). Exits 1 if anything is left behind.
+"""
+
+import argparse
+import concurrent.futures
+import http.server
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Column order written by _claude_notify_record_line in notify.sh
+ENV_COLUMNS = [
+    "TERM_PROGRAM", "ITERM_SESSION_ID", "TERMINAL_EMULATOR",
+    "CLAUDE_JB_NOTIFY_PORT", "CLAUDE_JB_TAB_ID", "CLAUDE_JB_IDE_PID",
+]
+
+STUB_BINARIES = ["afplay", "osascript", "open", "curl", "killall", "sqlite3"]
+
+DEFAULT_COMMAND = "bash ~/.claude/notify.sh"
+# The gated PostToolUse entry install.sh writes: sh forks for it, so notify.sh's
+# parent is an sh that exits as soon as the hook returns
+GATED_COMMAND = "[ -e ~/.claude/.persistent-notifications/.pending ] && bash ~/.claude/notify.sh || true"
+
+STUB_SCRIPT = """#!/bin/sh
+echo "$(basename "$0") $*" >> "{log}"
+{body}
+"""
+
+
+def read_capture(paths):
+    """Parse capture files into (timestamp, env, payload) tuples, oldest first."""
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t", len(ENV_COLUMNS) + 1)
+                if len(fields) != len(ENV_COLUMNS) + 2:
+                    continue
+                try:
+                    ts = float(fields[0].replace(",", "."))
+                except ValueError:
+                    continue
+                env = dict(zip(ENV_COLUMNS, fields[1:-1]))
+                records.append((ts, env, fields[-1]))
+    records.sort(key=lambda r: r[0])
+    return records
+
+
+def synthetic_agent_run(tool_calls, session_id="synthetic-session"):
+    """One agent turn: a prompt, N tool calls with a permission request every
+    50th call, and a Stop — the shape of a long unattended run."""
+    def rec(ts, payload):
+        payload.setdefault("session_id", session_id)
+        return (ts, {}, json.dumps(payload))
+
+    records = [rec(0.0, {"hook_event_name": "UserPromptSubmit", "prompt": "go"})]
+    ts = 0.0
+    for i in range(tool_calls):
+        ts += 1.0
+        if i % 50 == 49:
+            records.append(rec(ts, {"hook_event_name": "PermissionRequest", "tool_name": "Bash"}))
+            ts += 1.0
+        records.append(rec(ts, {"hook_event_name": "PostToolUse", "tool_name": "Read"}))
+    records.append(rec(ts + 1.0, {"hook_event_name": "Stop"}))
+    return records
+
+
+# (label, TERM_APP, TAB_ID) — one per branch of notify-click.sh. In JetBrains
+# TAB_IDs {port} is the stand-in plugin server, {closed_port} a port nothing
+# listens on, {pid} a live process and {dead_pid} one that has exited.
+CLICK_SCENARIOS = [
+    ("iTerm2", "iTerm.app", "w0t0p0:6A1F2C3D-0000-4000-8000-000000000001"),
+    ("iTerm2 (no tab)", "iTerm.app", ""),
+    ("Terminal.app", "Apple_Terminal", "/dev/ttys003"),
+    ("Warp", "WarpTerminal", ""),
+    ("Cursor", "Cursor", "4242,4241,4240"),
+    ("VS Code", "Visual Studio Code", "4242,4241,4240"),
+    ("VSCodium", "VSCodium", "4242,4241,4240"),
+    ("JetBrains (plugin)", "JetBrains", "0b7c6f1e-tab|{port}|{pid}"),
+    ("JetBrains (plugin, no PID)", "JetBrains", "0b7c6f1e-tab|{port}|"),
+    ("JetBrains (plugin gone)", "JetBrains", "0b7c6f1e-tab|{closed_port}|{pid}"),
+    ("JetBrains (IDE exited)", "JetBrains", "0b7c6f1e-tab|{closed_port}|{dead_pid}"),
+    ("JetBrains (no plugin)", "JetBrains", ""),
+    ("Other terminal", "Alacritty", ""),
+]
+
+
+class Sandbox:
+    """A throwaway $HOME: stub binaries that log every call to self.log, and
+    self.env to run the hook in. With a hook, it is installed at
+    ~/.claude/notify.sh next to the click handler, the repo's default config
+    and a terminal-notifier stub. stub_latency maps stub name (or "*") to
+    seconds each stub sleeps."""
+
+    def __init__(self, prefix, hook=None, stub_latency=None):
+        self.root = tempfile.mkdtemp(prefix=prefix)
+        self.home = os.path.join(self.root, "home")
+        self.claude_dir = os.path.join(self.home, ".claude")
+        self.marker_dir = os.path.join(self.claude_dir, ".persistent-notifications")
+        self.config_path = os.path.join(self.claude_dir, "notify-config.json")
+        self.notifier = os.path.join(self.claude_dir, "ClaudeNotifications.app", "Contents", "MacOS",
+                                     "terminal-notifier")
+        self.bin_dir = os.path.join(self.root, "bin")
+        self.log = os.path.join(self.root, "stub-calls.log")
+        self.stub_latency = stub_latency or {}
+        os.makedirs(self.claude_dir)
+        os.makedirs(self.bin_dir)
+        self.env = {k: v for k, v in os.environ.items()
+                    if k not in ENV_COLUMNS and not k.startswith("CLAUDE_JB_")}
+        self.env.update(HOME=self.home, PATH=self.bin_dir + os.pathsep + os.environ.get("PATH", ""))
+        if hook is None:
+            return
+        os.makedirs(os.path.dirname(self.notifier))
+        shutil.copy(os.path.join(REPO_DIR, "notify-config.json"), self.claude_dir)
+        shutil.copy(hook, os.path.join(self.claude_dir, "notify.sh"))
+        shutil.copy(os.path.join(REPO_DIR, "notify-click.sh"), self.claude_dir)
+        for name in STUB_BINARIES:
+            self.stub(name)
+        self.stub(self.notifier)
+
+    def stub(self, path, body=None):
+        """Write a logging stub at path (a bare name goes in bin/). Without a
+        body it sleeps its stub latency."""
+        if os.sep not in path:
+            path = os.path.join(self.bin_dir, path)
+        if body is None:
+            name = os.path.basename(path)
+            latency = self.stub_latency.get(name, self.stub_latency.get("*", 0.0))
+            body = f"sleep {latency}" if latency > 0 else ""
+        with open(path, "w") as f:
+            f.write(STUB_SCRIPT.format(log=self.log, body=body))
+        os.chmod(path, 0o755)
+        return path
+
+    def configure(self, **settings):
+        """Merge settings into the sandbox's notify-config.json."""
+        with open(self.config_path) as f:
+            config = json.load(f)
+        config.update(settings)
+        with open(self.config_path, "w") as f:
+            json.dump(config, f)
+
+    def hook(self, payload, **env):
+        """Run the installed notify.sh on payload (a dict is sent as JSON) with
+        extra env; return its wall time in ms."""
+        if not isinstance(payload, str):
+            payload = json.dumps(payload)
+        start = time.perf_counter()
+        subprocess.run(["bash", os.path.join(self.claude_dir, "notify.sh")], input=payload, text=True,
+                       env=dict(self.env, **env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return (time.perf_counter() - start) * 1000
+
+    def calls(self, reset=False):
+        """Stub calls logged so far, one "name args..." line each; reset empties the log."""
+        try:
+            with open(self.log) as f:
+                calls = f.read().splitlines()
+        except FileNotFoundError:
+            calls = []
+        if reset:
+            open(self.log, "w").close()
+        return calls
+
+    def posts(self, reset=False):
+        """The terminal-notifier calls that posted a notification."""
+        return [c for c in self.calls(reset) if c.startswith("terminal-notifier") and "-title" in c]
+
+
+def state_usage(marker_dir):
+    """Return (entries, bytes, timer files) for the marker directory."""
+    entries = size = timers = 0
+    try:
+        with os.scandir(marker_dir) as it:
+            for entry in it:
+                entries += 1
+                if entry.name.endswith(".dpid"):
+                    timers += 1
+                try:
+                    size += entry.stat().st_size
+                except OSError:
+                    pass
+    except FileNotFoundError:
+        pass
+    return entries, size, timers
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class _PluginStandIn(http.server.BaseHTTPRequestHandler):
+    """Answers /focus like the JetBrains plugin and counts the requests."""
+
+    focus_requests = 0
+
+    def do_GET(self):
+        if self.path.startswith("/focus"):
+            type(self).focus_requests += 1
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def click_bench(runs, stub_latency, budget_ms):
+    """Click every notify-click.sh branch `runs` times; report per-terminal timings."""
+    sb = Sandbox("notify-click-bench-", os.path.join(REPO_DIR, "notify.sh"), stub_latency)
+    handler = os.path.join(sb.claude_dir, "notify-click.sh")
+    env = sb.env
+
+    plugin = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _PluginStandIn)
+    threading.Thread(target=plugin.serve_forever, daemon=True).start()
+    exited = subprocess.Popen(["true"])
+    exited.wait()
+    fill = {"port": plugin.server_address[1], "closed_port": _closed_port(),
+            "pid": os.getpid(), "dead_pid": exited.pid}
+
+    terminals = {}
+    for label, term_app, tab_id in CLICK_SCENARIOS:
+        tab_id = tab_id.format(**fill)
+        timings = os.path.join(sb.root, f"timings-{len(terminals)}.tsv")
+        env["CLAUDE_NOTIFY_CLICK_TIMINGS"] = timings
+        _PluginStandIn.focus_requests = 0
+        wall = []
+        for i in range(runs):
+            start = time.perf_counter()
+            subprocess.run(["bash", handler, term_app, tab_id, f"bench-{i}"], env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            wall.append(time.perf_counter() - start)
+        steps = {}
+        if os.path.exists(timings):
+            with open(timings) as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) == 4:
+                        steps.setdefault(fields[2], []).append(float(fields[3]))
+        p95 = percentile(wall, 95) * 1000
+        terminals[label] = {
+            "term_app": term_app,
+            "click_ms": {
+                "p50": round(percentile(wall, 50) * 1000, 2),
+                "p95": round(p95, 2),
+                "max": round(max(wall) * 1000, 2),
+            },
+            "steps_p50_ms": {step: round(percentile(v, 50), 2) for step, v in steps.items()},
+            "over_budget": p95 > budget_ms,
+        }
+        if term_app == "JetBrains" and tab_id:
+            terminals[label]["plugin_focus_requests"] = _PluginStandIn.focus_requests
+    plugin.shutdown()
+    plugin.server_close()
+    return {"runs": runs, "budget_ms": budget_ms, "stub_latency_s": stub_latency,
+            "terminals": terminals, "ok": not any(t["over_budget"] for t in terminals.values()),
+            "sandbox": sb.root}
+
+
+# (label, seconds to wait first, CLAUDE_NOTIFY_LOAD, CLAUDE_NOTIFY_LATENCY_MS, event,
+#  expected level, notifier posts?, sound plays?, tab-level focus?)
+SHED_STEPS = [
+    ("idle",                        0,   "0.2", None,   "Stop",              0, True,  True,  True),
+    ("busy CPU",                    0,   "1.6", None,   "Stop",              1, True,  True,  False),
+    ("busier CPU",                  0,   "2.6", None,   "Stop",              2, True,  False, False),
+    ("overloaded, completion",      0,   "4.5", None,   "Stop",              3, False, False, False),
+    ("overloaded, permission",      0,   "4.5", None,   "PermissionRequest", 3, True,  False, False),
+    ("load gone, holds level",      0,   "0.1", None,   "Stop",              3, False, False, False),
+    ("recovering",                  1.1, "0.1", None,   "Stop",              2, True,  False, False),
+    ("recovering",                  1.1, "0.1", None,   "Stop",              1, True,  True,  False),
+    ("recovered",                   1.1, "0.1", None,   "Stop",              0, True,  True,  True),
+    ("slow delivery",               0,   "0.1", "3000", "Stop",              1, True,  True,  False),
+    ("slower delivery",             0,   "0.1", "3000", "Stop",              2, True,  False, False),
+]
+SHED_RECOVER_SECONDS = 1
+
+
+ASYNC_DEADLINE = 1.0     # CLAUDE_NOTIFY_DEADLINE for the worker
+ASYNC_HANG = 30.0        # how long the terminal-notifier stub hangs
+ASYNC_RETURN_MS = 500.0  # the hook itself must hand off within this
+ASYNC_KILL_SLACK = 1.0   # seconds past the deadline the stub may still be alive
+
+
+def async_bench(hook):
+    """Post through a hanging notifier in --async mode; check the hook returns and the call is cut off."""
+    sb = Sandbox("notify-async-", hook)
+    pids = os.path.join(sb.root, "notifier-pids")
+    # exec keeps the PID, so the bench can watch the very process the deadline must kill
+    sb.stub(sb.notifier, f'echo "$$ $*" >> "{pids}"\nexec sleep {ASYNC_HANG}')
+    sb.env["CLAUDE_NOTIFY_DEADLINE"] = str(ASYNC_DEADLINE)
+    subprocess.run(["bash", os.path.join(sb.claude_dir, "notify.sh"), "--async", "on"], env=sb.env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    start = time.perf_counter()
+    hook_ms = sb.hook({"hook_event_name": "PermissionRequest", "session_id": "async", "tool_name": "Bash"})
+
+    # Wait for the worker to reach the notifier, then for that call to die
+    post_pid = None
+    deadline = time.monotonic() + ASYNC_HANG
+    while post_pid is None and time.monotonic() < deadline:
+        if os.path.exists(pids):
+            with open(pids) as f:
+                post_pid = next((int(l.split()[0]) for l in f if "-title" in l), None)
+        time.sleep(0.01)
+    killed_ms = None
+    while post_pid is not None and time.monotonic() < deadline:
+        try:
+            os.kill(post_pid, 0)
+        except ProcessLookupError:
+            killed_ms = (time.perf_counter() - start) * 1000
+            break
+        time.sleep(0.01)
+
+    # A dismiss through the gated command from a new session (a context clear) can
+    # only match the instance marker, which the worker must find after its sh is gone
+    instance_marker = os.path.join(sb.marker_dir, f"pid-{os.getpid()}")
+    while not os.path.exists(instance_marker) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    marked = os.path.exists(instance_marker)
+    subprocess.run(["bash", "--posix", "-c", GATED_COMMAND], text=True, env=sb.env,
+                   input=json.dumps({"hook_event_name": "PostToolUse", "session_id": "async-cleared"}),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    dismiss_by = time.monotonic() + ASYNC_DEADLINE + ASYNC_KILL_SLACK
+    while os.path.exists(instance_marker) and time.monotonic() < dismiss_by:
+        time.sleep(0.01)
+
+    # Any notifier still hanging (e.g. a dismiss timer's -remove) is the bench's to clean up
+    with open(pids) as f:
+        for line in f:
+            try:
+                os.kill(int(line.split()[0]), 9)
+            except (ProcessLookupError, ValueError):
+                pass
+    checks = {
+        "hook_returned": hook_ms <= ASYNC_RETURN_MS,
+        "notifier_called": post_pid is not None,
+        "killed_at_deadline": killed_ms is not None
+                              and ASYNC_DEADLINE * 1000 <= killed_ms <= (ASYNC_DEADLINE + ASYNC_KILL_SLACK) * 1000,
+        "instance_marked": marked,
+        "gated_dismiss_by_instance": marked and not os.path.exists(instance_marker),
+    }
+    return {
+        "deadline_s": ASYNC_DEADLINE,
+        "stub_hang_s": ASYNC_HANG,
+        "hook_ms": round(hook_ms, 2),
+        "notifier_killed_after_ms": round(killed_ms, 2) if killed_ms is not None else None,
+        "checks": checks,
+        "ok": all(checks.values()),
+        "sandbox": sb.root,
+    }
+
+
+GC_BUDGET = 500
+GC_DEAD_PID = 10_000_000  # above pid_max on macOS and Linux, so never a live process
+
+
+def gc_bench(hook, entries):
+    """Seed `entries` stale markers, run a budgeted and a full --gc pass, check both reports."""
+    sb = Sandbox("notify-gc-", hook)
+    marker_dir = sb.marker_dir
+    os.makedirs(marker_dir)
+    old = time.time() - 2 * 86400
+    per_kind = entries // 3
+    for i in range(per_kind):
+        sid = os.path.join(marker_dir, f"stale-{i}")
+        with open(sid, "w") as f:
+            f.write(f"claude-code-stale-{i}\n")
+        os.utime(sid, (old, old))
+        with open(os.path.join(marker_dir, f"timer-{i}.dpid"), "w") as f:
+            f.write(f"{GC_DEAD_PID + i}\n")
+        with open(os.path.join(marker_dir, f"pid-{GC_DEAD_PID + i}"), "w") as f:
+            f.write(f"claude-code-gone-{i}\n")
+    seeded = per_kind * 3
+
+    def run(*args):
+        start = time.perf_counter()
+        proc = subprocess.run(["bash", os.path.join(sb.claude_dir, "notify.sh"), "--gc", *args],
+                              env=sb.env, capture_output=True, text=True)
+        wall_ms = (time.perf_counter() - start) * 1000
+        try:
+            report = json.loads(proc.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            report = {}
+        report["wall_ms"] = round(wall_ms, 1)
+        return report
+
+    budgeted = run("--budget", str(GC_BUDGET))
+    full = run()
+    left = [name for name in os.listdir(marker_dir) if not name.startswith(".")]
+    removes = sum(c.startswith("terminal-notifier -remove") for c in sb.calls())
+    reclaimed = sum(r.get("markers", 0) + r.get("timers", 0) for r in (budgeted, full))
+    groups = sum(r.get("dismissed", 0) + r.get("dropped_groups", 0) for r in (budgeted, full))
+    checks = {
+        "budget_bounded": budgeted.get("scanned") == GC_BUDGET
+                          and budgeted.get("markers", 0) + budgeted.get("timers", 0) <= GC_BUDGET,
+        "all_scanned": budgeted.get("scanned", 0) + full.get("scanned", 0) == seeded,
+        "all_reclaimed": reclaimed == seeded,
+        "timers_counted": budgeted.get("timers", 0) + full.get("timers", 0) == per_kind,
+        "groups_counted": groups == 2 * per_kind,
+        "dismiss_capped": removes == budgeted.get("dismissed", -1) + full.get("dismissed", -1),
+        "directory_empty": not left,
+    }
+    return {
+        "entries": seeded,
+        "budgeted_pass": budgeted,
+        "full_pass": full,
+        "notifier_removes": removes,
+        "left_behind": len(left),
+        "checks": checks,
+        "ok": all(checks.values()),
+        "sandbox": sb.root,
+    }
+
+
+# Stubs for the macOS tools install.sh calls: each logs its arguments like the
+# other stubs and creates whatever output the next install step reads
+INSTALL_STUBS = {
+    "sips": 'while [ $# -gt 1 ]; do [ "$1" = --out ] && : > "$2"; shift; done',
+    "iconutil": 'while [ $# -gt 1 ]; do [ "$1" = -o ] && : > "$2"; shift; done',
+    "osacompile": 'while [ $# -gt 1 ]; do [ "$1" = -o ] && mkdir -p "$2/Contents/Resources"; shift; done',
+    "defaults": """case "$1" in
+  read) echo com.anthropic.claude-code-notifier ;;
+  export) printf '%s' '<?xml version="1.0" encoding="UTF-8"?><plist version="1.0"><dict><key>apps</key><array><dict><key>bundle-id</key><string>com.anthropic.claude-code-notifier</string><key>grouping</key><integer>2</integer></dict></array></dict></plist>' ;;
+  import) cat > /dev/null ;;
+esac""",
+    "codesign": "", "lsregister": "", "killall": "", "pgrep": "", "open": "", "osascript": "",
+}
+INSTALL_SOURCES = ["install.sh", "notify.sh", "notify-click.sh", "config-ui.py", "notify-relay.py",
+                   "notify-history.py", "notify-sinks.py", "notify-config.json",
+                   "ClaudeNotifications.plist", "icon.png"]
+INSTALL_BUILD_STUBS = ("sips", "iconutil", "osacompile", "codesign", "lsregister")
+INSTALL_KEYS = ["icon", "app", "notify.sh", "notify-click.sh", "config-ui.py", "notify-relay.py",
+                "notify-history.py", "notify-sinks.py", "launcher"]
+
+
+def install_bench(budget_ms):
+    """Install into a sandbox, then time a no-op re-run and check the dry-run reports."""
+    sb = Sandbox("notify-install-")
+    claude_dir = sb.claude_dir
+    src = os.path.join(sb.root, "src")
+    os.makedirs(os.path.join(src, "vendor"))
+    for name in INSTALL_SOURCES:
+        shutil.copy(os.path.join(REPO_DIR, name), src)
+    shutil.copytree(os.path.join(REPO_DIR, "vendor", "terminal-notifier.app"),
+                    os.path.join(src, "vendor", "terminal-notifier.app"))
+    for name, body in INSTALL_STUBS.items():
+        sb.stub(name, body)
+    sb.stub(os.path.join(src, "vendor", "terminal-notifier.app", "Contents", "MacOS", "terminal-notifier"), "")
+
+    # Hooks as an earlier version registered them, next to someone else's
+    settings_path = os.path.join(claude_dir, "settings.json")
+    plain = {"matcher": "", "hooks": [{"type": "command", "command": DEFAULT_COMMAND}]}
+    other = {"matcher": "", "hooks": [{"type": "command", "command": "echo other"}]}
+    with open(settings_path, "w") as f:
+        json.dump({"hooks": {"PostToolUse": [plain], "PreToolUse": [other]}}, f)
+    with open(settings_path) as f:
+        seeded = f.read()
+
+    sb.env.update(CLAUDE_NOTIFY_LSREGISTER=os.path.join(sb.bin_dir, "lsregister"),
+                  CLAUDE_NOTIFY_LAUNCHER=os.path.join(sb.root, "Applications", "ClaudeNotifications.app"))
+
+    def run(*args):
+        sb.calls(reset=True)
+        start = time.perf_counter()
+        proc = subprocess.run(["bash", os.path.join(src, "install.sh"), *args], input="\n",
+                              env=sb.env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        wall_ms = (time.perf_counter() - start) * 1000
+        built = sorted({c.split(" ", 1)[0] for c in sb.calls() if c.split(" ", 1)[0] in INSTALL_BUILD_STUBS})
+        would = [l.strip() for l in proc.stdout.splitlines() if l.strip().startswith("would ")]
+        return {"rc": proc.returncode, "wall_ms": round(wall_ms, 1), "built": built, "would": would}
+
+    fresh_dry = run("--dry-run")
+    with open(settings_path) as f:
+        untouched = f.read() == seeded and not os.path.exists(os.path.join(claude_dir, "notify.sh"))
+    first = run()
+    rerun = run()
+    rerun_dry = run("--dry-run")
+    with open(os.path.join(src, "notify.sh"), "a") as f:
+        f.write("\n# edited\n")
+    edited_dry = run("--dry-run")
+    with open(settings_path) as f:
+        hooks = json.load(f)["hooks"]
+
+    expected_fresh = [f"would update {key}: new" for key in INSTALL_KEYS] + [
+        "would add hooks: Notification, PermissionRequest, Stop, UserPromptSubmit",
+        "would upgrade hooks: PostToolUse (gated)",
+    ]
+    checks = {
+        "dry_run_reports_fresh_install": fresh_dry["rc"] == 0 and fresh_dry["would"] == expected_fresh,
+        "dry_run_changes_nothing": untouched and not fresh_dry["built"],
+        "first_run_installs": first["rc"] == 0 and set(first["built"]) == set(INSTALL_BUILD_STUBS),
+        "hooks_merged": hooks.get("PreToolUse") == [other] and len(hooks) == 6
+                        and hooks["PostToolUse"][0]["hooks"][0]["command"] != DEFAULT_COMMAND,
+        "rerun_within_budget": rerun["rc"] == 0 and rerun["wall_ms"] <= budget_ms,
+        "rerun_builds_nothing": not rerun["built"],
+        "dry_run_reports_nothing": rerun_dry["rc"] == 0 and not rerun_dry["would"],
+        "dry_run_reports_edit": edited_dry["would"] == ["would update notify.sh: source changed"],
+    }
+    return {
+        "fresh_dry_run": fresh_dry,
+        "first_run": first,
+        "rerun": rerun,
+        "rerun_dry_run": rerun_dry,
+        "edited_dry_run": edited_dry,
+        "checks": checks,
+        "ok": all(checks.values()),
+        "sandbox": sb.root,
+    }
+
+
+def shed_bench(hook):
+    """Step notify.sh through SHED_STEPS in one sandbox; report each step."""
+    sb = Sandbox("notify-shed-", hook)
+    # every step repeats the same event in one session
+    sb.configure(load_shedding={"recover_seconds": SHED_RECOVER_SECONDS}, dedupe_seconds=0)
+    sb.env["TERM_PROGRAM"] = "Apple_Terminal"
+
+    steps = []
+    for label, wait, load, latency, event, level, posts, sound, tab in SHED_STEPS:
+        time.sleep(wait)
+        sb.calls(reset=True)
+        step_env = {"CLAUDE_NOTIFY_LOAD": load}
+        if latency is not None:
+            step_env["CLAUDE_NOTIFY_LATENCY_MS"] = latency
+        sb.hook({"hook_event_name": event, "session_id": "shed", "tool_name": "Bash"}, **step_env)
+        time.sleep(0.1)  # afplay is started in the background
+        calls = sb.calls()
+        with open(os.path.join(sb.marker_dir, ".stats.json")) as f:
+            state = json.load(f)["load"]
+        post = next((c for c in calls if c.startswith("terminal-notifier") and "-title" in c), "")
+        got = (state["level"], bool(post), any(c.startswith("afplay") for c in calls),
+               "Apple_Terminal /dev/" in post)
+        steps.append({"step": label, "load": float(load), "latency_ms": state["latency_ms"],
+                      "level": got[0], "posted": got[1], "sound": got[2], "tab_focus": got[3],
+                      "ok": got == (level, posts, sound, tab)})
+    return {"steps": steps, "ok": all(s["ok"] for s in steps), "sandbox": sb.root}
+
+
+# Malformed rules first: each must be skipped, not take the other rules (or every
+# notification) down with it
+RULES = [
+    {"match": {"event": "permission_request", "tool": ["Read", "Glob"]}, "action": {"suppress": True}},
+    {"match": {"event": 5}, "action": {"suppress": True}},
+    {"match": {"tool": "Bash"}, "action": "suppress"},
+    {"match": {"message": ["rm"]}, "action": {"suppress": True}},
+    {"match": {"cwd": 7}, "action": {"suppress": True}},
+    {"match": {"tool": "Bash("}, "action": {"suppress": True}},
+    "suppress",
+    {"match": {"event": "permission_request", "tool": "Read|Glob"}, "action": {"suppress": True}},
+    {"match": {"tool": "Bash", "message": "rm -rf"}, "action": {"priority": "high"}},
+    {"match": {"cwd": "/tmp/scratch"}, "action": {"priority": "low"}},
+]
+# (label, event, tool_name, tool_input command, cwd, notifier posts?, through DND?, sound plays?)
+RULES_STEPS = [
+    ("Bash permission",          "PermissionRequest", "Bash", "ls",           "/work", True,  False, True),
+    ("Read permission",          "PermissionRequest", "Read", None,           "/work", False, False, False),
+    ("Glob permission",          "PermissionRequest", "Glob", None,           "/work", False, False, False),
+    ("rm -rf permission",        "PermissionRequest", "Bash", "rm -rf build", "/work", True,  True,  True),
+    ("completion in scratch",    "Stop",              None,   None,           "/tmp/scratch/app", True, False, False),
+    ("completion elsewhere",     "Stop",              None,   None,           "/work", True,  False, True),
+]
+RULES_MEMO_KEYS = 256  # notify.sh's cap on memoized (event, tool) keys
+RULES_MCP_TOOLS = 300
+
+
+def rules_bench(hook):
+    """Route events through RULES, malformed entries included; then check the memo stays capped."""
+    sb = Sandbox("notify-rules-", hook)
+    # Host load must not shed sounds or completions under the steps
+    sb.configure(rules=RULES, dedupe_seconds=0, load_shedding={"enabled": False})
+    steps = []
+    for n, (label, event, tool, command, cwd, posts, dnd, sound) in enumerate(RULES_STEPS):
+        sb.calls(reset=True)
+        payload = {"hook_event_name": event, "session_id": f"rules-{n}", "cwd": cwd}
+        if tool:
+            payload["tool_name"] = tool
+        if command:
+            payload["tool_input"] = {"command": command}
+        sb.hook(payload)
+        time.sleep(0.1)  # afplay is started in the background
+        calls = sb.calls()
+        post = next((c for c in calls if c.startswith("terminal-notifier") and "-title" in c), "")
+        got = (bool(post), "-ignoreDnD" in post, any(c.startswith("afplay") for c in calls))
+        steps.append({"step": label, "posted": got[0], "through_dnd": got[1], "sound": got[2],
+                      "ok": got == (posts, dnd, sound)})
+
+    # One memo key per distinct tool name: a stream of MCP tools must not grow it without bound
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: sb.hook({"hook_event_name": "PermissionRequest", "session_id": f"rules-mcp-{i}",
+                                         "tool_name": f"mcp__srv__tool_{i}"}), range(RULES_MCP_TOOLS)))
+    try:
+        with open(os.path.join(sb.marker_dir, ".rules-memo.json")) as f:
+            memo_keys = len(json.load(f)["keys"])
+    except (OSError, ValueError, KeyError):
+        memo_keys = 0  # the stage never got as far as writing it
+    checks = {
+        "steps": all(s["ok"] for s in steps),
+        "memo_capped": 0 < memo_keys <= RULES_MEMO_KEYS,
+    }
+    return {"steps": steps, "memo_keys": memo_keys, "checks": checks, "ok": all(checks.values()),
+            "sandbox": sb.root}
+
+
+# (label, payload, notifier posts?) — one session, in order, with no click or dismiss between
+DEDUPE_STEPS = [
+    ("Bash permission", {"hook_event_name": "PermissionRequest", "tool_name": "Bash",
+                         "tool_input": {"command": "npm test"}}, True),
+    ("same dialog as a notification", {"hook_event_name": "Notification", "notification_type": "permission_prompt",
+                                       "message": "Claude needs your permission to use Bash"}, False),
+    ("same request again", {"hook_event_name": "PermissionRequest", "tool_name": "Bash",
+                            "tool_input": {"command": "npm test"}}, False),
+    ("denied, another Bash request", {"hook_event_name": "PermissionRequest", "tool_name": "Bash",
+                                      "tool_input": {"command": "rm -rf build"}}, True),
+    ("its notification", {"hook_event_name": "Notification", "notification_type": "permission_prompt",
+                          "message": "Claude needs your permission to use Bash"}, False),
+    ("completion", {"hook_event_name": "Stop"}, True),
+    ("completion repeated", {"hook_event_name": "Stop"}, False),
+]
+
+
+def dedupe_bench(hook):
+    """Send DEDUPE_STEPS through one session; check which duplicates are dropped."""
+    sb = Sandbox("notify-dedupe-", hook)
+    # With permission_prompt notifications enabled as well, every permission dialog
+    # reaches the hook twice
+    with open(sb.config_path) as f:
+        events = json.load(f)["events"]
+    events["permission_prompt"] = dict(events["permission_request"])
+    sb.configure(events=events, load_shedding={"enabled": False})  # host load must not shed the completions
+    steps = []
+    for label, payload, posts in DEDUPE_STEPS:
+        sb.hook(dict(payload, session_id="dedupe"))
+        posted = bool(sb.posts(reset=True))
+        steps.append({"step": label, "posted": posted, "ok": posted == posts})
+    return {"steps": steps, "ok": all(s["ok"] for s in steps), "sandbox": sb.root}
+
+
+class _SinkReceiver(http.server.BaseHTTPRequestHandler):
+    """Stand-in webhook: records every event it is posted."""
+
+    events = []
+    posts = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with self.lock:
+            type(self).posts += 1
+            type(self).events.extend(body["events"])
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def sink_bench(hook, outage_events=5, burst_events=40, jobs=8, timeout=30.0):
+    sb = Sandbox("notify-sinks-", hook)
+    shutil.copy(os.path.join(REPO_DIR, "notify-sinks.py"), sb.claude_dir)
+    port = _closed_port()
+    sink_file = os.path.join(sb.root, "events.jsonl")
+    shadow_file = os.path.join(sb.root, "shadowed.jsonl")
+    sb.configure(sinks=[
+        {"name": "webhook", "type": "webhook", "url": f"http://127.0.0.1:{port}/events"},
+        {"name": "file sink", "type": "file", "path": sink_file},
+        # Same spool file as "file sink" once sanitized, so it must be rejected
+        {"name": "file_sink", "type": "file", "path": shadow_file},
+    ], load_shedding={"enabled": False})  # host load must not shed the Stop events
+    webhook_spool = os.path.join(sb.claude_dir, ".notify-sinks", "spool-webhook.jsonl")
+    status_cmd = ["python3", os.path.join(sb.claude_dir, "notify-sinks.py"), "status"]
+
+    hook_ms = []
+
+    def post(session_id):
+        hook_ms.append(sb.hook({"hook_event_name": "Stop", "session_id": session_id}))
+
+    def status():
+        out = subprocess.run(status_cmd, env=sb.env, capture_output=True, text=True).stdout
+        return json.loads(out)["sinks"]
+
+    def wait_delivered(count):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(s.get("delivered", 0) >= count for s in status().values()):
+                return True
+            time.sleep(0.25)
+        return False
+
+    # Receiver down: events wait in the webhook spool and are retried
+    sent = [f"outage-{i}" for i in range(outage_events)]
+    for sid in sent:
+        post(sid)
+    time.sleep(1.5)
+    during_outage = status()["webhook"]
+
+    # A settings save truncates the config before writing it; the running drainer
+    # reading it in between must keep the spool of events still waiting
+    with open(sb.config_path) as f:
+        saved = f.read()
+    open(sb.config_path, "w").close()
+    time.sleep(1.0)
+    with open(webhook_spool) if os.path.exists(webhook_spool) else open(os.devnull) as f:
+        kept_mid_save = sum(1 for _ in f)
+    with open(sb.config_path, "w") as f:
+        f.write(saved)
+    receiver = http.server.ThreadingHTTPServer(("127.0.0.1", port), _SinkReceiver)
+    threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    recovered = wait_delivered(len(sent))
+
+    # Receiver up: a burst of concurrent hooks
+    burst = [f"burst-{i}" for i in range(burst_events)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(post, burst))
+    sent += burst
+    complete = wait_delivered(len(sent))
+    receiver.shutdown()
+    receiver.server_close()
+
+    with open(sink_file) as f:
+        filed = [json.loads(line)["session_id"] for line in f]
+    received = [e["session_id"] for e in _SinkReceiver.events]
+    sinks = status()
+    checks = {
+        "webhook_complete": complete and sorted(received) == sorted(sent),
+        "file_complete": sorted(filed) == sorted(sent),
+        "spool_kept_mid_save": kept_mid_save == outage_events,
+        "colliding_name_rejected": sorted(sinks) == ["file sink", "webhook"] and not os.path.exists(shadow_file),
+    }
+    return {
+        "events": len(sent),
+        "hook_ms": {"p50": round(percentile(hook_ms, 50), 2), "p95": round(percentile(hook_ms, 95), 2)},
+        "outage": {"failures": during_outage.get("failures", 0), "pending": during_outage.get("pending", 0),
+                   "kept_mid_save": kept_mid_save, "recovered": recovered},
+        "webhook_posts": _SinkReceiver.posts,
+        "sinks": sinks,
+        "checks": checks,
+        "ok": all(checks.values()),
+        "sandbox": sb.root,
+    }
+
+
+# Bundle names _claude_notify_cleanup knows (CLEANUP_APPS in notify.sh)
+CLEANUP_APPS = ["ClaudeNotifications", "ClaudeNotifications Alerts", "ClaudeNotifications Banners",
+                "ClaudeNotifierPersistent", "ClaudeNotifierBanner", "ClaudeNotifier"]
+CLEANUP_STUB_LATENCY = {"terminal-notifier": 0.1, "lsregister": 0.2}
+EXTENSION_ID = "anthropic.claude-code-notifications"
+
+
+def cleanup_bench(hook, stub_latency, sessions=3, timeout=60.0):
+    stub_latency = stub_latency or CLEANUP_STUB_LATENCY
+    sb = Sandbox("notify-cleanup-", hook, stub_latency)
+    claude_dir = sb.claude_dir
+    marker_dir = sb.marker_dir
+    for app in CLEANUP_APPS[1:]:
+        macos = os.path.join(claude_dir, f"{app}.app", "Contents", "MacOS")
+        os.makedirs(macos)
+        shutil.copy(sb.notifier, macos)
+    lsregister = sb.stub("lsregister")
+    open(os.path.join(claude_dir, ".notify-installed"), "w").close()
+
+    # Open sessions, each with a live dismiss timer
+    os.makedirs(marker_dir)
+    timers = []
+    for i in range(sessions):
+        timer = subprocess.Popen(["sleep", "300"])
+        timers.append(timer)
+        with open(os.path.join(marker_dir, f"session-{i}"), "w") as f:
+            f.write(f"claude-code-session-{i}\n")
+        with open(os.path.join(marker_dir, f"session-{i}.dpid"), "w") as f:
+            f.write(f"{timer.pid}\n")
+
+    ours = {"hooks": [{"type": "command", "command": "bash ~/.claude/notify.sh"}]}
+    other = {"hooks": [{"type": "command", "command": "echo other"}]}
+    with open(os.path.join(claude_dir, "settings.json"), "w") as f:
+        json.dump({"hooks": {"Stop": [ours, other], "Notification": [ours], "PermissionRequest": [ours]}}, f)
+    extensions = os.path.join(sb.home, ".vscode", "extensions")
+    os.makedirs(os.path.join(extensions, f"{EXTENSION_ID}-1.0.0"))
+    with open(os.path.join(extensions, "extensions.json"), "w") as f:
+        json.dump([{"identifier": {"id": EXTENSION_ID}}, {"identifier": {"id": "other.extension"}}], f)
+
+    start = time.perf_counter()
+    hook_ms = sb.hook({"hook_event_name": "Stop"}, CLAUDE_NOTIFY_LSREGISTER=lsregister,
+                      CLAUDE_NOTIFY_LAUNCHER=os.path.join(sb.root, "Applications", "ClaudeNotifications.app"))
+    lock = os.path.join(claude_dir, ".notify-uninstall.lock")
+    deadline = time.monotonic() + timeout
+    while (os.path.exists(lock) or os.path.exists(os.path.join(claude_dir, "notify.sh"))) \
+            and time.monotonic() < deadline:
+        time.sleep(0.01)
+    cleanup_ms = (time.perf_counter() - start) * 1000
+
+    calls = sb.calls()
+    removes = sum(c.startswith("terminal-notifier -remove") for c in calls)
+    unregisters = sum(c.startswith("lsregister -u") for c in calls)
+    serial_ms = 1000 * (removes * stub_latency.get("terminal-notifier", stub_latency.get("*", 0.0))
+                        + unregisters * stub_latency.get("lsregister", stub_latency.get("*", 0.0)))
+    time.sleep(0.1)
+    with open(os.path.join(claude_dir, "settings.json")) as f:
+        hooks = json.load(f).get("hooks", {})
+    with open(os.path.join(extensions, "extensions.json")) as f:
+        registry = json.load(f)
+    left = sorted(name for name in os.listdir(claude_dir) if name != "settings.json")
+    checks = {
+        "hooks_removed": hooks == {"Stop": [other]},
+        "timers_killed": all(t.poll() is not None for t in timers),
+        "files_removed": not left,
+        "extension_removed": registry == [{"identifier": {"id": "other.extension"}}]
+                             and os.listdir(extensions) == ["extensions.json"],
+    }
+    for t in timers:
+        if t.poll() is None:
+            t.kill()
+    return {
+        "hook_ms": round(hook_ms, 2),
+        "cleanup_ms": round(cleanup_ms, 2),
+        "serial_calls_ms": round(serial_ms, 2),
+        "notifier_removes": removes,
+        "lsregister_calls": unregisters,
+        "left_behind": left,
+        "checks": checks,
+        "ok": all(checks.values()),
+        "sandbox": sb.root,
+    }
+
+
+def is_dismiss_event(payload):
+    return '"PostToolUse"' in payload or '"UserPromptSubmit"' in payload
+
+
+def replay(records, hook, command, dismiss_command, speed, jobs, stub_latency, shell="/bin/sh"):
+    sb = Sandbox("notify-replay-", hook, stub_latency)
+    marker_dir = sb.marker_dir
+
+    latencies = []
+    peak = {"entries": 0, "bytes": 0, "timers": 0}
+    lock = threading.Lock()
+
+    def run_one(env_cols, payload):
+        env = dict(sb.env)
+        env.update({k: v for k, v in env_cols.items() if v})
+        start = time.perf_counter()
+        cmd = dismiss_command if is_dismiss_event(payload) else command
+        subprocess.run(shell.split() + ["-c", cmd], input=payload.encode(), env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - start
+        entries, size, timers = state_usage(marker_dir)
+        with lock:
+            latencies.append(elapsed)
+            peak["entries"] = max(peak["entries"], entries)
+            peak["bytes"] = max(peak["bytes"], size)
+            peak["timers"] = max(peak["timers"], timers)
+
+    t_first = records[0][0] if records else 0.0
+    usage_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    wall_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = []
+        for ts, env_cols, payload in records:
+            if speed is not None:
+                due = (ts - t_first) / speed
+                delay = due - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(pool.submit(run_one, env_cols, payload))
+        for fut in futures:
+            fut.result()
+    wall = time.perf_counter() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+
+    calls = {}
+    for line in sb.calls():
+        name = line.split(" ", 1)[0]
+        calls[name] = calls.get(name, 0) + 1
+    entries, size, timers = state_usage(marker_dir)
+
+    return {
+        "events": len(records),
+        "wall_s": round(wall, 3),
+        "throughput_eps": round(len(records) / wall, 1) if wall else 0.0,
+        "hook_cpu_s": round(cpu, 3),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "max": round(max(latencies, default=0) * 1000, 2),
+        },
+        "stub_calls": calls,
+        "state": {
+            "peak_entries": peak["entries"],
+            "peak_bytes": peak["bytes"],
+            "peak_timers": peak["timers"],
+            "final_entries": entries,
+            "final_bytes": size,
+            "final_timers": timers,
+        },
+        "sandbox": sb.root,
+    }
+
+
+def parse_speed(value):
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+def parse_latency(value):
+    """SEC for every stub, or NAME=SEC[,NAME=SEC...] per stub binary."""
+    latency = {}
+    try:
+        for part in value.split(","):
+            name, sep, sec = part.rpartition("=")
+            latency[name.strip() if sep else "*"] = float(sec)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected SEC or NAME=SEC[,NAME=SEC...]")
+    return latency
+
+
+def finish(report, keep):
+    """Print a report, drop its sandbox unless keep, and exit 1 if it is not ok."""
+    if not keep:
+        shutil.rmtree(report.pop("sandbox"), ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report.get("ok", True) else 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded hook traffic through notify.sh.")
+    parser.add_argument("captures", nargs="*", help="capture file(s), e.g. ~/.claude/.notify-capture.tsv")
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="replay a generated agent run with N tool calls instead of a capture")
+    parser.add_argument("--speed", type=parse_speed, default=1.0,
+                        help="1 = real time, N = N times faster, max = no delays (default: 1)")
+    parser.add_argument("--jobs", type=int, default=8, help="max concurrent hook processes (default: 8)")
+    parser.add_argument("--hook", default=os.path.join(REPO_DIR, "notify.sh"), help="hook script to drive")
+    parser.add_argument("--command", default=DEFAULT_COMMAND,
+                        help=f"hook command as registered in settings.json (default: {DEFAULT_COMMAND!r})")
+    parser.add_argument("--dismiss-command",
+                        help="hook command for PostToolUse/UserPromptSubmit (default: same as --command)")
+    parser.add_argument("--shell", default="/bin/sh",
+                        help="shell that runs --command/--dismiss-command, as sh -c does for Claude (default: /bin/sh)")
+    parser.add_argument("--stub-latency", type=parse_latency, default={},
+                        help="seconds each stub sleeps: SEC, or NAME=SEC,... per binary (default: 0)")
+    parser.add_argument("--click", action="store_true",
+                        help="benchmark notify-click.sh for every terminal branch instead of replaying")
+    parser.add_argument("--runs", type=int, default=20, help="clicks per terminal with --click (default: 20)")
+    parser.add_argument("--budget-ms", type=float,
+                        help="click-to-focus p95 budget per terminal with --click (default: 300), "
+                             "or no-op re-run budget with --install (default: 1000)")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="check --async mode against a hanging notifier stub instead of replaying")
+    parser.add_argument("--gc", type=int, nargs="?", const=100000, metavar="N",
+                        help="seed N stale markers (default: 100000) and check notify.sh --gc instead of replaying")
+    parser.add_argument("--install", action="store_true",
+                        help="check install.sh re-runs and dry runs against stubbed macOS tools instead of replaying")
+    parser.add_argument("--shed", action="store_true",
+                        help="step the load-shedding levels with synthetic load signals instead of replaying")
+    parser.add_argument("--rules", action="store_true",
+                        help="route events through valid and malformed routing rules instead of replaying")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="check which repeated events one session drops as duplicates instead of replaying")
+    parser.add_argument("--sinks", action="store_true",
+                        help="check fan-out sink delivery against a stand-in webhook receiver instead of replaying")
+    parser.add_argument("--cleanup", action="store_true",
+                        help="time the uninstall cleanup a trashed launcher triggers instead of replaying")
+    parser.add_argument("--keep", action="store_true", help="keep the sandbox directory")
+    args = parser.parse_args()
+
+    # One entry per scenario flag: each returns a report with "ok" and "sandbox"
+    benches = {
+        "cleanup": lambda: cleanup_bench(args.hook, args.stub_latency),
+        "sinks": lambda: sink_bench(args.hook),
+        "async_mode": lambda: async_bench(args.hook),
+        "gc": lambda: gc_bench(args.hook, args.gc),
+        "install": lambda: install_bench(args.budget_ms or 1000.0),
+        "shed": lambda: shed_bench(args.hook),
+        "rules": lambda: rules_bench(args.hook),
+        "dedupe": lambda: dedupe_bench(args.hook),
+        "click": lambda: click_bench(max(1, args.runs), args.stub_latency, args.budget_ms or 300.0),
+    }
+    for flag, bench in benches.items():
+        if getattr(args, flag):
+            finish(bench(), args.keep)
+
+    if args.synthetic:
+        records = synthetic_agent_run(args.synthetic)
+    else:
+        records = read_capture(args.captures)
+    if not records:
+        print("No records found.", file=sys.stderr)
+        sys.exit(1)
+
+    finish(replay(records, args.hook, args.command, args.dismiss_command or args.command,
+                  args.speed, max(1, args.jobs), args.stub_latency, args.shell), args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Claude Code Notifications — fan-out sinks
+
+Sends every delivered notification to additional destinations besides the
+desktop banner: an HTTP webhook, a JSONL file or a socket consumer. No external
+dependencies — uses only Python 3 stdlib.
+
+notify.sh never talks to a sink. Once an event is resolved it appends one JSON
+line to the shared queue (.notify-sinks/queue.jsonl, bounded at QUEUE_MAX_BYTES —
+events past that are counted as overflow and dropped) and starts `drain` in the
+background unless a drainer is already running. The drainer fans the queue out
+into one spool per sink, persisted next to the queue, and sends each spool in
+batches. A failed batch is retried with exponential backoff; when a spool
+reaches the sink's max_queue the oldest events are dropped. The drainer exits
+once every spool is empty, or after DRAIN_MAX_SECONDS with retries still
+pending — the next hook starts a new one, which resumes from the spools.
+
+Sinks are configured in notify-config.json (or the settings UI):
+
+  "sinks": [
+    {"name": "dashboard", "type": "webhook", "url": "http://127.0.0.1:8080/events"},
+    {"name": "log", "type": "file", "path": "~/claude-events.jsonl", "events": ["stop"]},
+    {"name": "bar", "type": "socket", "address": "unix:/tmp/claude-events.sock"}
+  ]
+
+Optional per sink: enabled, events (event keys to send), batch_size, max_queue
+and timeout (seconds per send). Webhooks receive {"events": [...]} as one POST
+per batch; file and socket sinks get one JSON object per line.
+
+Usage: python3 ~/.claude/notify-sinks.py drain
+       python3 ~/.claude/notify-sinks.py status
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import random
+import re
+import socket
+import sys
+import time
+import urllib.request
+
+CLAUDE_DIR = os.path.expanduser("~/.claude")
+CONFIG_PATH = os.path.join(CLAUDE_DIR, "notify-config.json")
+SINK_DIR = os.path.join(CLAUDE_DIR, ".notify-sinks")
+QUEUE_PATH = os.path.join(SINK_DIR, "queue.jsonl")
+TAKING_PATH = QUEUE_PATH + ".taking"
+OVERFLOW_PATH = os.path.join(SINK_DIR, "overflow")
+STATE_PATH = os.path.join(SINK_DIR, "state.json")
+LOCK_PATH = os.path.join(SINK_DIR, "drain.lock")
+PID_PATH = os.path.join(SINK_DIR, "drain.pid")
+
+QUEUE_MAX_BYTES = 1024 * 1024  # enforced by notify.sh when it appends
+DEFAULT_BATCH = 20
+DEFAULT_MAX_QUEUE = 1000
+DEFAULT_TIMEOUT = 5.0
+BATCH_WAIT = 0.2          # seconds to let a burst of hooks coalesce into one batch
+IDLE_EXIT = 2.0           # seconds with nothing queued before the drainer exits
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 300.0
+DRAIN_MAX_SECONDS = 600
+
+
+# --- Sinks --------------------------------------------------------------------
+
+def spool_name(name):
+    """Spool file name for a sink. Names that differ only in characters a file
+    name can't hold map to the same spool, so load_sinks() keeps the first."""
+    return "spool-" + re.sub(r"[^A-Za-z0-9._-]", "_", name) + ".jsonl"
+
+
+class Sink:
+    """One configured destination. send() delivers a batch or raises."""
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.name = conf["name"]
+        self.events = set(conf["events"]) if conf.get("events") else None
+        self.batch_size = max(1, int(conf.get("batch_size") or DEFAULT_BATCH))
+        self.max_queue = max(1, int(conf.get("max_queue") or DEFAULT_MAX_QUEUE))
+        self.timeout = float(conf.get("timeout") or DEFAULT_TIMEOUT)
+        self.spool_path = os.path.join(SINK_DIR, spool_name(self.name))
+
+    def wants(self, event):
+        return self.events is None or event.get("event") in self.events
+
+    def send(self, events):
+        raise NotImplementedError
+
+
+class WebhookSink(Sink):
+    def send(self, events):
+        req = urllib.request.Request(
+            self.conf["url"], data=json.dumps({"events": events}).encode(),
+            headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            resp.read()
+
+
+class FileSink(Sink):
+    def send(self, events):
+        path = os.path.expanduser(self.conf["path"])
+        with open(path, "a") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in events))
+
+
+class SocketSink(Sink):
+    """unix:/path or HOST:PORT, the address forms notify-relay.py takes."""
+
+    def send(self, events):
+        addr = self.conf["address"]
+        if addr.startswith("unix:"):
+            family, target = socket.AF_UNIX, os.path.expanduser(addr[5:])
+        else:
+            host, _, port = addr.rpartition(":")
+            family, target = socket.AF_INET, (host or "127.0.0.1", int(port))
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(target)
+            sock.sendall("".join(json.dumps(e) + "\n" for e in events).encode())
+
+
+SINK_CLASSES = {"webhook": WebhookSink, "file": FileSink, "socket": SocketSink}
+TARGET_FIELD = {"webhook": "url", "file": "path", "socket": "address"}
+
+
+def load_sinks(config_path=CONFIG_PATH):
+    """Enabled, well-formed sinks from notify-config.json, in config order, or
+    None when the config can't be read or parsed (e.g. mid-save)."""
+    try:
+        with open(config_path) as f:
+            entries = json.load(f).get("sinks") or []
+    except (OSError, ValueError, AttributeError):
+        return None
+    sinks, seen = [], set()
+    for conf in entries if isinstance(entries, list) else []:
+        if not isinstance(conf, dict) or not conf.get("enabled", True):
+            continue
+        kind, name = conf.get("type"), str(conf.get("name") or "").strip()
+        if kind not in SINK_CLASSES or not name or spool_name(name) in seen or not conf.get(TARGET_FIELD[kind]):
+            continue
+        seen.add(spool_name(name))
+        try:
+            sinks.append(SINK_CLASSES[kind](dict(conf, name=name)))
+        except (TypeError, ValueError):
+            continue
+    return sinks
+
+
+# --- Persistence --------------------------------------------------------------
+
+def _write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def load_state():
+    try:
+        with open(STATE_PATH) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("sinks", {})
+    state.setdefault("overflow", 0)
+    return state
+
+
+def save_state(state):
+    _write_atomic(STATE_PATH, json.dumps(state, indent=2, sort_keys=True) + "\n")
+
+
+def _read_events(path):
+    events = []
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return events
+
+
+def take_queue():
+    """Move what notify.sh has queued aside and return it. The moved file is
+    removed by release_queue() once the events are safely in the spools."""
+    # A leftover .taking is from an interrupted drainer — apply it first
+    if not os.path.exists(TAKING_PATH):
+        try:
+            os.rename(QUEUE_PATH, TAKING_PATH)
+        except FileNotFoundError:
+            return []
+        # A hook that opened the queue just before the rename is still writing
+        time.sleep(0.05)
+    return _read_events(TAKING_PATH)
+
+
+def release_queue():
+    try:
+        os.unlink(TAKING_PATH)
+    except FileNotFoundError:
+        pass
+
+
+def take_overflow():
+    """notify.sh appends one byte to OVERFLOW_PATH per event it could not queue."""
+    taking = OVERFLOW_PATH + ".taking"
+    try:
+        os.rename(OVERFLOW_PATH, taking)
+    except FileNotFoundError:
+        return 0
+    count = os.path.getsize(taking)
+    os.unlink(taking)
+    return count
+
+
+# --- Drainer ------------------------------------------------------------------
+
+class Drainer:
+    def __init__(self):
+        self.state = load_state()
+        self.sinks = []
+        self.spools = {}
+        self.config_sig = None
+
+    def counters(self, sink):
+        return self.state["sinks"].setdefault(sink.name, {
+            "delivered": 0, "batches": 0, "failures": 0, "dropped": 0,
+            "latency_ms": 0.0, "attempt": 0, "backoff_until": 0,
+        })
+
+    def reload(self):
+        try:
+            st = os.stat(CONFIG_PATH)
+            sig = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            sig = None
+        if sig == self.config_sig:
+            return
+        sinks = load_sinks()
+        if sinks is None:
+            # Unreadable (a settings save truncates before it writes): keep the
+            # current sinks and their spools, and look again on the next pass
+            return
+        self.config_sig = sig
+        self.sinks = sinks
+        names = {s.name for s in self.sinks}
+        for sink in self.sinks:
+            if sink.name not in self.spools:
+                self.spools[sink.name] = _read_events(sink.spool_path)
+        # Spools and counters of sinks that were removed or disabled go too
+        self.spools = {n: q for n, q in self.spools.items() if n in names}
+        for name in list(self.state["sinks"]):
+            if name not in names:
+                del self.state["sinks"][name]
+        for entry in os.listdir(SINK_DIR):
+            if entry.startswith("spool-") and entry not in {os.path.basename(s.spool_path) for s in self.sinks}:
+                os.unlink(os.path.join(SINK_DIR, entry))
+
+    def persist(self, sink):
+        _write_atomic(sink.spool_path, "".join(json.dumps(e) + "\n" for e in self.spools[sink.name]))
+
+    def fan_out(self, events):
+        for sink in self.sinks:
+            wanted = [e for e in events if sink.wants(e)]
+            if not wanted:
+                continue
+            spool = self.spools[sink.name]
+            spool.extend(wanted)
+            if len(spool) > sink.max_queue:
+                excess = len(spool) - sink.max_queue
+                del spool[:excess]
+                self.counters(sink)["dropped"] += excess
+            self.persist(sink)
+
+    def flush(self, sink, now):
+        """Send one batch if the sink is due. Returns when to try it next, or None."""
+        spool = self.spools[sink.name]
+        if not spool:
+            return None
+        c = self.counters(sink)
+        if c["backoff_until"] > now:
+            return c["backoff_until"]
+        batch = spool[:sink.batch_size]
+        t0 = time.monotonic()
+        try:
+            sink.send(batch)
+        except Exception as e:
+            c["failures"] += 1
+            c["attempt"] += 1
+            c["last_error"] = f"{type(e).__name__}: {e}"[:200]
+            c["last_error_at"] = now
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (c["attempt"] - 1))
+            c["backoff_until"] = now + delay * random.uniform(0.5, 1.0)
+            return c["backoff_until"]
+        ms = (time.monotonic() - t0) * 1000
+        c["latency_ms"] = round(ms if not c["batches"] else 0.7 * c["latency_ms"] + 0.3 * ms, 2)
+        c["delivered"] += len(batch)
+        c["batches"] += 1
+        c["attempt"] = 0
+        c["backoff_until"] = 0
+        c["last_delivered_at"] = now
+        del spool[:len(batch)]
+        self.persist(sink)
+        return now if spool else None
+
+    def run(self):
+        started = idle_since = time.time()
+        while True:
+            self.reload()
+            events = []
+            if os.path.exists(QUEUE_PATH) or os.path.exists(TAKING_PATH):
+                # Let the rest of a burst arrive so it goes out in the same batch
+                time.sleep(BATCH_WAIT)
+                events = take_queue()
+                self.fan_out(events)
+                release_queue()
+            self.state["overflow"] += take_overflow()
+            now = time.time()
+            due = [t for t in (self.flush(s, now) for s in self.sinks) if t is not None]
+            for sink in self.sinks:
+                self.counters(sink)["pending"] = len(self.spools[sink.name])
+            save_state(self.state)
+            if events or due:
+                idle_since = now
+            elif now - idle_since >= IDLE_EXIT:
+                return
+            if now - started >= DRAIN_MAX_SECONDS:
+                return
+            wake = min(due) if due else now + IDLE_EXIT
+            time.sleep(min(max(0.0, wake - time.time()), 0.5))
+
+
+def drain():
+    os.makedirs(SINK_DIR, exist_ok=True)
+    with open(LOCK_PATH, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return  # another drainer is running and picks the queue up
+        _write_atomic(PID_PATH, str(os.getpid()))
+        try:
+            Drainer().run()
+        finally:
+            try:
+                os.unlink(PID_PATH)
+            except FileNotFoundError:
+                pass
+
+
+def status():
+    """Per-sink counters and queue depth, including configured sinks not yet used."""
+    state = load_state()
+    sinks = {}
+    for sink in load_sinks() or []:
+        entry = dict(state["sinks"].get(sink.name, {}))
+        entry["type"] = sink.conf["type"]
+        entry["pending"] = len(_read_events(sink.spool_path))
+        sinks[sink.name] = entry
+    return {"queued": len(_read_events(QUEUE_PATH)), "overflow": state["overflow"], "sinks": sinks}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fan Claude Code notifications out to sinks.")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    sub.add_parser("drain", help="deliver queued events to every sink, then exit")
+    sub.add_parser("status", help="print per-sink counters as JSON")
+    args = parser.parse_args()
+
+    if args.mode == "drain":
+        drain()
+    else:
+        print(json.dumps(status(), indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -10,20 +10,64 @@ SENDER="com.anthropic.claude-code-notifier"
 CONFIG="$HOME/.claude/notify-config.json"
 
 # --- Trash-based uninstall cleanup ---
-# If ClaudeNotifications.app was dragged to Trash, perform full cleanup and exit.
-# Uses a directory-based lock (mkdir is atomic) to prevent concurrent cleanup
-# from multiple hook events firing simultaneously.
+# If ClaudeNotifications.app was dragged to Trash, the hook that notices takes a
+# directory lock (mkdir is atomic; concurrent hooks that lose it just exit) and
+# hands the cleanup to a detached worker, so it returns at once. The worker
+# unhooks settings.json first, then plans the rest from what is on disk: only
+# bundles, notifier binaries, timers and registries that exist get a step.
+# Independent external calls (notifier -remove per bundle and group, lsregister
+# per bundle, the extension registries, the Notification Center DB) run in
+# parallel, at most CLEANUP_JOBS at a time. Files go in one rm once nothing needs
+# them; the lock and notify.sh itself go last.
+CLEANUP_JOBS=8
+CLEANUP_APPS=(ClaudeNotifications "ClaudeNotifications Alerts" "ClaudeNotifications Banners" \
+  ClaudeNotifierPersistent ClaudeNotifierBanner ClaudeNotifier)
+
 _claude_notify_cleanup() {
-  local CLAUDE_DIR="$HOME/.claude"
-  local SETTINGS="$CLAUDE_DIR/settings.json"
-  local LSREGISTER="/System/Library/Frameworks/CoreServices.framework/Versions/A/Frameworks/LaunchServices.framework/Versions/A/Support/lsregister"
+  mkdir "$HOME/.claude/.notify-uninstall.lock" 2>/dev/null || return 0
+  CLAUDE_NOTIFY_WORKER=1 nohup bash "${BASH_SOURCE[0]}" --cleanup-worker >/dev/null 2>&1 &
+}
 
-  # Acquire lock — another cleanup may already be running
-  local LOCKFILE="$CLAUDE_DIR/.notify-uninstall.lock"
-  if ! mkdir "$LOCKFILE" 2>/dev/null; then
-    return 0
+# Bounded job pool for the cleanup worker (bash 3.2 has no wait -n: when the pool
+# is full, wait for the oldest job)
+# Usage: _claude_notify_pool_run COMMAND [ARGS...]; _claude_notify_pool_wait
+_POOL=()
+_claude_notify_pool_run() {
+  if [ ${#_POOL[@]} -ge $CLEANUP_JOBS ]; then
+    wait "${_POOL[0]}" 2>/dev/null
+    _POOL=("${_POOL[@]:1}")
   fi
-  trap 'rmdir "$LOCKFILE" 2>/dev/null' EXIT
+  "$@" 2>/dev/null &
+  _POOL+=($!)
+}
+
+_claude_notify_pool_wait() {
+  [ ${#_POOL[@]} -gt 0 ] && wait "${_POOL[@]}" 2>/dev/null
+  _POOL=()
+}
+
+# Drop our sender from the Notification Center database (usernoted must be down)
+_claude_notify_cleanup_ncdb() {
+  local NCDB="$1" nc_count
+  nc_count=$(sqlite3 "$NCDB" "SELECT COUNT(*) FROM app WHERE identifier LIKE 'com.anthropic.claude-code-notifier%';" 2>/dev/null || echo "0")
+  if [ "${nc_count:-0}" -gt 0 ] 2>/dev/null; then
+    killall usernoted 2>/dev/null || true
+    sleep 0.5
+    sqlite3 "$NCDB" "DELETE FROM app WHERE identifier LIKE 'com.anthropic.claude-code-notifier%';" 2>/dev/null || true
+    killall NotificationCenter 2>/dev/null || true
+  fi
+}
+
+# Usage: notify.sh --cleanup-worker (started by _claude_notify_cleanup)
+# CLAUDE_NOTIFY_LSREGISTER replaces lsregister (notify-replay.py --cleanup stubs it)
+_claude_notify_cleanup_worker() {
+  local CLAUDE_DIR="$HOME/.claude"
+  local SETTINGS="$CLAUDE_DIR/settings.json"
+  local LSREGISTER="${CLAUDE_NOTIFY_LSREGISTER:-/System/Library/Frameworks/CoreServices.framework/Versions/A/Frameworks/LaunchServices.framework/Versions/A/Support/lsregister}"
+  local NCDB="$HOME/Library/Group Containers/group.com.apple.usernoted/db2/db"
+  # The EXIT trap runs after this function returns, so it cannot use locals
+  trap 'rmdir "$HOME/.claude/.notify-uninstall.lock" 2>/dev/null' EXIT
+  trap 'exit 1' TERM INT HUP
 
   # 1. Remove notification hooks from settings.json
   if [ -f "$SETTINGS" ]; then
@@ -60,107 +104,852 @@ if changed:
 " 2>/dev/null || true
   fi
 
-  # 2. Clear delivered notifications
-  for group in claude-code claude-code-persistent claude-code-banner; do
-    for app_name in ClaudeNotifications "ClaudeNotifications Alerts" "ClaudeNotifications Banners" ClaudeNotifierPersistent ClaudeNotifierBanner ClaudeNotifier; do
-      local notifier="$CLAUDE_DIR/${app_name}.app/Contents/MacOS/terminal-notifier"
-      if [ -x "$notifier" ]; then
-        "$notifier" -remove "$group" 2>/dev/null || true
-      fi
-    done
+  # 2. Plan from disk
+  local app f pid group notifier nc_pid=""
+  local bundles=() notifiers=() pids=() registries=() paths=()
+  local groups=(claude-code claude-code-persistent claude-code-banner)
+  for app in "${CLEANUP_APPS[@]}"; do
+    [ -d "$CLAUDE_DIR/$app.app" ] || continue
+    bundles+=("$CLAUDE_DIR/$app.app")
+    [ -x "$CLAUDE_DIR/$app.app/Contents/MacOS/terminal-notifier" ] && notifiers+=("$CLAUDE_DIR/$app.app/Contents/MacOS/terminal-notifier")
+  done
+  # Per-session groups still on screen, and their dismiss timers
+  for f in "$MARKER_DIR"/*; do
+    [ -f "$f" ] || continue
+    case "$f" in
+      *.dpid)            read -r pid < "$f" && pids+=("$pid") ;;
+      *)                 read -r group < "$f" && case " ${groups[*]} " in
+                           *" $group "*) ;;
+                           *) [[ "$group" == claude-code-* ]] && groups+=("$group") ;;
+                         esac ;;
+    esac
+  done
+  for f in "$HOME/.cursor/extensions" "$HOME/.vscode/extensions" "$HOME/.vscode-oss/extensions"; do
+    [ -f "$f/extensions.json" ] && registries+=("$f/extensions.json")
   done
+  for f in "$CLAUDE_DIR"/notify-click.sh "$CLAUDE_DIR"/notify-config.json "$CLAUDE_DIR"/config-ui.py \
+           "$CLAUDE_DIR"/notify-relay.py "$CLAUDE_DIR"/.notify-relay.sock "$CLAUDE_DIR"/notify-history.py \
+           "$CLAUDE_DIR"/.notify-history.* "$CLAUDE_DIR"/notify-sinks.py "$CLAUDE_DIR"/.notify-sinks \
+           "$CLAUDE_DIR"/Claude.icns "$CLAUDE_DIR"/claude-icon-large.png "$CLAUDE_DIR/Configure Notifications.command" \
+           "$CLAUDE_DIR"/.notify-installed "$CLAUDE_DIR"/.notify-install-manifest.json "$CLAUDE_DIR"/.notify-record \
+           "$CLAUDE_DIR"/.notify-async "$CLAUDE_DIR"/.notify-capture.tsv "$CLAUDE_DIR"/.notify-capture.tsv.1 \
+           "$CLAUDE_DIR"/.notify-click-timings.tsv "$MARKER_DIR" "$CLAUDE_DIR"/.jb-notify \
+           "$HOME"/.cursor/extensions/anthropic.claude-code-notifications-* \
+           "$HOME"/.vscode/extensions/anthropic.claude-code-notifications-* \
+           "$HOME"/.vscode-oss/extensions/anthropic.claude-code-notifications-* \
+           "$HOME/Library/Application Support/JetBrains"/*/plugins/claude-code-notifications; do
+    [ -e "$f" ] && paths+=("$f")
+  done
+
+  # 3. Kill background dismiss timers — one builtin call for all of them
+  [ ${#pids[@]} -gt 0 ] && kill "${pids[@]}" 2>/dev/null
 
-  # 3. Kill background dismiss timer processes
-  if [ -d "$CLAUDE_DIR/.persistent-notifications" ]; then
-    for dpid_file in "$CLAUDE_DIR/.persistent-notifications"/*.dpid; do
-      [ -f "$dpid_file" ] && kill "$(cat "$dpid_file")" 2>/dev/null || true
+  # 4. Independent external calls, in parallel. The Notification Center step
+  # sleeps while usernoted restarts, so it runs beside the pool.
+  if [ -f "$NCDB" ]; then
+    _claude_notify_cleanup_ncdb "$NCDB" &
+    nc_pid=$!
+  fi
+  for notifier in "${notifiers[@]}"; do
+    for group in "${groups[@]}"; do
+      _claude_notify_pool_run _bounded "$notifier" -remove "$group"
+    done
+  done
+  if [ -x "$LSREGISTER" ]; then
+    for f in "${bundles[@]}"; do
+      _claude_notify_pool_run _bounded "$LSREGISTER" -u "$f"
     done
   fi
+  # Remove stale entries from the editors' extensions.json registries
+  if [ ${#registries[@]} -gt 0 ]; then
+    _claude_notify_pool_run python3 -c "
+import json, sys
+for path in sys.argv[1:]:
+    try:
+        with open(path) as f:
+            exts = json.load(f)
+        filtered = [e for e in exts if e.get('identifier', {}).get('id') != 'anthropic.claude-code-notifications']
+        if len(filtered) != len(exts):
+            with open(path, 'w') as f:
+                json.dump(filtered, f, indent='\t')
+                f.write('\n')
+    except (OSError, ValueError, AttributeError):
+        pass
+" "${registries[@]}"
+  fi
+  _claude_notify_pool_wait
 
-  # 4. Unregister app bundles from LaunchServices
-  for dir in "$CLAUDE_DIR/ClaudeNotifications.app" "$CLAUDE_DIR/ClaudeNotifications Alerts.app" "$CLAUDE_DIR/ClaudeNotifications Banners.app" "$CLAUDE_DIR/ClaudeNotifierPersistent.app" "$CLAUDE_DIR/ClaudeNotifierBanner.app" "$CLAUDE_DIR/ClaudeNotifier.app"; do
-    if [ -d "$dir" ]; then
-      "$LSREGISTER" -u "$dir" 2>/dev/null || true
-    fi
+  # 5. Delete notification files, bundles, extensions and plugins in one go
+  paths+=("${bundles[@]}")
+  [ ${#paths[@]} -gt 0 ] && rm -rf "${paths[@]}" 2>/dev/null
+  [ -n "$nc_pid" ] && wait "$nc_pid" 2>/dev/null
+
+  # 6. Delete notify.sh itself — safe because bash holds the fd open
+  rm -f "$CLAUDE_DIR/notify.sh" 2>/dev/null
+}
+
+# --- Garbage collection of stale markers and timer PIDs ---
+# Crashed or closed sessions leave <session_id>, pid-<N>, .turn-<N> and *.dpid files behind.
+# A dpid file whose timer has exited may later point at an unrelated process that
+# reused the PID, so liveness is checked together with process start time: a
+# process that started after the file was written is not the one it refers to.
+# Usage: notify.sh --gc [--budget N] [--dry-run]
+#   --budget N  examine at most N entries (0 = unlimited); used by the hook path
+#   --dry-run   report what would be reclaimed without touching anything
+_claude_notify_gc() {
+  local budget=0 dry_run=0
+  while [ $# -gt 0 ]; do
+    case "$1" in
+      --budget)  budget="${2:-0}"; shift ;;
+      --dry-run) dry_run=1 ;;
+    esac
+    shift
   done
+  [ -d "$MARKER_DIR" ] || { echo '{"scanned": 0}'; return 0; }
+  python3 -c "
+import json, os, subprocess, sys, time
 
-  # 5. Delete notification files
-  rm -f "$CLAUDE_DIR/notify-click.sh" 2>/dev/null
-  rm -f "$CLAUDE_DIR/notify-config.json" 2>/dev/null
-  rm -f "$CLAUDE_DIR/config-ui.py" 2>/dev/null
-  rm -f "$CLAUDE_DIR/Claude.icns" 2>/dev/null
-  rm -f "$CLAUDE_DIR/claude-icon-large.png" 2>/dev/null
-  rm -f "$CLAUDE_DIR/Configure Notifications.command" 2>/dev/null
-  rm -f "$CLAUDE_DIR/.notify-installed" 2>/dev/null
-  rm -rf "$CLAUDE_DIR/.persistent-notifications" 2>/dev/null
-
-  # 6. Delete app bundles (new + old names for backward compat)
-  rm -rf "$CLAUDE_DIR/ClaudeNotifications.app" 2>/dev/null
-  rm -rf "$CLAUDE_DIR/ClaudeNotifications Alerts.app" 2>/dev/null
-  rm -rf "$CLAUDE_DIR/ClaudeNotifications Banners.app" 2>/dev/null
-  rm -rf "$CLAUDE_DIR/ClaudeNotifierPersistent.app" 2>/dev/null
-  rm -rf "$CLAUDE_DIR/ClaudeNotifierBanner.app" 2>/dev/null
-  rm -rf "$CLAUDE_DIR/ClaudeNotifier.app" 2>/dev/null
-
-  # 7b. Remove VS Code extension from extensions directories
-  for _ext_dir in "$HOME/.cursor/extensions" "$HOME/.vscode/extensions" "$HOME/.vscode-oss/extensions"; do
-    rm -rf "$_ext_dir"/anthropic.claude-code-notifications-* 2>/dev/null || true
-    # Remove stale entry from editor's extensions.json registry
-    if [ -f "$_ext_dir/extensions.json" ]; then
-      python3 -c "
-import json, sys
-path = sys.argv[1]
-with open(path) as f:
-    exts = json.load(f)
-filtered = [e for e in exts if e.get('identifier', {}).get('id') != 'anthropic.claude-code-notifications']
-if len(filtered) != len(exts):
-    with open(path, 'w') as f:
-        json.dump(filtered, f, indent='\t')
-        f.write('\n')
-" "$_ext_dir/extensions.json" 2>/dev/null || true
+marker_dir, notifier = sys.argv[1], sys.argv[2]
+budget, dry_run = int(sys.argv[3]), sys.argv[4] == '1'
+MAX_AGE = 86400      # unreferenced session markers older than this are orphans
+MAX_DISMISS = 50     # cap on -remove spawns per pass; older groups are just dropped
+SKEW = 2             # seconds of slack between ps start time and file mtime
+
+t0 = time.time()
+
+def etime_secs(s):
+    days = 0
+    if '-' in s:
+        d, s = s.split('-', 1)
+        days = int(d)
+    parts = [int(p) for p in s.split(':')]
+    while len(parts) < 3:
+        parts.insert(0, 0)
+    return days * 86400 + parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+# One ps call for the whole pass: pid -> start time
+started = {}
+try:
+    out = subprocess.run(['ps', '-axo', 'pid=,etime='], capture_output=True, text=True).stdout
+    for line in out.splitlines():
+        f = line.split()
+        if len(f) == 2:
+            started[int(f[0])] = t0 - etime_secs(f[1])
+except Exception:
+    sys.exit(0)  # without a process table we cannot tell live from dead
+
+def alive(pid, written):
+    st = started.get(pid)
+    return st is not None and st <= written + SKEW
+
+def read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+report = {'scanned': 0, 'markers': 0, 'timers': 0, 'dismissed': 0, 'dropped_groups': 0}
+remove, groups = {}, {}
+
+with os.scandir(marker_dir) as it:
+    for entry in it:
+        name = entry.name
+        if name.startswith(('.tty-', '.dedupe-')):
+            # Per-session caches: the TTY for in-band delivery (re-resolved when
+            # missing) and the last posted duplicate-check key
+            try:
+                if t0 - entry.stat().st_mtime > MAX_AGE:
+                    remove[entry.path] = 'markers'
+            except OSError:
+                pass
+            continue
+        if name.startswith('.') and not name.startswith('.turn-'):
+            continue
+        if budget and report['scanned'] >= budget:
+            break
+        report['scanned'] += 1
+        try:
+            mtime = entry.stat().st_mtime
+        except OSError:
+            continue
+        path = entry.path
+        if name.endswith('.dpid'):
+            # Timer PID file: stale once the timer exited or its PID was reused
+            pid = read(path)
+            if not pid.isdigit() or not alive(int(pid), mtime):
+                remove[path] = 'timers'
+        elif name.startswith(('.turn-', 'turn-')):
+            # Turn start of a Claude instance (turn-<N> before it became a dot
+            # file): orphaned when the instance is gone
+            pid = name.split('turn-', 1)[1]
+            if not pid.isdigit() or not alive(int(pid), mtime):
+                remove[path] = 'markers'
+        elif name.startswith('pid-'):
+            # Claude instance marker: orphaned when the owning process is gone
+            pid = name[4:]
+            if not pid.isdigit() or not alive(int(pid), mtime):
+                remove[path] = 'markers'
+                group = read(path)
+                if group.startswith('claude-code-'):
+                    sid = os.path.join(marker_dir, group[len('claude-code-'):])
+                    if os.path.isfile(sid) and read(sid) == group:
+                        remove[sid] = 'markers'
+                    groups[group] = max(groups.get(group, 0), mtime)
+        elif t0 - mtime > MAX_AGE:
+            # Session marker nobody resolved within MAX_AGE
+            remove[path] = 'markers'
+            group = read(path)
+            if group:
+                groups[group] = max(groups.get(group, 0), mtime)
+
+for kind in remove.values():
+    report[kind] += 1
+
+# Dismiss the most recent orphaned groups; older banners are long gone
+ordered = sorted(groups, key=groups.get, reverse=True)
+to_dismiss = ordered[:MAX_DISMISS]
+report['dismissed'] = len(to_dismiss)
+report['dropped_groups'] = len(ordered) - len(to_dismiss)
+
+if not dry_run:
+    for path in remove:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    # Tell the active-sessions view, then compact its journal to the sessions
+    # that still have a marker. An append racing the rewrite can be lost; the
+    # view then misses that session until its next event.
+    journal = os.path.join(marker_dir, '.sessions.log')
+    try:
+        with open(journal, 'a') as f:
+            for group in groups:
+                f.write('%.6f\tresolved\t%s\t\t\t\t\t\n' % (t0, group))
+        if os.path.getsize(journal) > 256 * 1024:
+            live = {}
+            with open(journal) as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) == 8 and fields[1] == 'posted':
+                        live[fields[2]] = line
+                    elif len(fields) == 8:
+                        live.pop(fields[2], None)
+            live = {g: l for g, l in live.items()
+                    if g.startswith('claude-code-') and read(os.path.join(marker_dir, g[len('claude-code-'):])) == g}
+            tmp = journal + '.%d' % os.getpid()
+            with open(tmp, 'w') as f:
+                f.writelines(live.values())
+            os.replace(tmp, journal)
+    except OSError:
+        pass
+    # JetBrains endpoint registry: keep only IDEs that are still running
+    registry = os.path.join(marker_dir, '.jetbrains')
+    try:
+        with open(registry) as f:
+            lines = f.readlines()
+        written = os.stat(registry).st_mtime
+        live = [l for l in lines if l.split('\t')[1:2] and l.split('\t')[1].isdigit()
+                and alive(int(l.split('\t')[1]), written)]
+        if len(live) != len(lines):
+            with open(registry + '.gc', 'w') as f:
+                f.writelines(live)
+            os.replace(registry + '.gc', registry)
+    except OSError:
+        pass
+    if os.access(notifier, os.X_OK):
+        for group in to_dismiss:
+            subprocess.run([notifier, '-remove', group], capture_output=True)
+
+report['dry_run'] = dry_run
+report['elapsed_ms'] = round((time.time() - t0) * 1000, 1)
+print(json.dumps(report))
+" "$MARKER_DIR" "$NOTIFIER" "$budget" "$dry_run"
+}
+
+# --- Hook traffic recording ---
+# While $RECORD_FLAG exists every raw payload is appended to $CAPTURE as one
+# tab-separated line: timestamp, TERM_PROGRAM, ITERM_SESSION_ID, TERMINAL_EMULATOR,
+# CLAUDE_JB_NOTIFY_PORT, CLAUDE_JB_TAB_ID, CLAUDE_JB_IDE_PID, payload.
+# The flag file holds the size cap in bytes; past it the capture rotates to .1.
+# Replay a capture with notify-replay.py from the repo.
+# Usage: notify.sh --record start [MAX_KB] | stop | status
+RECORD_FLAG="$HOME/.claude/.notify-record"
+CAPTURE="$HOME/.claude/.notify-capture.tsv"
+
+# Print the current event as one record line (also the relay wire format)
+_claude_notify_record_line() {
+  local payload
+  # JSON only has newlines/tabs as insignificant whitespace — flatten to one line
+  payload="${INPUT//$'\n'/ }"
+  payload="${payload//$'\t'/ }"
+  printf '%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n' \
+    "${EPOCHREALTIME:-$(date +%s)}" "${TERM_PROGRAM:-}" "${ITERM_SESSION_ID:-}" \
+    "${TERMINAL_EMULATOR:-}" "${CLAUDE_JB_NOTIFY_PORT:-}" "${CLAUDE_JB_TAB_ID:-}" \
+    "${CLAUDE_JB_IDE_PID:-}" "$payload"
+}
+
+_claude_notify_record() {
+  local max_bytes="" size
+  read -r max_bytes < "$RECORD_FLAG" 2>/dev/null
+  _claude_notify_record_line >> "$CAPTURE" 2>/dev/null
+  # Size check costs a fork, so only do it on ~1 in 64 records
+  if [ -n "$max_bytes" ] && [ $((RANDOM % 64)) -eq 0 ]; then
+    size=$(wc -c < "$CAPTURE" 2>/dev/null | tr -d ' ')
+    if [ "${size:-0}" -gt "$max_bytes" ]; then
+      mv -f "$CAPTURE" "$CAPTURE.1" 2>/dev/null
     fi
-  done
+  fi
+}
 
-  # 7c. Remove JetBrains plugin from all IDE config directories
-  JB_SUPPORT="$HOME/Library/Application Support/JetBrains"
-  if [ -d "$JB_SUPPORT" ]; then
-    for jb_dir in "$JB_SUPPORT"/*/plugins/claude-code-notifications; do
-      [ -d "$jb_dir" ] && rm -rf "$jb_dir"
-    done
+_claude_notify_record_cli() {
+  case "${1:-status}" in
+    start)
+      echo $(( ${2:-10240} * 1024 )) > "$RECORD_FLAG"
+      echo "Recording hook traffic to $CAPTURE (cap ${2:-10240} KB)."
+      ;;
+    stop)
+      rm -f "$RECORD_FLAG"
+      echo "Recording stopped. Capture: $CAPTURE"
+      ;;
+    *)
+      if [ -f "$RECORD_FLAG" ]; then echo "Recording: on"; else echo "Recording: off"; fi
+      [ -f "$CAPTURE" ] && echo "Capture: $CAPTURE ($(wc -l < "$CAPTURE" | tr -d ' ') records)"
+      ;;
+  esac
+}
+
+# --- Notification history ---
+# Posted, dismissed and clicked notifications are appended to a journal (one
+# printf, no fork); notify-history.py moves the journal into its SQLite store in
+# batches. Search it with notify-history.py search or the settings UI.
+HISTORY_LOG="$HOME/.claude/.notify-history.log"
+HISTORY_DB="$HOME/.claude/.notify-history.db"
+
+# --- Fan-out sinks ---
+# Resolved events are queued here for notify-sinks.py, whose detached drainer
+# delivers them to the sinks configured in notify-config.json.
+SINK_DIR="$HOME/.claude/.notify-sinks"
+
+# Usage: _claude_notify_history KIND GROUP [EVENT_KEY TOOL TERMINAL TITLE BODY [TS]]
+_claude_notify_history() {
+  local group="$2" terminal="${5:-}" session="${2#claude-code}"
+  printf '%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n' \
+    "${8:-${EPOCHREALTIME:-$(date +%s)}}" "$1" "$group" "${session#-}" \
+    "${3:-}" "${4:-}" "${terminal//$'\t'/ }" "${6:-}" "${7:-}" >> "$HISTORY_LOG" 2>/dev/null
+}
+
+# Journal a post; roughly 1 in 32 posts moves the journal into the history store
+# from a detached process, so the journal stays bounded whichever way it was delivered.
+# Usage: _claude_notify_history_posted GROUP EVENT_KEY TOOL TERMINAL TITLE BODY TS
+_claude_notify_history_posted() {
+  _claude_notify_history posted "$@"
+  if [ $((RANDOM % 32)) -eq 0 ] && [ -f "$HOME/.claude/notify-history.py" ]; then
+    nohup python3 "$HOME/.claude/notify-history.py" ingest >/dev/null 2>&1 &
   fi
-  rm -rf "$CLAUDE_DIR/.jb-notify" 2>/dev/null
+}
 
-  # 7. Clean Notification Center database entries
-  local NCDB="$HOME/Library/Group Containers/group.com.apple.usernoted/db2/db"
-  if [ -f "$NCDB" ]; then
-    local nc_count
-    nc_count=$(sqlite3 "$NCDB" "SELECT COUNT(*) FROM app WHERE identifier LIKE 'com.anthropic.claude-code-notifier%';" 2>/dev/null || echo "0")
-    if [ "$nc_count" -gt 0 ]; then
-      killall usernoted 2>/dev/null || true
-      sleep 0.5
-      sqlite3 "$NCDB" "DELETE FROM app WHERE identifier LIKE 'com.anthropic.claude-code-notifier%';" 2>/dev/null || true
-      killall NotificationCenter 2>/dev/null || true
+MARKER_DIR="$HOME/.claude/.persistent-notifications"
+
+# Pending flag: exists while any marker is outstanding. install.sh registers the
+# PostToolUse and UserPromptSubmit hooks behind a test of this file, so bash only
+# starts for them while there is actually something to dismiss.
+PENDING_FLAG="$MARKER_DIR/.pending"
+
+# Live session journal, followed by the settings UI's active-sessions view (see
+# SessionTracker in config-ui.py). One line per change: timestamp, posted|resolved,
+# group and, for posts, event, terminal, tab, style and timeout. Resolutions carry
+# a timestamp only when bash has EPOCHREALTIME — the reader falls back to its own
+# clock — so journaling never forks. GC compacts it to the live sessions.
+SESSIONS_LOG="$MARKER_DIR/.sessions.log"
+
+# Usage: _claude_notify_session KIND GROUP [EVENT TERM_APP TAB_ID STYLE TIMEOUT TS]
+_claude_notify_session() {
+  printf '%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n' "${8:-${EPOCHREALTIME:-}}" "$1" "$2" \
+    "${3:-}" "${4:-}" "${5:-}" "${6:-}" "${7:-}" >> "$SESSIONS_LOG" 2>/dev/null
+}
+
+# --- JetBrains endpoint registry ---
+# One line per IDE plugin endpoint: port, IDE PID and the IDE's start time (ps
+# lstart, which tells a live IDE from an unrelated process that reused its PID).
+# Hooks register the endpoint they run under — a ps only when the port/PID pair
+# is new — and notify-click.sh checks it before connecting, so a click on a
+# notification from a restarted IDE skips the dead port at once. GC drops
+# entries whose IDE has exited.
+JB_REGISTRY="$MARKER_DIR/.jetbrains"
+
+# Usage: _claude_notify_jb_register PORT IDE_PID
+_claude_notify_jb_register() {
+  local port="$1" pid="$2" p q started keep=""
+  [ -n "$port" ] && [ -n "$pid" ] || return 0
+  if [ -f "$JB_REGISTRY" ]; then
+    while IFS=$'\t' read -r p q started; do
+      [ "$p" = "$port" ] && [ "$q" = "$pid" ] && return 0
+      # Any other entry on this port is a previous IDE run
+      [ "$p" != "$port" ] && keep="$keep$p"$'\t'"$q"$'\t'"$started"$'\n'
+    done < "$JB_REGISTRY"
+  fi
+  started=$(ps -o lstart= -p "$pid" 2>/dev/null)
+  [ -n "$started" ] || return 0
+  [ -d "$MARKER_DIR" ] || mkdir -p "$MARKER_DIR"
+  printf '%s%s\t%s\t%s\n' "$keep" "$port" "$pid" "$started" > "$JB_REGISTRY.$$" 2>/dev/null \
+    && mv -f "$JB_REGISTRY.$$" "$JB_REGISTRY"
+}
+
+# --- In-band capability table ---
+# Which escape sequence the terminal turns into a desktop notification:
+#   osc9   ESC ] 9 ; message BEL            iTerm2, WezTerm, Ghostty, kitty
+#   osc777 ESC ] 777 ; notify ; title ; body BEL  Warp, foot, urxvt
+#   bel    BEL — the terminal's bell / attention request; works everywhere else
+_claude_notify_inband_kind() {
+  case "${TERM_PROGRAM:-}" in
+    iTerm.app|WezTerm|ghostty) INBAND_KIND=osc9; return ;;
+    WarpTerminal)              INBAND_KIND=osc777; return ;;
+  esac
+  case "${TERM:-}" in
+    xterm-kitty)               INBAND_KIND=osc9 ;;
+    foot*|rxvt-unicode*)       INBAND_KIND=osc777 ;;
+    *)                         INBAND_KIND=bel ;;
+  esac
+}
+
+# Set SESSION_TTY to the TTY of the session's terminal. Hook subprocesses may lack
+# a controlling terminal (/dev/tty fails), so the TTY comes from the nearest
+# ancestor that has one — a ps per ancestor, done once per session and cached in
+# $MARKER_DIR/.tty-<session_id> (reaped by GC after MAX_AGE).
+_claude_notify_tty() {
+  local cache="" pid tty
+  SESSION_TTY=""
+  if [ -n "$SESSION_ID" ]; then
+    cache="$MARKER_DIR/.tty-$SESSION_ID"
+    if [ -f "$cache" ] && read -r SESSION_TTY < "$cache" && [ -c "$SESSION_TTY" ] && [ -w "$SESSION_TTY" ]; then
+      return 0
+    fi
+    SESSION_TTY=""
+  fi
+  pid=$HOOK_PPID
+  while [ "$pid" -gt 1 ] 2>/dev/null; do
+    tty=$(ps -o tty= -p "$pid" 2>/dev/null | tr -d ' ')
+    if [ -n "$tty" ] && [ "$tty" != "??" ]; then
+      [ -w "/dev/$tty" ] && SESSION_TTY="/dev/$tty"
+      break
     fi
+    pid=$(ps -o ppid= -p "$pid" 2>/dev/null | tr -d ' ')
+  done
+  if [ -n "$SESSION_TTY" ] && [ -n "$cache" ]; then
+    [ -d "$MARKER_DIR" ] || mkdir -p "$MARKER_DIR"
+    printf '%s\n' "$SESSION_TTY" > "$cache" 2>/dev/null
   fi
+}
 
-  # 8. Delete notify.sh itself — safe because bash holds the fd open
-  rm -f "$CLAUDE_DIR/notify.sh" 2>/dev/null
+_claude_notify_pending_refresh() {
+  rm -f "$PENDING_FLAG" 2>/dev/null
+  # Re-check after removing: a concurrent post writes its marker before the flag
+  local f
+  for f in "$MARKER_DIR"/*; do
+    [ -e "$f" ] && : > "$PENDING_FLAG"
+    break
+  done
 }
 
-INPUT=$(cat)
+# --- Capability cache ---
+# Which notifier binary to use, which legacy bundles remain and whether the
+# launcher was trashed. Probed once (install.sh writes it) and trusted while the
+# cache is strictly newer than ~/.claude and /Applications — installing, removing
+# or trashing a bundle bumps one of those directory mtimes and forces a re-probe.
+# One \x1f-separated line: NOTIFIER LEGACY_BUNDLES(|-separated) TRASHED
+# Usage: notify.sh --caps   (re-probe and print)
+# CLAUDE_NOTIFY_LAUNCHER replaces the launcher path (notify-replay.py --cleanup)
+CAPS_FILE="$MARKER_DIR/.caps"
+LAUNCHER_APP="${CLAUDE_NOTIFY_LAUNCHER:-/Applications/ClaudeNotifications.app}"
+LEGACY_BUNDLES="ClaudeNotifications Alerts.app|ClaudeNotifierPersistent.app|ClaudeNotifier.app"
 
-# If the launcher app was dragged to Trash, clean up everything and exit
-if [ ! -d "/Applications/ClaudeNotifications.app" ] && [ -f "$HOME/.claude/.notify-installed" ]; then
-  _claude_notify_cleanup
+_claude_notify_probe() {
+  local bundle legacy="" notifier="" trashed=0 IFS='|'
+  [ -x "$NOTIFIER" ] && notifier="$NOTIFIER"
+  for bundle in $LEGACY_BUNDLES; do
+    [ -x "$HOME/.claude/$bundle/Contents/MacOS/terminal-notifier" ] || continue
+    legacy="${legacy:+$legacy|}$bundle"
+    [ -z "$notifier" ] && notifier="$HOME/.claude/$bundle/Contents/MacOS/terminal-notifier"
+  done
+  if [ ! -d "$LAUNCHER_APP" ] && [ -f "$HOME/.claude/.notify-installed" ]; then
+    trashed=1
+  fi
+  CAP_NOTIFIER="$notifier" CAP_LEGACY="$legacy" CAP_TRASHED="$trashed"
+  mkdir -p "$MARKER_DIR" 2>/dev/null || return 0
+  printf '%s\x1f%s\x1f%s\n' "$notifier" "$legacy" "$trashed" > "$CAPS_FILE.$$" 2>/dev/null \
+    && mv -f "$CAPS_FILE.$$" "$CAPS_FILE" 2>/dev/null
+}
+
+_claude_notify_caps() {
+  if [ "$CAPS_FILE" -nt "$HOME/.claude" ] && [ "$CAPS_FILE" -nt "${LAUNCHER_APP%/*}" ] \
+     && IFS=$'\x1f' read -r CAP_NOTIFIER CAP_LEGACY CAP_TRASHED < "$CAPS_FILE" 2>/dev/null; then
+    return 0
+  fi
+  _claude_notify_probe
+}
+
+# --- Health check ---
+# Exercises every stage a notification depends on, times each one and flags
+# failures and checks over their latency budget. Run it from the terminal whose
+# notifications misbehave — process-tree resolution starts from the calling shell.
+# Usage: notify.sh --doctor [--json]   (exit status 1 if any check failed)
+_claude_notify_doctor() {
+  local as_json=0
+  [ "${1:-}" = "--json" ] && as_json=1
+  _claude_notify_probe
+  python3 -c "
+import json, os, platform, socket, sqlite3, subprocess, sys, time
+
+config_path, notifier, sender, marker_dir, caps_file = sys.argv[1:6]
+start_pid, as_json = int(sys.argv[6]), sys.argv[7] == '1'
+legacy, trashed = sys.argv[8], sys.argv[9] == '1'
+
+# Latency budgets in ms — roughly what each stage may cost inside one hook call
+BUDGET_MS = {
+    'config': 50, 'notifier': 250, 'sender': 100, 'sounds': 20, 'process_tree': 300,
+    'state_dir': 20, 'jetbrains_port': 100, 'vscode_uri': 500,
+}
+SOUNDS_DIR = '/System/Library/Sounds'
+NCDB = os.path.expanduser('~/Library/Group Containers/group.com.apple.usernoted/db2/db')
+
+checks = []
+config = {}
+
+def check(name):
+    def wrap(fn):
+        t = time.perf_counter()
+        try:
+            status, detail = fn()
+        except Exception as e:
+            status, detail = 'fail', f'{type(e).__name__}: {e}'
+        ms = round((time.perf_counter() - t) * 1000, 1)
+        budget = BUDGET_MS[name]
+        checks.append({'check': name, 'status': status, 'ms': ms, 'budget_ms': budget,
+                       'over_budget': status != 'skip' and ms > budget, 'detail': detail})
+        return fn
+    return wrap
+
+@check('config')
+def _():
+    global config
+    if not os.path.exists(config_path):
+        return 'fail', f'{config_path} missing — every event is disabled'
+    with open(config_path) as f:
+        config = json.load(f)
+    events = config.get('events', {})
+    if not isinstance(events, dict):
+        return 'fail', 'events is not an object'
+    on = sorted(k for k, v in events.items() if isinstance(v, dict) and v.get('enabled', True))
+    profiles = config.get('profiles') or []
+    detail = f'{len(on)} event(s) enabled: {\", \".join(on) or \"none\"}; {len(profiles)} profile(s)'
+    if not config.get('global_enabled', True):
+        return 'warn', 'notifications globally disabled; ' + detail
+    return ('ok' if on else 'warn'), detail
+
+@check('notifier')
+def _():
+    if trashed:
+        return 'fail', 'launcher app is missing from /Applications — next hook event uninstalls'
+    if not notifier or not os.access(notifier, os.X_OK):
+        return 'fail', 'no executable terminal-notifier found — re-run install.sh'
+    proc = subprocess.run([notifier, '-help'], capture_output=True, timeout=10)
+    detail = notifier
+    if legacy:
+        detail += f' (legacy bundles still present: {legacy})'
+    return ('ok' if proc.returncode == 0 and not legacy else 'warn'), detail
+
+@check('sender')
+def _():
+    import plistlib
+    plist = os.path.join(os.path.dirname(os.path.dirname(notifier or '')), 'Info.plist')
+    try:
+        with open(plist, 'rb') as f:
+            bundle_id = plistlib.load(f).get('CFBundleIdentifier', '')
+    except (OSError, ValueError):
+        return 'fail', f'cannot read {plist}'
+    if bundle_id != sender:
+        return 'fail', f'bundle identifier {bundle_id!r} != -sender {sender!r}'
+    if not os.path.exists(NCDB):
+        return 'skip', 'Notification Center database not found'
+    try:
+        db = sqlite3.connect(f'file:{NCDB}?mode=ro', uri=True, timeout=1)
+        n = db.execute('SELECT COUNT(*) FROM app WHERE identifier = ?', (sender,)).fetchone()[0]
+        db.close()
+    except sqlite3.Error as e:
+        return 'skip', f'Notification Center database not readable ({e})'
+    if not n:
+        return 'warn', f'{sender} not registered with Notification Center yet — post one notification and allow it'
+    return 'ok', f'{sender} registered'
+
+@check('sounds')
+def _():
+    wanted = {}
+    layers = [config.get('events', {})] + [p.get('events', {}) for p in config.get('profiles') or [] if isinstance(p, dict)]
+    for events in layers:
+        for key, evt in events.items():
+            if isinstance(evt, dict) and evt.get('sound_enabled', True) and evt.get('sound'):
+                wanted.setdefault(evt['sound'], key)
+    missing = [s for s in sorted(wanted) if not os.path.exists(os.path.join(SOUNDS_DIR, s + '.aiff'))]
+    afplay = any(os.access(os.path.join(d, 'afplay'), os.X_OK) for d in os.environ.get('PATH', '').split(os.pathsep))
+    if not afplay:
+        return 'fail', 'afplay not on PATH'
+    if missing:
+        return 'fail', 'missing sound files: ' + ', '.join(missing)
+    return 'ok', f'{len(wanted)} sound(s) available'
+
+@check('process_tree')
+def _():
+    # Same walk the hook does: one ps call per ancestor until a TTY (Warp) or an
+    # editor bundle (VS Code family) is found
+    term = os.environ.get('TERM_PROGRAM', '')
+    pid, depth, tty, app = start_pid, 0, '', ''
+    while pid > 1 and depth < 64:
+        out = subprocess.run(['ps', '-o', 'ppid=,tty=,args=', '-p', str(pid)],
+                             capture_output=True, text=True).stdout.split(None, 2)
+        if len(out) < 2:
+            break
+        depth += 1
+        if not tty and out[1] not in ('??', '?', '-'):
+            tty = '/dev/' + out[1]
+        args = out[2] if len(out) > 2 else ''
+        for marker, name in (('/Cursor.app/', 'Cursor'), ('/Visual Studio Code', 'Visual Studio Code'), ('/VSCodium.app/', 'VSCodium')):
+            if marker in args:
+                app = name
+        if app:
+            break
+        pid = int(out[0])
+    if os.environ.get('CLAUDE_JB_NOTIFY_PORT') or os.environ.get('TERMINAL_EMULATOR') == 'JetBrains-JediTerm':
+        app = 'JetBrains'
+    detail = f'TERM_PROGRAM={term or \"(unset)\"}, {depth} ancestor(s), tty={tty or \"none\"}'
+    if app:
+        detail += f', app={app}'
+    if not term and not app:
+        return 'warn', detail + ' — unknown terminal, clicks activate the app only'
+    return 'ok', detail
+
+@check('state_dir')
+def _():
+    os.makedirs(marker_dir, exist_ok=True)
+    probe = os.path.join(marker_dir, f'.doctor.{os.getpid()}')
+    with open(probe, 'w') as f:
+        f.write('ok')
+    os.unlink(probe)
+    entries = [e for e in os.listdir(marker_dir) if not e.startswith('.')]
+    pending = os.path.exists(os.path.join(marker_dir, '.pending'))
+    fresh = os.path.exists(caps_file)
+    detail = f'{len(entries)} marker(s), pending flag {\"set\" if pending else \"clear\"}, capability cache {\"present\" if fresh else \"missing\"}'
+    if len(entries) > 1000:
+        return 'warn', detail + ' — run notify.sh --gc'
+    if pending and not entries:
+        return 'warn', detail + ' — stale pending flag keeps dismiss hooks armed'
+    return 'ok', detail
+
+@check('jetbrains_port')
+def _():
+    port = os.environ.get('CLAUDE_JB_NOTIFY_PORT', '')
+    if not port:
+        return 'skip', 'CLAUDE_JB_NOTIFY_PORT not set (not a JetBrains terminal)'
+    try:
+        with socket.create_connection(('127.0.0.1', int(port)), timeout=2):
+            pass
+    except (OSError, ValueError) as e:
+        return 'fail', f'plugin port {port} not accepting connections ({e})'
+    return 'ok', f'plugin listening on 127.0.0.1:{port}'
+
+@check('vscode_uri')
+def _():
+    home = os.path.expanduser('~')
+    editors = [('cursor', '.cursor'), ('vscode', '.vscode'), ('vscodium', '.vscode-oss')]
+    installed = []
+    for scheme, dot in editors:
+        ext_dir = os.path.join(home, dot, 'extensions')
+        if os.path.isdir(ext_dir) and any(n.startswith('anthropic.claude-code-notifications-') for n in os.listdir(ext_dir)):
+            installed.append(scheme)
+    if not installed:
+        return 'skip', 'tab-switching extension not installed in any VS Code-family editor'
+    # Ask LaunchServices which app would receive each scheme, without opening it
+    js = ('function run(argv) { ObjC.import(\x27AppKit\x27); var u = $.NSWorkspace.sharedWorkspace'
+          '.URLForApplicationToOpenURL($.NSURL.URLWithString(argv[0] + \x27://anthropic.claude-code-notifications\x27));'
+          ' return u.isNil() ? \x27\x27 : u.path.js; }')
+    handlers, missing = [], []
+    for scheme in installed:
+        out = subprocess.run(['osascript', '-l', 'JavaScript', '-e', js, scheme],
+                             capture_output=True, text=True, timeout=10).stdout.strip()
+        if out:
+            handlers.append(f'{scheme}:// -> {os.path.basename(out)}')
+        else:
+            missing.append(scheme)
+    if missing:
+        return 'fail', 'no handler for ' + ', '.join(s + '://' for s in missing)
+    return 'ok', '; '.join(handlers)
+
+failed = any(c['status'] == 'fail' for c in checks)
+report = {
+    'ok': not failed,
+    'host': socket.gethostname(),
+    'macos': platform.mac_ver()[0],
+    'total_ms': round(sum(c['ms'] for c in checks), 1),
+    'checks': checks,
+}
+if as_json:
+    print(json.dumps(report))
+else:
+    print(f'{\"CHECK\":<16}{\"STATUS\":<8}{\"MS\":>8}{\"BUDGET\":>8}  DETAIL')
+    for c in checks:
+        flag = ' !' if c['over_budget'] else ''
+        print(f'{c[\"check\"]:<16}{c[\"status\"]:<8}{c[\"ms\"]:>8}{c[\"budget_ms\"]:>8}  {c[\"detail\"]}{flag}')
+    print(f'total {report[\"total_ms\"]} ms — ' + ('no failures' if not failed else 'FAILED'))
+sys.exit(1 if failed else 0)
+" "$CONFIG" "$CAP_NOTIFIER" "$SENDER" "$MARKER_DIR" "$CAPS_FILE" "$HOOK_PPID" "$as_json" "$CAP_LEGACY" "$CAP_TRASHED"
+}
+
+# --- Non-blocking mode ---
+# While $ASYNC_FLAG exists the hook hands each event to a detached copy of itself
+# (CLAUDE_NOTIFY_WORKER=1) and returns to Claude at once. The worker gets the
+# resolved instance PID via CLAUDE_NOTIFY_STABLE_PID (and as CLAUDE_NOTIFY_PPID,
+# so process-tree lookups still start from Claude), and runs notifier calls under
+# a hard deadline.
+# Usage: notify.sh --async on | off | status
+ASYNC_FLAG="$HOME/.claude/.notify-async"
+HOOK_PPID="${CLAUDE_NOTIFY_PPID:-$PPID}"
+HOOK_DEADLINE="${CLAUDE_NOTIFY_DEADLINE:-5}"
+
+# Run a command; in worker mode kill it if it outlives $HOOK_DEADLINE seconds
+_bounded() {
+  if [ -z "${CLAUDE_NOTIFY_WORKER:-}" ]; then
+    "$@"
+    return
+  fi
+  local pid watchdog rc
+  "$@" &
+  pid=$!
+  ( sleep "$HOOK_DEADLINE" & s=$!; trap 'kill $s 2>/dev/null; exit 0' TERM; wait $s; kill -9 "$pid" 2>/dev/null ) &
+  watchdog=$!
+  wait "$pid"
+  rc=$?
+  kill "$watchdog" 2>/dev/null
+  return $rc
+}
+
+_claude_notify_async_cli() {
+  case "${1:-status}" in
+    on)  : > "$ASYNC_FLAG"; echo "Non-blocking hook mode: on" ;;
+    off) rm -f "$ASYNC_FLAG"; echo "Non-blocking hook mode: off" ;;
+    *)   if [ -f "$ASYNC_FLAG" ]; then echo "Non-blocking hook mode: on"; else echo "Non-blocking hook mode: off"; fi ;;
+  esac
+}
+
+# Resolve one session's pending notification from outside a hook (the settings
+# UI's active-sessions view): same steps as the PostToolUse/UserPromptSubmit path.
+# Usage: notify.sh --dismiss SESSION_ID
+_claude_notify_dismiss() {
+  local sid="${1:-}" group
+  [[ "$sid" =~ ^[A-Za-z0-9_-][A-Za-z0-9._-]*$ ]] && [ -f "$MARKER_DIR/$sid" ] || return 1
+  group=$(cat "$MARKER_DIR/$sid")
+  rm -f "$MARKER_DIR/$sid"
+  if [ -f "$MARKER_DIR/$sid.dpid" ]; then
+    kill "$(cat "$MARKER_DIR/$sid.dpid")" 2>/dev/null || true
+    rm -f "$MARKER_DIR/$sid.dpid"
+  fi
+  _claude_notify_pending_refresh
+  _claude_notify_caps
+  [ -n "$CAP_NOTIFIER" ] && "$CAP_NOTIFIER" -remove "$group" >/dev/null 2>&1
+  _claude_notify_session resolved "$group"
+  if [ -e "$HISTORY_LOG" ] || [ -e "$HISTORY_DB" ]; then
+    _claude_notify_history dismissed "$group"
+  fi
+}
+
+# Hook counters and the current load-shedding level, from .stats.json
+# Usage: notify.sh --stats
+_claude_notify_stats() {
+  python3 -c "
+import json, sys
+try:
+    with open(sys.argv[1]) as f:
+        stats = json.load(f)
+except (OSError, ValueError):
+    stats = {}
+stats.setdefault('load', {'level': 0, 'level_name': 'normal'})
+stats.setdefault('dedupe', {'suppressed': 0})
+print(json.dumps(stats, indent=2, sort_keys=True))
+" "$MARKER_DIR/.stats.json"
+}
+
+# --- CLI modes (not used by hooks, which pass no arguments) ---
+case "${1:-}" in
+  --gc)     shift; _claude_notify_gc "$@"; exit 0 ;;
+  --record) shift; _claude_notify_record_cli "$@"; exit 0 ;;
+  --async)  shift; _claude_notify_async_cli "$@"; exit 0 ;;
+  --doctor) shift; _claude_notify_doctor "$@"; exit $? ;;
+  --dismiss) shift; _claude_notify_dismiss "$@"; exit $? ;;
+  --stats)  _claude_notify_stats; exit 0 ;;
+  --cleanup-worker) _claude_notify_cleanup_worker; exit 0 ;;
+  --caps)   _claude_notify_probe; printf 'notifier=%s\nlegacy=%s\ntrashed=%s\n' "$CAP_NOTIFIER" "$CAP_LEGACY" "$CAP_TRASHED"; exit 0 ;;
+esac
+
+# Read the payload with a builtin rather than $(cat) — one fork less per event
+IFS= read -r -d '' INPUT || true
+
+if [ -f "$RECORD_FLAG" ]; then
+  _claude_notify_record
+fi
+
+# --- Remote relay (hook side) ---
+# On a remote host CLAUDE_NOTIFY_RELAY=PORT (or HOST:PORT) points at a
+# notify-relay.py agent, which keeps one persistent connection to the receiver on
+# the Mac. Forwarding is one connect + write via bash's /dev/tcp — no forks.
+if [ -n "${CLAUDE_NOTIFY_RELAY:-}" ]; then
+  _relay="$CLAUDE_NOTIFY_RELAY"
+  [[ "$_relay" == *:* ]] || _relay="127.0.0.1:$_relay"
+  { _claude_notify_record_line >&3; } 2>/dev/null 3>"/dev/tcp/${_relay%:*}/${_relay##*:}"
   exit 0
 fi
 
 # --- Auto-dismiss: resolve stale notifications ---
 # PostToolUse = permission was granted and tool ran. UserPromptSubmit = user responded.
-MARKER_DIR="$HOME/.claude/.persistent-notifications"
-# Stable process ID: grandparent PID persists across context clears within the same
-# Claude Code instance, but differs between terminals (no cross-session interference).
-STABLE_PID=$(ps -o ppid= -p $PPID 2>/dev/null | tr -d ' ')
+# Nothing pending means nothing to dismiss — exit before any process lookup.
+if [ ! -e "$PENDING_FLAG" ] && { [[ "$INPUT" == *'"PostToolUse"'* ]] || [[ "$INPUT" == *'"UserPromptSubmit"'* ]]; }; then
+  exit 0
+fi
+
+# Stable process ID: the Claude Code instance, which persists across context clears
+# but differs between terminals (no cross-session interference). Claude runs each
+# hook command through sh -c; sh execs a plain command (bash notify.sh is then
+# Claude's child) but forks for a compound one like the gated hooks (notify.sh is
+# then the child of sh). Step over that sh so every hook shape gets the same PID —
+# the one the gated commands' own $PPID names. Resolved before the async handoff:
+# by the time the worker runs, a forking sh has exited and its PID may be reused.
+STABLE_PID="${CLAUDE_NOTIFY_STABLE_PID:-}"
+if [ -z "$STABLE_PID" ] && read -r _ppid _comm < <(ps -o ppid=,comm= -p "$HOOK_PPID" 2>/dev/null); then
+  _comm="${_comm##*/}"
+  case "${_comm#-}" in
+    sh|bash|dash|zsh) STABLE_PID="$_ppid" ;;
+    *)                STABLE_PID="$HOOK_PPID" ;;
+  esac
+fi
+
+if [ -f "$ASYNC_FLAG" ] && [ -z "${CLAUDE_NOTIFY_WORKER:-}" ]; then
+  CLAUDE_NOTIFY_WORKER=1 CLAUDE_NOTIFY_PPID="${STABLE_PID:-$HOOK_PPID}" CLAUDE_NOTIFY_STABLE_PID="$STABLE_PID" nohup bash "${BASH_SOURCE[0]}" <<< "$INPUT" >/dev/null 2>&1 &
+  exit 0
+fi
+
+_claude_notify_caps
+[ -n "$CAP_NOTIFIER" ] && NOTIFIER="$CAP_NOTIFIER"
+
+# If the launcher app was dragged to Trash, clean up everything and exit
+if [ "$CAP_TRASHED" = "1" ]; then
+  _claude_notify_cleanup
+  exit 0
+fi
+
+# Opportunistic GC: roughly 1 in 256 hook calls sweeps a bounded slice of the
+# marker directory in a detached process, so the amortized cost per call is O(1).
+if [ $((RANDOM % 256)) -eq 0 ] && [ -d "$MARKER_DIR" ]; then
+  nohup bash "${BASH_SOURCE[0]}" --gc --budget 500 >/dev/null 2>&1 &
+fi
+
 if [[ "$INPUT" == *'"PostToolUse"'* ]] || [[ "$INPUT" == *'"UserPromptSubmit"'* ]]; then
   if [ -d "$MARKER_DIR" ]; then
     # Try session_id match first (normal case)
@@ -186,26 +975,45 @@ if [[ "$INPUT" == *'"PostToolUse"'* ]] || [[ "$INPUT" == *'"UserPromptSubmit"'*
         rm -f "$MARKER_DIR/pid-$STABLE_PID.dpid"
       fi
     fi
-    # Always clean up the pid marker for this instance
-    [ -n "$STABLE_PID" ] && rm -f "$MARKER_DIR/pid-$STABLE_PID"
+    # Always clean up the pid marker for this instance (its timer shares the
+    # session's dpid, which was already killed above)
+    [ -n "$STABLE_PID" ] && rm -f "$MARKER_DIR/pid-$STABLE_PID" "$MARKER_DIR/pid-$STABLE_PID.dpid"
+    # The installed UserPromptSubmit hook records the turn start itself; this
+    # covers hooks that still run bash unconditionally
+    if [ -n "$STABLE_PID" ] && [[ "$INPUT" == *'"UserPromptSubmit"'* ]]; then
+      : > "$MARKER_DIR/.turn-$STABLE_PID"
+    fi
+    _claude_notify_pending_refresh
     # Dismiss the notification
     if [ -n "$DISMISS_GROUP" ]; then
-      [ -x "$NOTIFIER" ] && "$NOTIFIER" -remove "$DISMISS_GROUP" 2>/dev/null
-      # Legacy fallback
-      for legacy in "$HOME/.claude/ClaudeNotifications Alerts.app/Contents/MacOS/terminal-notifier" \
-                     "$HOME/.claude/ClaudeNotifierPersistent.app/Contents/MacOS/terminal-notifier" \
-                     "$HOME/.claude/ClaudeNotifier.app/Contents/MacOS/terminal-notifier"; do
-        [ -x "$legacy" ] && "$legacy" -remove "claude-code" 2>/dev/null
-      done
+      [ -n "$CAP_NOTIFIER" ] && _bounded "$NOTIFIER" -remove "$DISMISS_GROUP" 2>/dev/null
+      _claude_notify_session resolved "$DISMISS_GROUP"
+      if [ -e "$HISTORY_LOG" ] || [ -e "$HISTORY_DB" ]; then
+        _claude_notify_history dismissed "$DISMISS_GROUP"
+      fi
+      # Legacy fallback — only bundles the capability probe found on disk
+      if [ -n "$CAP_LEGACY" ]; then
+        IFS='|' read -r -a _legacy <<< "$CAP_LEGACY"
+        for legacy in "${_legacy[@]}"; do
+          _bounded "$HOME/.claude/$legacy/Contents/MacOS/terminal-notifier" -remove "claude-code" 2>/dev/null
+        done
+      fi
     fi
   fi
   exit 0
 fi
 
 # Parse hook event data and read config in a single python3 call
-# Outputs: EVENT_KEY ENABLED SOUND VOLUME STYLE SOUND_ENABLED TIMEOUT TITLE BODY SESSION_ID
-eval $(CLAUDE_HOOK_INPUT="$INPUT" python3 -c "
-import sys, json, os
+# Outputs one \x1f-separated record (no eval): EVENT_KEY ENABLED SOUND VOLUME STYLE
+# SOUND_ENABLED TIMEOUT TITLE BODY SESSION_ID WARP_NATIVE TOOL_NAME HISTORY POSTED_AT PRIORITY
+# DELIVERY SHED_LEVEL SINK_DRAIN.
+# TITLE and BODY are rendered once here — control characters stripped, BODY
+# truncated on a grapheme boundary to max_message_length — so the notifier and OSC
+# paths share the result. POSTED_AT saves the history journal a date fork.
+IFS=$'\x1f' read -r EVENT_KEY ENABLED SOUND VOLUME STYLE SOUND_ENABLED TIMEOUT TITLE BODY SESSION_ID WARP_NATIVE \
+  TOOL_NAME HISTORY POSTED_AT PRIORITY DELIVERY SHED_LEVEL SINK_DRAIN \
+  < <(CLAUDE_HOOK_INPUT="$INPUT" python3 -c "
+import sys, json, os, re, time, unicodedata, zlib
 
 raw = os.environ.get('CLAUDE_HOOK_INPUT', ''); hook = json.loads(raw) if raw.strip() else {}
 event = hook.get('hook_event_name', '')
@@ -224,6 +1032,78 @@ except:
 
 events_config = config.get('events', {})
 
+# Per-project profiles: the global config is the base layer and the profile with
+# the longest path prefix of the session's cwd overrides it. Profiles are indexed
+# in a trie keyed by path component, so a lookup walks at most the depth of cwd.
+# The trie is built once per config change and kept next to the markers (same
+# signature as the rules memo); a leaf '/' holds the profile's position in the
+# config. Without cwd, the project directory in transcript_path (cwd with every
+# non-alphanumeric character replaced by '-') is matched in a second trie keyed
+# by '-'-separated part. That encoding is lossy: '/x/app' and '/x/app-old' (or
+# '/x/app.old') share a prefix there, so a profile for /x/app also matches
+# sessions in /x/app-old when only the transcript path is known.
+def lookup(index, parts):
+    node, best = index, index.get('/')
+    for part in parts:
+        node = node.get(part)
+        if node is None:
+            break
+        best = node.get('/', best)
+    return best
+
+by_component = lambda path: [p for p in path.split('/') if p]
+by_encoded = lambda path: re.sub(r'[^A-Za-z0-9]', '-', path).split('-')
+all_profiles = config.get('profiles') if isinstance(config.get('profiles'), list) else []
+profile = None
+if any(isinstance(p, dict) and str(p.get('path', '')).strip() for p in all_profiles):
+    index_path = os.path.join('$MARKER_DIR', '.profiles-index.json')
+    try:
+        st = os.stat(config_path)
+        signature = '%d:%d' % (st.st_mtime_ns, st.st_size)
+    except OSError:
+        signature = ''
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get('signature') != signature:
+            index = None
+    except (OSError, ValueError):
+        index = None
+    if index is None:
+        index = {'signature': signature, 'component': {}, 'encoded': {}}
+        for i, prof in enumerate(all_profiles):
+            if not (isinstance(prof, dict) and str(prof.get('path', '')).strip()):
+                continue
+            path = os.path.normpath(os.path.expanduser(str(prof['path']).strip()))
+            for kind, split in (('component', by_component), ('encoded', by_encoded)):
+                node = index[kind]
+                for part in split(path):
+                    node = node.setdefault(part, {})
+                node['/'] = i
+        try:
+            os.makedirs('$MARKER_DIR', exist_ok=True)
+            tmp = index_path + '.%d' % os.getpid()
+            with open(tmp, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp, index_path)
+        except OSError:
+            pass
+    cwd = hook.get('cwd') or ''
+    transcript = hook.get('transcript_path') or ''
+    found = None
+    if cwd:
+        found = lookup(index['component'], by_component(os.path.normpath(cwd)))
+    elif transcript:
+        found = lookup(index['encoded'], os.path.basename(os.path.dirname(transcript)).split('-'))
+    if isinstance(found, int) and 0 <= found < len(all_profiles):
+        profile = all_profiles[found]
+if profile:
+    if 'global_enabled' in profile:
+        config['global_enabled'] = profile['global_enabled']
+    for key, overrides in (profile.get('events') or {}).items():
+        if isinstance(overrides, dict):
+            events_config[key] = dict(events_config.get(key, {}), **overrides)
+
 # Determine event key and notification text
 known_event = True
 if event == 'PermissionRequest':
@@ -264,25 +1144,374 @@ else:
     sound_enabled = evt.get('sound_enabled', True)
     timeout = evt.get('timeout', config.get('default_timeout', 5))
 
-# Escape single quotes for shell
-title = title.replace(\"'\", \"'\\\\''\")
-body = body.replace(\"'\", \"'\\\\''\")
-
-print(f\"EVENT_KEY='{event_key}'\")
-print(f\"ENABLED={'1' if enabled else '0'}\")
-print(f\"SOUND='{sound}'\")
-print(f\"VOLUME={volume / 10.0}\")
-print(f\"STYLE='{style}'\")
-print(f\"SOUND_ENABLED={'1' if sound_enabled else '0'}\")
-print(f\"TIMEOUT={timeout}\")
-print(f\"TITLE='{title}'\")
-print(f\"BODY='{body}'\")
-print(f\"SESSION_ID='{session_id}'\")
-print(f\"WARP_NATIVE={'1' if config.get('warp_native', True) else '0'}\")
+    # Quick replies: the UserPromptSubmit hook touches .turn-<instance pid> when a
+    # turn starts, so its mtime is the turn start. Events that arrive sooner than
+    # min_turn_seconds after it are suppressed, or posted silently as a banner.
+    try:
+        min_turn = float(evt.get('min_turn_seconds', 0) or 0)
+    except (TypeError, ValueError):
+        min_turn = 0
+    if enabled and min_turn > 0 and '$STABLE_PID':
+        try:
+            turn_secs = time.time() - os.stat(os.path.join('$MARKER_DIR', '.turn-$STABLE_PID')).st_mtime
+        except OSError:
+            turn_secs = None
+        if turn_secs is not None and turn_secs < min_turn:
+            if evt.get('short_turn', 'suppress') == 'quiet':
+                sound_enabled = False
+                style = 'banner'
+            else:
+                enabled = False
+
+# Routing rules: ordered, first match wins. A rule matches on event key, tool_name
+# (full regex), a regex searched in the message or tool input, and a cwd prefix;
+# its action can suppress or force the notification and change sound, style,
+# timeout or priority (high = deliver through Do Not Disturb, low = silent).
+# Which rules can apply depends only on (event, tool) until message/cwd are
+# checked, so the candidate list per key is memoized next to the markers (at most
+# RULES_MEMO_KEYS keys — MCP tool names are unbounded) and reset whenever the
+# config changes — a hit skips the other rules entirely. Rules are type-checked
+# while building the candidate list and a malformed one is skipped; any other
+# failure in this stage ignores the rules for the event rather than dropping it.
+RULES_MEMO_KEYS = 256
+
+def valid_rule(rule):
+    if not isinstance(rule, dict):
+        return False
+    match = rule.get('match', {})
+    if not isinstance(match, dict) or not isinstance(rule.get('action', {}), dict):
+        return False
+    events = match.get('event')
+    if events and not (isinstance(events, str)
+                       or isinstance(events, list) and all(isinstance(e, str) for e in events)):
+        return False
+    if match.get('cwd') and not isinstance(match['cwd'], str):
+        return False
+    for field in ('tool', 'message'):
+        if match.get(field):
+            if not isinstance(match[field], str):
+                return False
+            try:
+                re.compile(match[field])
+            except re.error:
+                return False
+    return True
+
+priority = 'normal'
+rules = config.get('rules') or []
+if known_event and config.get('global_enabled', True) and isinstance(rules, list) and rules:
+    try:
+        memo_path = os.path.join('$MARKER_DIR', '.rules-memo.json')
+        try:
+            st = os.stat(config_path)
+            signature = '%d:%d' % (st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = ''
+        try:
+            with open(memo_path) as f:
+                memo = json.load(f)
+        except (OSError, ValueError):
+            memo = None
+        if (not isinstance(memo, dict) or memo.get('signature') != signature
+                or not isinstance(memo.get('keys'), dict)):
+            memo = {'signature': signature, 'keys': {}}
+        key = event_key + '\x1f' + str(tool_name)
+        candidates = memo['keys'].get(key)
+        if not isinstance(candidates, list):
+            candidates = []
+            for i, rule in enumerate(rules):
+                if not valid_rule(rule):
+                    continue
+                match = rule.get('match', {})
+                events = match.get('event')
+                if events and event_key not in ([events] if isinstance(events, str) else events):
+                    continue
+                if match.get('tool') and not re.fullmatch(match['tool'], str(tool_name)):
+                    continue
+                candidates.append(i)
+                if not match.get('message') and not match.get('cwd'):
+                    break  # unconditional for this key — later rules can never win
+            if len(memo['keys']) >= RULES_MEMO_KEYS:
+                memo['keys'] = {}
+            memo['keys'][key] = candidates
+            try:
+                os.makedirs('$MARKER_DIR', exist_ok=True)
+                tmp = memo_path + '.%d' % os.getpid()
+                with open(tmp, 'w') as f:
+                    json.dump(memo, f)
+                os.replace(tmp, memo_path)
+            except OSError:
+                pass
+
+        tool_input = hook.get('tool_input') if isinstance(hook.get('tool_input'), dict) else {}
+        match_text = message or ' '.join(str(tool_input[k]) for k in ('command', 'file_path', 'path', 'pattern', 'url') if k in tool_input)
+        cwd = os.path.normpath(hook.get('cwd') or '/')
+        for i in candidates:
+            match = rules[i].get('match', {})
+            if match.get('message') and not re.search(match['message'], match_text):
+                continue
+            if match.get('cwd'):
+                prefix = os.path.normpath(os.path.expanduser(match['cwd']))
+                if cwd != prefix and not cwd.startswith(prefix.rstrip('/') + '/'):
+                    continue
+            action = rules[i].get('action', {})
+            if action.get('suppress'):
+                enabled = False
+            elif action.get('notify'):
+                enabled = True
+            sound = action.get('sound', sound)
+            volume = action.get('volume', volume)
+            sound_enabled = action.get('sound_enabled', sound_enabled)
+            style = action.get('style', style)
+            timeout = action.get('timeout', timeout)
+            priority = action.get('priority', priority)
+            if priority == 'low':
+                sound_enabled = False
+            break
+    except Exception:
+        priority = 'normal'
+
+posted_at = time.time()
+
+# Hook counters (notify.sh --stats, settings UI), read only by a stage that updates them
+stats_path = os.path.join('$MARKER_DIR', '.stats.json')
+stats = None
+def load_stats():
+    try:
+        with open(stats_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Duplicate events: one dialog can reach the hook more than once (a PermissionRequest
+# and a permission_prompt Notification), and an open question can be re-notified.
+# The key is the semantic event plus the tool and a hash of its input, or a hash
+# of the message when there is no tool; the last posted key per session is kept in
+# .dedupe-<session_id>. A repeat within dedupe_seconds while that notification is
+# still open (its session marker exists) is dropped here, before anything is
+# spawned, and counted in stats. A permission_prompt Notification carries only the
+# tool's name, so for permission requests a key without an input hash matches on
+# the tool alone — a denied request leaves its marker behind, and the next request
+# for the same tool with a different input must still be posted.
+safe_sid = re.sub(r'[^A-Za-z0-9._-]', '', session_id)
+dedupe_key = dedupe_path = None
+try:
+    dedupe_ttl = float(config.get('dedupe_seconds', 60))
+except (TypeError, ValueError):
+    dedupe_ttl = 60.0
+if known_event and safe_sid and dedupe_ttl > 0:
+    semantic = 'permission_request' if event_key == 'permission_prompt' else event_key
+    subject = str(tool_name)
+    if not subject and semantic == 'permission_request':
+        m = re.search(r'permission to use (\S+)', str(message))
+        subject = m.group(1) if m else ''
+    if not subject:
+        subject = '%08x' % zlib.crc32(str(message).encode())
+    dedupe_key = semantic + ':' + subject
+    if tool_name and isinstance(hook.get('tool_input'), dict):
+        dedupe_key += '#%08x' % zlib.crc32(json.dumps(hook['tool_input'], sort_keys=True).encode())
+    dedupe_path = os.path.join('$MARKER_DIR', '.dedupe-' + safe_sid)
+    if enabled:
+        try:
+            with open(dedupe_path) as f:
+                last_key, last_posted = f.read().split('\t')
+            same = last_key == dedupe_key or (
+                semantic == 'permission_request' and ('#' not in last_key or '#' not in dedupe_key)
+                and last_key.split('#')[0] == dedupe_key.split('#')[0])
+            if (same and posted_at - float(last_posted) < dedupe_ttl
+                    and os.path.exists(os.path.join('$MARKER_DIR', safe_sid))):
+                enabled = False
+                stats = load_stats()
+                counts = stats.setdefault('dedupe', {})
+                counts['suppressed'] = counts.get('suppressed', 0) + 1
+        except (OSError, ValueError):
+            pass
+
+# Adaptive load shedding. Two signals, both free to collect here: per-CPU load
+# average, and how long the previous delivery took — the hook touches .delivered
+# once the notifier returns, so its mtime minus the previous run's posting time is
+# that delivery's latency (kept as an EWMA that decays while nothing is delivered).
+# The level steps up as soon as a signal crosses a threshold and back down one
+# step per recover_seconds: 1 = no process-tree walk (app-level focus), 2 = also no
+# sound, 3 = permission_request only. CLAUDE_NOTIFY_LOAD / CLAUDE_NOTIFY_LATENCY_MS
+# replace the measured signals (notify-replay.py --shed). Level and counters are
+# kept in .stats.json (notify.sh --stats, settings UI). Settings are validated
+# (recover_seconds at least 1, at most three numeric thresholds per signal, bad
+# values fall back to the defaults), and any other failure in this stage turns
+# shedding off for the event rather than dropping it.
+LEVEL_NAMES = ['normal', 'app-level focus', 'no sound', 'permission requests only']
+
+def shed_thresholds(value, default):
+    try:
+        return sorted(float(t) for t in value)[:len(LEVEL_NAMES) - 1]
+    except (TypeError, ValueError):
+        return default
+
+shed_level = 0
+shed = config.get('load_shedding') if isinstance(config.get('load_shedding'), dict) else {}
+if known_event and shed.get('enabled', True):
+    try:
+        if stats is None:
+            stats = load_stats()
+        state = stats.setdefault('load', {})
+        try:
+            recover = max(1.0, float(shed.get('recover_seconds', 30)))
+        except (TypeError, ValueError):
+            recover = 30.0
+        latency_steps = shed_thresholds(shed.get('latency_ms', [500, 1000, 2000]), [500, 1000, 2000])
+        load_steps = shed_thresholds(shed.get('load', [1.5, 2.5, 4.0]), [1.5, 2.5, 4.0])
+        last = float(state.get('last_posted', 0))
+        ewma = float(state.get('latency_ms', 0.0))
+        if last:
+            ewma *= 0.5 ** ((posted_at - last) / recover)
+        try:
+            sample = os.environ.get('CLAUDE_NOTIFY_LATENCY_MS')
+            if sample is None and last:
+                delivered = os.stat(os.path.join('$MARKER_DIR', '.delivered')).st_mtime
+                if delivered >= last:
+                    sample = (delivered - last) * 1000
+            if sample is not None:
+                ewma = float(sample) if not state.get('latency_ms') else 0.7 * ewma + 0.3 * float(sample)
+        except (OSError, ValueError):
+            pass
+        try:
+            load = float(os.environ.get('CLAUDE_NOTIFY_LOAD') or os.getloadavg()[0] / (os.cpu_count() or 1))
+        except (OSError, ValueError):
+            load = 0.0
+        target = max(sum(ewma >= t for t in latency_steps), sum(load >= t for t in load_steps))
+        level = min(max(int(state.get('level', 0)), 0), len(LEVEL_NAMES) - 1)
+        since = float(state.get('since', posted_at))
+        if target > level:
+            level, since = target, posted_at
+        elif target < level and posted_at - since >= recover:
+            level, since = level - 1, posted_at
+        state.update(level=level, level_name=LEVEL_NAMES[level], since=since,
+                     latency_ms=round(ewma, 1), load=round(load, 2), last_posted=posted_at)
+        shed_level = level
+        counts = stats.setdefault('shed', {})
+        if enabled and level >= 3 and event_key != 'permission_request':
+            enabled = False
+            counts['dropped'] = counts.get('dropped', 0) + 1
+        elif enabled and level >= 2 and sound_enabled:
+            sound_enabled = False
+            counts['silenced'] = counts.get('silenced', 0) + 1
+        if enabled and level >= 1:
+            counts['app_level'] = counts.get('app_level', 0) + 1
+    except Exception:
+        # Bad state starts over on the next event
+        shed_level = 0
+        if isinstance(stats, dict):
+            stats.pop('load', None)
+if stats is not None:
+    try:
+        os.makedirs('$MARKER_DIR', exist_ok=True)
+        tmp = stats_path + '.%d' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump(stats, f)
+        os.replace(tmp, stats_path)
+    except OSError:
+        pass
+
+def sanitize(text):
+    # Drop control characters (newlines/tabs become spaces) and collapse whitespace
+    out = []
+    for ch in text:
+        if ch in '\t\n\r':
+            out.append(' ')
+        elif unicodedata.category(ch) != 'Cc':
+            out.append(ch)
+    return ' '.join(''.join(out).split())
+
+def extends_cluster(ch):
+    # Characters that attach to the previous one: combining marks, ZWJ,
+    # variation selectors, emoji skin-tone modifiers and tag characters
+    cp = ord(ch)
+    return (unicodedata.category(ch) in ('Mn', 'Mc', 'Me') or cp == 0x200D
+            or 0xFE00 <= cp <= 0xFE0F or 0x1F3FB <= cp <= 0x1F3FF or 0xE0020 <= cp <= 0xE007F)
+
+def truncate(text, limit):
+    if limit <= 0 or len(text) <= limit:
+        return text
+    cut = limit - 1  # leave room for the ellipsis
+    while cut > 0 and (extends_cluster(text[cut]) or text[cut - 1] == '\u200d'):
+        cut -= 1
+    # Regional indicators pair up into flags — do not split a pair
+    ri = 0
+    while cut - ri > 0 and 0x1F1E6 <= ord(text[cut - ri - 1]) <= 0x1F1FF:
+        ri += 1
+    if ri % 2 and 0x1F1E6 <= ord(text[cut]) <= 0x1F1FF:
+        cut -= 1
+    return text[:cut].rstrip() + '\u2026'
+
+try:
+    max_len = int(config.get('max_message_length', 200))
+except (TypeError, ValueError):
+    max_len = 200
+title = sanitize(title)
+body = truncate(sanitize(body), max_len)
+# session_id ends up in file paths and the click command — keep it to safe characters
+session_id = safe_sid
+event_key = re.sub(r'[^A-Za-z0-9._-]', '', event_key)
+tool_name = sanitize(str(tool_name))[:100]
+
+# Remember what this session is about to show, for the duplicate check above
+if enabled and dedupe_path:
+    try:
+        os.makedirs('$MARKER_DIR', exist_ok=True)
+        with open(dedupe_path, 'w') as f:
+            f.write(dedupe_key + '\t%.6f' % posted_at)
+    except OSError:
+        pass
+
+# Fan-out sinks (notify-sinks.py): the resolved event is appended to the sink
+# queue as one JSON line, and SINK_DRAIN asks the shell to start a drainer when
+# none is running. The queue is capped at 1 MB; an event past the cap only
+# leaves one byte in the overflow file for the drainer to count.
+sink_drain = '0'
+if enabled and any(isinstance(s, dict) and s.get('enabled', True) for s in config.get('sinks') or []):
+    record = json.dumps({'ts': round(posted_at, 6), 'event': event_key, 'session_id': session_id,
+                         'title': title, 'message': body, 'tool': tool_name,
+                         'cwd': hook.get('cwd') or '', 'priority': str(priority)}) + '\n'
+    try:
+        os.makedirs('$SINK_DIR', exist_ok=True)
+        fd = os.open(os.path.join('$SINK_DIR', 'queue.jsonl'), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size + len(record) <= 1048576:
+                os.write(fd, record.encode())
+            else:
+                with open(os.path.join('$SINK_DIR', 'overflow'), 'ab') as f:
+                    f.write(b'.')
+        finally:
+            os.close(fd)
+        with open(os.path.join('$SINK_DIR', 'drain.pid')) as f:
+            os.kill(int(f.read()), 0)
+    except (OSError, ValueError):
+        sink_drain = '1'
+
+print('\x1f'.join([
+    event_key,
+    '1' if enabled else '0',
+    str(sound),
+    str(volume / 10.0),
+    str(style),
+    '1' if sound_enabled else '0',
+    str(timeout),
+    title,
+    body,
+    session_id,
+    '1' if config.get('warp_native', True) else '0',
+    tool_name,
+    '1' if config.get('history', True) else '0',
+    '%.6f' % posted_at,
+    re.sub(r'[^a-z]', '', str(priority)),
+    'terminal' if config.get('delivery') == 'terminal' else 'native',
+    str(shed_level),
+    sink_drain,
+]))
 " 2>/dev/null)
 
-# Guard: if Python failed, ENABLED was never set — exit silently
-if [ -z "${ENABLED+x}" ]; then
+# Guard: if Python failed, ENABLED is empty — exit silently
+if [ -z "$ENABLED" ]; then
   exit 0
 fi
 
@@ -291,29 +1520,31 @@ if [ "$ENABLED" = "0" ]; then
   exit 0
 fi
 
-# --- Warp: use native OSC 777 notifications ---
-# Warp supports OSC 777 escape sequences for notifications. The escape sequence
-# must reach the Warp tab's PTY so Warp can handle click-to-focus natively.
-# Hook subprocesses may lack a controlling terminal (/dev/tty fails), so we
-# walk the process tree to find the actual TTY device from an ancestor process.
+# Hand queued sink events to a detached drainer unless one is already running
+if [ "$SINK_DRAIN" = "1" ] && [ -f "$HOME/.claude/notify-sinks.py" ]; then
+  nohup python3 "$HOME/.claude/notify-sinks.py" drain >/dev/null 2>&1 &
+fi
+
+# --- In-band delivery: an escape sequence written to the session's TTY ---
+# With "delivery": "terminal" (and for Warp while warp_native is on) the terminal
+# itself shows the notification: no notifier, no afplay, no click handler and no
+# dismiss timer — with a cached TTY the whole delivery is one write(). Terminals
+# that support it focus their own tab when the notification is clicked.
 # Reference: https://github.com/warpdotdev/claude-code-warp
-if [ "${TERM_PROGRAM:-}" = "WarpTerminal" ] && [ "$WARP_NATIVE" = "1" ]; then
-  # Find the actual TTY device from our process hierarchy
-  WARP_TTY=""
-  _pid=$$
-  while [ "$_pid" -gt 1 ] 2>/dev/null; do
-    _tty=$(ps -o tty= -p "$_pid" 2>/dev/null | tr -d ' ')
-    if [ -n "$_tty" ] && [ "$_tty" != "??" ]; then
-      WARP_TTY="/dev/$_tty"
-      break
-    fi
-    _pid=$(ps -o ppid= -p "$_pid" 2>/dev/null | tr -d ' ')
-  done
-  if [ -n "$WARP_TTY" ] && [ -w "$WARP_TTY" ]; then
-    printf '\033]777;notify;%s;%s\007' "$TITLE" "$BODY" > "$WARP_TTY" 2>/dev/null || true
+if [ "$DELIVERY" = "terminal" ] || { [ "${TERM_PROGRAM:-}" = "WarpTerminal" ] && [ "$WARP_NATIVE" = "1" ]; }; then
+  _claude_notify_inband_kind
+  _claude_notify_tty
+  if [ -n "$SESSION_TTY" ]; then
+    case "$INBAND_KIND" in
+      osc9)   printf '\033]9;%s: %s\007' "$TITLE" "$BODY" ;;
+      osc777) printf '\033]777;notify;%s;%s\007' "${TITLE//;/,}" "$BODY" ;;
+      *)      printf '\007' ;;
+    esac > "$SESSION_TTY" 2>/dev/null || true
+    [ "$HISTORY" = "1" ] && _claude_notify_history_posted "claude-code${SESSION_ID:+-$SESSION_ID}" \
+      "$EVENT_KEY" "$TOOL_NAME" "${TERM_PROGRAM:-}" "$TITLE" "$BODY" "$POSTED_AT"
+    exit 0
   fi
-  # No afplay — Warp plays its own notification sound for OSC 777
-  exit 0
+  # No reachable TTY (e.g. a detached hook) — fall through to the notifier
 fi
 
 # Single notifier app — group is per-session
@@ -322,17 +1553,6 @@ if [ -n "$SESSION_ID" ]; then
   GROUP="${GROUP}-${SESSION_ID}"
 fi
 
-# Fallback: try legacy app bundles if new single app doesn't exist
-if [ ! -x "$NOTIFIER" ]; then
-  for fallback in "$HOME/.claude/ClaudeNotifications Alerts.app/Contents/MacOS/terminal-notifier" \
-                   "$HOME/.claude/ClaudeNotifierPersistent.app/Contents/MacOS/terminal-notifier" \
-                   "$HOME/.claude/ClaudeNotifier.app/Contents/MacOS/terminal-notifier"; do
-    if [ -x "$fallback" ]; then
-      NOTIFIER="$fallback"
-      break
-    fi
-  done
-fi
 
 # Auto-detect terminal and tab identifier from environment
 TERM_APP="${TERM_PROGRAM:-}"
@@ -342,34 +1562,52 @@ if [ -n "${CLAUDE_JB_NOTIFY_PORT:-}" ]; then
   # Plugin installed: full tab-switching support
   TERM_APP="JetBrains"
   TAB_ID="${CLAUDE_JB_TAB_ID:-}|${CLAUDE_JB_NOTIFY_PORT}|${CLAUDE_JB_IDE_PID:-}"
+  _claude_notify_jb_register "$CLAUDE_JB_NOTIFY_PORT" "${CLAUDE_JB_IDE_PID:-}"
 elif [ "${TERMINAL_EMULATOR:-}" = "JetBrains-JediTerm" ]; then
   # JetBrains terminal without plugin: app-level activation only
   TERM_APP="JetBrains"
   TAB_ID=""
 fi
 
+# Under load shedding (level 1+) skip the ps lookups: app-level activation only
 case "$TERM_APP" in
   JetBrains)      ;; # Already handled above
   WarpTerminal)   TAB_ID="" ;;
   iTerm.app)      TAB_ID="${ITERM_SESSION_ID:-}" ;;
-  Apple_Terminal)  TAB_ID="/dev/$(ps -o tty= -p $PPID 2>/dev/null | xargs)" ;;
+  Apple_Terminal)
+    if [ "$SHED_LEVEL" -ge 1 ] 2>/dev/null; then
+      TAB_ID=""
+    else
+      TAB_ID="/dev/$(ps -o tty= -p $HOOK_PPID 2>/dev/null | xargs)"
+    fi
+    ;;
   vscode)
-    # Detect actual app by walking process tree to find .app bundle.
-    # Collect ancestor PIDs along the way — one of them will match
-    # terminal.processId in the VS Code extension for tab switching.
-    _pid=$PPID
-    _ancestor_pids=""
-    while [ "$_pid" -gt 1 ] 2>/dev/null; do
-      _ancestor_pids="${_ancestor_pids:+${_ancestor_pids},}${_pid}"
-      _args=$(ps -o args= -p $_pid 2>/dev/null)
-      case "$_args" in
-        */Cursor.app/*)                TERM_APP="Cursor"; break ;;
-        */"Visual Studio Code"*.app/*) TERM_APP="Visual Studio Code"; break ;;
-        */VSCodium.app/*)              TERM_APP="VSCodium"; break ;;
+    if [ "$SHED_LEVEL" -ge 1 ] 2>/dev/null; then
+      # Name the app from the bundle id the editor exports to its terminals
+      case "${__CFBundleIdentifier:-}" in
+        com.todesktop.230313mzl4w4u92) TERM_APP="Cursor" ;;
+        com.vscodium*)                 TERM_APP="VSCodium" ;;
+        *)                             TERM_APP="Visual Studio Code" ;;
       esac
-      _pid=$(ps -o ppid= -p $_pid 2>/dev/null | tr -d ' ')
-    done
-    TAB_ID="$_ancestor_pids"
+      TAB_ID=""
+    else
+      # Detect actual app by walking process tree to find .app bundle.
+      # Collect ancestor PIDs along the way — one of them will match
+      # terminal.processId in the VS Code extension for tab switching.
+      _pid=$HOOK_PPID
+      _ancestor_pids=""
+      while [ "$_pid" -gt 1 ] 2>/dev/null; do
+        _ancestor_pids="${_ancestor_pids:+${_ancestor_pids},}${_pid}"
+        _args=$(ps -o args= -p $_pid 2>/dev/null)
+        case "$_args" in
+          */Cursor.app/*)                TERM_APP="Cursor"; break ;;
+          */"Visual Studio Code"*.app/*) TERM_APP="Visual Studio Code"; break ;;
+          */VSCodium.app/*)              TERM_APP="VSCodium"; break ;;
+        esac
+        _pid=$(ps -o ppid= -p $_pid 2>/dev/null | tr -d ' ')
+      done
+      TAB_ID="$_ancestor_pids"
+    fi
     ;;
   *)              TAB_ID="" ;;
 esac
@@ -388,22 +1626,28 @@ if [ -n "$SESSION_ID" ] && [ -f "$MARKER_DIR/$SESSION_ID" ]; then
     kill "$(cat "$MARKER_DIR/pid-$STABLE_PID.dpid")" 2>/dev/null || true
     rm -f "$MARKER_DIR/pid-$STABLE_PID.dpid"
   fi
-  [ -x "$NOTIFIER" ] && "$NOTIFIER" -remove "$OLD_GROUP" 2>/dev/null
+  [ -n "$CAP_NOTIFIER" ] && _bounded "$NOTIFIER" -remove "$OLD_GROUP" 2>/dev/null
+  [ "$HISTORY" = "1" ] && _claude_notify_history dismissed "$OLD_GROUP"
 fi
 
 # Send notification — clicking it activates the terminal and switches to the correct tab
 # -sender forces macOS to use our app's icon (same binary UUID as original terminal-notifier)
+# High-priority routing rules deliver through Do Not Disturb / Focus
+PRIORITY_ARGS=""
+[ "$PRIORITY" = "high" ] && PRIORITY_ARGS="-ignoreDnD"
 if [ -n "$TERM_APP" ]; then
-  "$NOTIFIER" \
+  # terminal-notifier runs -execute through sh -c: quote every word
+  printf -v _click_cmd 'bash %q %q %q %q' "$HOME/.claude/notify-click.sh" "$TERM_APP" "$TAB_ID" "$SESSION_ID"
+  _bounded "$NOTIFIER" $PRIORITY_ARGS \
     -title "$TITLE" \
     -message "$BODY" \
     -sender "$SENDER" \
-    -execute "bash $HOME/.claude/notify-click.sh '$TERM_APP' '$TAB_ID' '$SESSION_ID'" \
+    -execute "$_click_cmd" \
     -group "$GROUP" \
     2>/dev/null
 else
   # Unknown terminal — fall back to generic activation (no tab switching)
-  "$NOTIFIER" \
+  _bounded "$NOTIFIER" $PRIORITY_ARGS \
     -title "$TITLE" \
     -message "$BODY" \
     -sender "$SENDER" \
@@ -411,22 +1655,32 @@ else
     2>/dev/null
 fi
 
+# Journal the notification
+[ "$HISTORY" = "1" ] && _claude_notify_history_posted "$GROUP" "$EVENT_KEY" "$TOOL_NAME" "$TERM_APP" "$TITLE" "$BODY" "$POSTED_AT"
+
 # Track active notification for auto-dismiss (all styles, not just persistent)
 if [ -n "$SESSION_ID" ]; then
   mkdir -p "$MARKER_DIR"
   echo "$GROUP" > "$MARKER_DIR/$SESSION_ID"
   [ -n "$STABLE_PID" ] && echo "$GROUP" > "$MARKER_DIR/pid-$STABLE_PID"
+  : > "$PENDING_FLAG"
+  _claude_notify_session posted "$GROUP" "$EVENT_KEY" "$TERM_APP" "$TAB_ID" "$STYLE" "$TIMEOUT" "$POSTED_AT"
 fi
+# Delivery finished — the next hook reads this mtime as its latency sample
+: 2>/dev/null > "$MARKER_DIR/.delivered"
 
 # For temporary (banner) style: spawn background dismiss timer
 if [ "$STYLE" = "banner" ] && [ -n "$SESSION_ID" ]; then
   (
     sleep "$TIMEOUT"
-    "$NOTIFIER" -remove "$GROUP" 2>/dev/null
+    _bounded "$NOTIFIER" -remove "$GROUP" 2>/dev/null
+    [ "$HISTORY" = "1" ] && _claude_notify_history dismissed "$GROUP"
+    _claude_notify_session resolved "$GROUP"
     rm -f "$MARKER_DIR/$SESSION_ID" 2>/dev/null
     rm -f "$MARKER_DIR/$SESSION_ID.dpid" 2>/dev/null
     [ -n "$STABLE_PID" ] && rm -f "$MARKER_DIR/pid-$STABLE_PID" 2>/dev/null
     [ -n "$STABLE_PID" ] && rm -f "$MARKER_DIR/pid-$STABLE_PID.dpid" 2>/dev/null
+    _claude_notify_pending_refresh
   ) &
   DISMISS_PID=$!
   echo "$DISMISS_PID" > "$MARKER_DIR/$SESSION_ID.dpid"
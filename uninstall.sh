@@ -11,10 +11,19 @@ FILES_TO_REMOVE=(
   "$CLAUDE_DIR/notify-click.sh"
   "$CLAUDE_DIR/notify-config.json"
   "$CLAUDE_DIR/config-ui.py"
+  "$CLAUDE_DIR/notify-relay.py"
+  "$CLAUDE_DIR/notify-history.py"
+  "$CLAUDE_DIR/notify-sinks.py"
   "$CLAUDE_DIR/Claude.icns"
   "$CLAUDE_DIR/claude-icon-large.png"
   "$CLAUDE_DIR/Configure Notifications.command"
   "$CLAUDE_DIR/.notify-installed"
+  "$CLAUDE_DIR/.notify-install-manifest.json"
+  "$CLAUDE_DIR/.notify-record"
+  "$CLAUDE_DIR/.notify-async"
+  "$CLAUDE_DIR/.notify-capture.tsv"
+  "$CLAUDE_DIR/.notify-capture.tsv.1"
+  "$CLAUDE_DIR/.notify-click-timings.tsv"
 )
 DIRS_TO_REMOVE=(
   "$CLAUDE_DIR/ClaudeNotifications.app"
@@ -149,6 +158,12 @@ if [ "$_jb_removed" -eq 0 ]; then
 fi
 # Remove JetBrains notification server port files
 rm -rf "$HOME/.claude/.jb-notify" 2>/dev/null
+# Remove the relay receiver socket (notify-relay.py serve)
+rm -f "$CLAUDE_DIR/.notify-relay.sock" 2>/dev/null
+# Remove notification history (journal, SQLite store and its WAL/lock files)
+rm -f "$CLAUDE_DIR"/.notify-history.* 2>/dev/null
+# Remove the fan-out sink queue, spools and counters (notify-sinks.py)
+rm -rf "$CLAUDE_DIR/.notify-sinks" 2>/dev/null
 
 # 2. Kill background dismiss timer processes
 if [ -d "$CLAUDE_DIR/.persistent-notifications" ]; then